@@ -0,0 +1,265 @@
+"""
+Registry of the transports the benchmark can run on.
+
+A backend bundles everything that differs between transports: its publisher
+and subscriber (publishers.py / subscribers.py), the codec of its messages,
+the readiness handshake between the two, the session control channel, and
+the clock probes between them.
+Every CLI takes its --middleware choices from here, so a new transport only
+has to be registered:
+
+  - in-tree, with register_backend() at the bottom of this module,
+  - from an installed package, via an entry point in the
+    "pub_sub_benchmark.backends" group that names a Backend (or a callable
+    returning one or a list of them),
+  - from any importable module listed in $PUB_SUB_BENCHMARK_BACKENDS
+    (comma separated) that calls register_backend() when imported.
+
+Reports record each backend's label and whether it is a baseline, so the
+analysis picks up new backends without importing them.
+"""
+
+import importlib
+import logging
+import os
+from importlib.metadata import entry_points
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmark import (LCM_CODEC, PROTO_CODEC, Codec, LCMHandshake, Readiness,
+                       eCALReadiness)
+from clock_sync import ClockSync, LcmClockSync, eCALClockSync
+from publishers import BasePublisher, LcmPublisher, RawPublisher, eCALPublisher
+from raw_transport import RAW_TRANSPORTS
+from session import LcmSessionControl, SessionControl, eCALSessionControl
+from subscribers import (BaseSubscriber, LcmAsyncSubscriber, LcmSubscriber,
+                         RawSubscriber, eCALAsyncSubscriber, eCALSubscriber)
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "pub_sub_benchmark.backends"
+ENV_VAR = "PUB_SUB_BENCHMARK_BACKENDS"
+
+
+class Backend:
+    """
+    One transport. The factories are called as
+
+      publisher(lcm_url, channel, reply_channel, handshake, num_subscribers, codec)
+      subscriber(lcm_url, channel, echo, topics, handshake, codec)
+      handshake(lcm_url, channel, topics)
+      session_control(lcm_url, channel, publisher)
+      clock_sync(lcm_url, channel, server)
+      async_subscriber(lcm_url, channel, echo, topics, handshake, codec)
+
+    where handshake is the Readiness the publisher waits on (None when the
+    caller waits for the subscribers itself) or the subscriber announces
+    itself on. lcm_url is passed to every backend so that those without
+    discovery of their own can borrow LCM's.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        codec: Codec,
+        publisher: Callable[..., BasePublisher],
+        subscriber: Callable[..., BaseSubscriber],
+        handshake: Callable[..., Readiness],
+        session_control: Callable[..., SessionControl],
+        label: Optional[str] = None,
+        baseline: bool = False,
+        supports_workload: bool = True,
+        async_subscriber: Optional[Callable[..., BaseSubscriber]] = None,
+        clock_sync: Optional[Callable[..., ClockSync]] = None,
+    ):
+        """
+        :param label:             name on plots (default: name)
+        :param baseline:          a raw transport that the middlewares are compared against
+        :param supports_workload: whether the subscriber can receive many topics at once
+        :param async_subscriber:  subscriber that receives through an asyncio event loop
+        :param clock_sync:        clock probes between publisher and subscribers (clock_sync.py)
+        """
+        self.name = name
+        self.codec = codec
+        self.publisher = publisher
+        self.subscriber = subscriber
+        self.handshake = handshake
+        self.session_control = session_control
+        self.label = label or name
+        self.baseline = baseline
+        self.supports_workload = supports_workload
+        self.async_subscriber = async_subscriber
+        self.clock_sync = clock_sync
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name})"
+
+    def create_handshake(
+        self, lcm_url: str, channel: str, topics: Optional[List[str]] = None
+    ) -> Readiness:
+        return self.handshake(lcm_url, channel, topics)
+
+    def create_publisher(
+        self,
+        lcm_url: str,
+        channel: str,
+        reply_channel: Optional[str] = None,
+        num_subscribers: int = 1,
+    ) -> BasePublisher:
+        """A publisher on `channel`; with num_subscribers=0 it does not wait for any."""
+        handshake = (
+            self.create_handshake(lcm_url, channel) if num_subscribers > 0 else None
+        )
+        return self.publisher(
+            lcm_url, channel, reply_channel, handshake, num_subscribers, self.codec
+        )
+
+    def create_subscriber(
+        self,
+        lcm_url: str,
+        channel: str,
+        echo: bool = False,
+        topics: Optional[List[str]] = None,
+        use_asyncio: bool = False,
+        zero_copy: bool = False,
+    ) -> BaseSubscriber:
+        """
+        A subscriber of `channel` (or of every topic in `topics`) that announces
+        itself. With zero_copy it decodes with the codec's view decoder.
+        """
+        factory = self.async_subscriber if use_asyncio else self.subscriber
+        if factory is None:
+            raise ValueError(f"{self.name} has no asyncio subscriber")
+        codec = self.codec.zero_copy_variant() if zero_copy else self.codec
+        handshake = self.create_handshake(lcm_url, channel, topics)
+        return factory(lcm_url, channel, echo, topics, handshake, codec)
+
+    def create_session_control(
+        self, lcm_url: str, channel: str, publisher: bool
+    ) -> SessionControl:
+        return self.session_control(lcm_url, channel, publisher)
+
+    def create_clock_sync(self, lcm_url: str, channel: str, server: bool) -> ClockSync:
+        if self.clock_sync is None:
+            raise ValueError(f"{self.name} has no clock synchronization")
+        return self.clock_sync(lcm_url, channel, server)
+
+    def describe(self) -> Dict[str, object]:
+        """What a report records about its backend."""
+        return {
+            "middleware_label": self.label,
+            "baseline": self.baseline,
+            "codec": self.codec.name,
+        }
+
+
+_BACKENDS: Dict[str, Backend] = {}
+_plugins_loaded = False
+
+
+def register_backend(backend: Backend) -> Backend:
+    if backend.name in _BACKENDS:
+        raise ValueError(f"backend {backend.name!r} is already registered")
+    _BACKENDS[backend.name] = backend
+    return backend
+
+
+def _register_plugin(obj: object, source: str) -> None:
+    if callable(obj) and not isinstance(obj, Backend):
+        obj = obj()
+    for backend in obj if isinstance(obj, (list, tuple)) else [obj]:
+        if not isinstance(backend, Backend):
+            raise TypeError(f"{source} did not provide a Backend: {backend!r}")
+        register_backend(backend)
+
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        _register_plugin(entry_point.load(), f"entry point {entry_point.name}")
+    for module in filter(None, os.environ.get(ENV_VAR, "").split(",")):
+        # NOTE: the module registers its backends itself when imported
+        importlib.import_module(module.strip())
+
+
+def get_backend(name: str) -> Backend:
+    _load_plugins()
+    if name not in _BACKENDS:
+        raise ValueError(f"unknown middleware {name!r}, choose from {backend_names()}")
+    return _BACKENDS[name]
+
+
+def backend_names() -> Tuple[str, ...]:
+    """Every registered backend, in registration order."""
+    _load_plugins()
+    return tuple(_BACKENDS)
+
+
+register_backend(
+    Backend(
+        "lcm",
+        LCM_CODEC,
+        publisher=LcmPublisher,
+        subscriber=lambda url, channel, echo, topics, handshake, codec: LcmSubscriber(
+            url, channel, echo, topics, handshake, codec
+        ),
+        # NOTE: one handshake channel covers every topic of a workload
+        handshake=lambda url, channel, topics: LCMHandshake(url, channel),
+        session_control=LcmSessionControl,
+        label="LCM",
+        clock_sync=LcmClockSync,
+        async_subscriber=lambda url, channel, echo, topics, handshake, codec: LcmAsyncSubscriber(
+            url, channel, echo, topics, handshake, codec
+        ),
+    )
+)
+register_backend(
+    Backend(
+        "ecal",
+        PROTO_CODEC,
+        publisher=lambda url, channel, reply, handshake, n, codec: eCALPublisher(
+            channel, reply, handshake, n, codec
+        ),
+        subscriber=lambda url, channel, echo, topics, handshake, codec: eCALSubscriber(
+            channel, echo, topics, handshake, codec
+        ),
+        handshake=lambda url, channel, topics: eCALReadiness(topics or [channel]),
+        session_control=lambda url, channel, publisher: eCALSessionControl(
+            channel, publisher
+        ),
+        label="eCAL",
+        clock_sync=lambda url, channel, server: eCALClockSync(channel, server),
+        async_subscriber=lambda url, channel, echo, topics, handshake, codec: eCALAsyncSubscriber(
+            channel, echo, topics, handshake, codec
+        ),
+    )
+)
+
+
+def _raw_backend(transport: str) -> Backend:
+    # NOTE: raw transports borrow LCM's handshake (which also tells the publisher
+    #       the subscriber pids), clock probes and control channel, and carry the
+    #       same bench_t encoding, so only the transport itself differs from the
+    #       lcm backend
+    return Backend(
+        transport,
+        LCM_CODEC,
+        publisher=lambda url, channel, reply, handshake, n, codec: RawPublisher(
+            transport, url, channel, reply, handshake, n, codec
+        ),
+        subscriber=lambda url, channel, echo, topics, handshake, codec: RawSubscriber(
+            transport, url, channel, echo, handshake, codec
+        ),
+        handshake=lambda url, channel, topics: LCMHandshake(url, channel),
+        session_control=LcmSessionControl,
+        label=f"raw {transport}",
+        baseline=True,
+        supports_workload=False,
+        clock_sync=LcmClockSync,
+    )
+
+
+for _transport in RAW_TRANSPORTS:
+    register_backend(_raw_backend(_transport))
@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x62\x65nch.proto\x12\nprototypes\"4\n\x05\x42\x65nch\x12\x0c\n\x04\x62lob\x18\x01 \x01(\x0c\x12\x1d\n\x15\x63reation_timestamp_ns\x18\x02 \x01(\x04\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x62\x65nch.proto\x12\nprototypes\"m\n\x05\x42\x65nch\x12\x0c\n\x04\x62lob\x18\x01 \x01(\x0c\x12\x1d\n\x15\x63reation_timestamp_ns\x18\x02 \x01(\x04\x12\x1e\n\x16scheduled_timestamp_ns\x18\x03 \x01(\x04\x12\x17\n\x0fsequence_number\x18\x04 \x01(\x04\x62\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'bench_pb2', globals())
@@ -21,5 +21,5 @@ if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
   _BENCH._serialized_start=27
-  _BENCH._serialized_end=79
+  _BENCH._serialized_end=136
 # @@protoc_insertion_point(module_scope)
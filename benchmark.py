@@ -1,22 +1,48 @@
+import math
 import os
+import struct
 from contextlib import ContextDecorator
-from random import getrandbits
-from time import sleep, time, time_ns
-from typing import Dict, List, Optional
+from time import monotonic, sleep, time, time_ns
+from typing import Callable, Dict, List, Optional, Sequence, Set
 
 import ecal.core.core as ecal_core
 import lcm
 from bench_pb2 import Bench
+from histogram import LogHistogram, SampleRecorder
 from lcmtypes import bench_t, handshake_t
 from numpy import mean, percentile, std
 
 
-class LCMHandshake:
+class Readiness:
+    """
+    Readiness handshake between one publisher and its subscribers: every
+    subscriber announces itself once it is set up, and the publisher waits
+    until enough of them have before it starts sending.
+    """
+
+    def send_ready(self) -> None:
+        """Subscriber: announce that this process is ready to receive."""
+        pass
+
+    def wait_for_subscribers(
+        self, count: int, timeout_s: Optional[float] = None
+    ) -> bool:
+        """Publisher: wait until `count` subscribers are ready (False on timeout)."""
+        raise NotImplementedError
+
+    def subscriber_ids(self) -> List[int]:
+        """Publisher: ids (pids) of the subscribers that announced themselves."""
+        return []
+
+
+class LCMHandshake(Readiness):
     """
     LCM “who’s there?” handshake helper.
 
       - Subscriber calls send_ready() once it’s set up.
       - Publisher polls has_subscriber() or blocks in wait_for_subscriber().
+      - For fan-out, the publisher blocks in wait_for_subscribers(n) until n
+        distinct subscriber pids have announced themselves.
     """
 
     def __init__(self, url: str, channel: str):
@@ -28,14 +54,19 @@ class LCMHandshake:
         self._channel = channel
         self._ready_chan = f"{channel}_ready"
         self._got_ready = False
+        self._subscriber_pids: Set[int] = set()
 
         # subscribe to “<channel>_ready” and flip the flag
         self._conn.subscribe(self._ready_chan, self._on_ready)
 
     def _on_ready(self, topic: str, data: bytes) -> None:
-        # we don’t need to parse the payload—
-        # the arrival of any message is enough
+        msg = handshake_t.decode(data)
+        # NOTE: clock probes share the channel (see clock_sync.py)
+        if msg.kind != handshake_t.READY:
+            return
         self._got_ready = True
+        # NOTE: every subscriber pings more than once, so they are told apart by pid
+        self._subscriber_pids.add(msg.pid)
 
     def send_ready(self) -> None:
         """Subscriber: fire off 1–2 “I’m here” pings."""
@@ -63,6 +94,34 @@ class LCMHandshake:
             self._conn.handle_timeout(int(timeout_s * 1e3))
         return self._got_ready
 
+    def num_subscribers(self) -> int:
+        """Non-blocking: how many distinct subscribers have announced themselves."""
+        return len(self._subscriber_pids)
+
+    def subscriber_ids(self) -> List[int]:
+        """Non-blocking: pids of the subscribers that have announced themselves."""
+        return sorted(self._subscriber_pids)
+
+    def wait_for_subscribers(
+        self, count: int, timeout_s: Optional[float] = None
+    ) -> bool:
+        """
+        Blocking: wait until `count` distinct subscriber pids have announced
+        themselves or timeout elapses.
+        :param timeout_s: seconds to wait (None = forever)
+        :returns: True if enough subscribers announced themselves, False on timeout
+        """
+        deadline = None if timeout_s is None else monotonic() + timeout_s
+        while len(self._subscriber_pids) < count:
+            if deadline is None:
+                self._conn.handle()
+                continue
+            remaining_ms = int((deadline - monotonic()) * 1e3)
+            if remaining_ms <= 0:
+                return False
+            self._conn.handle_timeout(remaining_ms)
+        return True
+
 
 class eCALMonitor(ContextDecorator):
     def __init__(self):
@@ -79,58 +138,489 @@ class eCALMonitor(ContextDecorator):
 
     @classmethod
     def has_subscriber(cls, topic: str) -> bool:
+        return cls.num_subscribers(topic) > 0
+
+    @classmethod
+    def has_publisher(cls, topic: str) -> bool:
+        return bool(cls._registered_processes(topic, "publisher"))
+
+    @classmethod
+    def num_subscribers(cls, topic: str) -> int:
+        """How many distinct processes have a subscriber registered for `topic`."""
+        return len(cls._registered_processes(topic, "subscriber"))
+
+    @classmethod
+    def _registered_processes(cls, topic: str, direction: str) -> Set[tuple]:
         state, mon = ecal_core.mon_monitoring()
         if state != 0 or not mon:
-            return False
-        for mon_topic in mon.get("topics", []):
-            if mon_topic["direction"] == "subscriber" and mon_topic["tname"] == topic:
-                return True
-        return False
+            return set()
+        # NOTE: one entry per (host, pid) so that a process is only counted once
+        return {
+            (mon_topic.get("hname"), mon_topic.get("pid"))
+            for mon_topic in mon.get("topics", [])
+            if mon_topic["direction"] == direction and mon_topic["tname"] == topic
+        }
+
+
+class eCALReadiness(Readiness):
+    """
+    eCAL needs no ready message: a subscriber announces itself by registering.
+    The publisher waits until `count` processes are registered as subscribers
+    of every one of `topics`.
+    """
 
+    def __init__(self, topics: Sequence[str]):
+        self._topics = list(topics)
 
-def generate_lcm_benchmark_msg(num_bytes: int) -> bench_t:
+    def wait_for_subscribers(
+        self, count: int, timeout_s: Optional[float] = None
+    ) -> bool:
+        deadline = None if timeout_s is None else monotonic() + timeout_s
+        with eCALMonitor() as monitor:
+            while any(monitor.num_subscribers(t) < count for t in self._topics):
+                if deadline is not None and monotonic() >= deadline:
+                    return False
+                sleep(0.01)
+        return True
+
+
+def echo_channel(channel: str) -> str:
+    """Reply channel an echo responder republishes `channel`'s messages on."""
+    return f"{channel}_echo"
+
+
+PAYLOAD_PATTERNS = ("random", "zeros", "compressible")
+
+# Upper bound on the extra bytes a PayloadPool allocates past num_bytes so that
+# consecutive payloads start at different offsets.
+_MAX_ROTATION_WINDOW = 64 * 1024
+# Smallest step of the rotating offset; a PayloadPool bumps it until it is
+# coprime with the number of offsets, so that the offset walks all of them.
+_ROTATION_STRIDE = 61
+
+
+class PayloadPool:
     """
-    Create an lcm bench_t message with a random blob of length num_bytes.
+    Pre-generated payload bytes handed out as zero-copy slices.
+
+    The backing buffer is filled once (outside of any timed loop) and each call
+    to next() returns a memoryview of num_bytes starting at a rotating offset,
+    so consecutive messages start at different offsets of it (and, for "random"
+    content, carry different bytes) without regenerating them.
+
+      - "random":       os.urandom content (incompressible)
+      - "zeros":        all zero bytes
+      - "compressible": a short random block repeated across the buffer
     """
+
+    def __init__(self, num_bytes: int, pattern: str = "random"):
+        """
+        :param num_bytes: size of every payload handed out by next()
+        :param pattern:   one of PAYLOAD_PATTERNS
+        """
+        if not (0 < num_bytes <= 4_294_967_296):
+            raise ValueError("num_bytes must be in (0, 4294967296]")
+        if pattern not in PAYLOAD_PATTERNS:
+            raise ValueError(f"pattern must be one of {PAYLOAD_PATTERNS}")
+
+        self.num_bytes = num_bytes
+        self.pattern = pattern
+        self._window = min(num_bytes, _MAX_ROTATION_WINDOW)
+        self._offset = 0
+        # NOTE: a stride sharing a factor with the window + 1 offsets would only
+        #       visit a few of them (e.g. 61 with num_bytes = 60 visits just one)
+        self._stride = _ROTATION_STRIDE
+        while math.gcd(self._stride, self._window + 1) != 1:
+            self._stride += 1
+
+        total = num_bytes + self._window
+        if pattern == "random":
+            buffer = os.urandom(total)
+        elif pattern == "zeros":
+            buffer = bytes(total)
+        else:
+            block = os.urandom(64)
+            buffer = (block * (total // len(block) + 1))[:total]
+        self._view = memoryview(buffer)
+
+    def next(self) -> memoryview:
+        """Return the next num_bytes payload slice (no copy is made)."""
+        start = self._offset
+        self._offset = (self._offset + self._stride) % (self._window + 1)
+        return self._view[start : start + self.num_bytes]
+
+
+def _payload(num_bytes: int, payload_pool: Optional[PayloadPool]) -> memoryview:
     if not (0 < num_bytes <= 4_294_967_296):
         raise ValueError("num_bytes must be in (0, 4294967296]")
+    if payload_pool is None:
+        return memoryview(os.urandom(num_bytes))
+    if payload_pool.num_bytes != num_bytes:
+        raise ValueError(
+            f"payload_pool hands out {payload_pool.num_bytes} bytes, not {num_bytes}"
+        )
+    return payload_pool.next()
+
 
+def generate_lcm_benchmark_msg(
+    num_bytes: int,
+    payload_pool: Optional[PayloadPool] = None,
+    scheduled_timestamp_ns: Optional[int] = None,
+    sequence_number: int = 0,
+) -> bench_t:
+    """
+    Create an lcm bench_t message with a blob of length num_bytes.
+
+    The blob is a zero-copy slice of payload_pool when given, otherwise fresh
+    random bytes. scheduled_timestamp_ns is the intended send time and
+    defaults to the creation time.
+    """
     msg = bench_t()
     msg.num_bytes = num_bytes
-    msg.blob = bytes([getrandbits(8) for _ in range(num_bytes)])
+    msg.blob = _payload(num_bytes, payload_pool)
     msg.creation_timestamp_ns = time_ns()
+    msg.scheduled_timestamp_ns = (
+        msg.creation_timestamp_ns
+        if scheduled_timestamp_ns is None
+        else scheduled_timestamp_ns
+    )
+    msg.sequence_number = sequence_number
 
     return msg
 
 
-def generate_proto_benchmark_msg(num_bytes: int) -> Bench:
-    """
-    Create a proto Bench message with a random blob of length num_bytes.
+def generate_proto_benchmark_msg(
+    num_bytes: int,
+    payload_pool: Optional[PayloadPool] = None,
+    scheduled_timestamp_ns: Optional[int] = None,
+    sequence_number: int = 0,
+) -> Bench:
     """
-    if not (0 < num_bytes <= 4_294_967_296):
-        raise ValueError("num_bytes must be in (0, 4294967296]")
+    Create a proto Bench message with a blob of length num_bytes.
 
+    Protobuf bytes fields only accept bytes, so the payload_pool slice is
+    copied once (a single memcpy) into the message. scheduled_timestamp_ns is
+    the intended send time and defaults to the creation time.
+    """
     msg = Bench()
-    msg.blob = bytes(getrandbits(8) for _ in range(num_bytes))
+    msg.blob = bytes(_payload(num_bytes, payload_pool))
     msg.creation_timestamp_ns = time_ns()
+    msg.scheduled_timestamp_ns = (
+        msg.creation_timestamp_ns
+        if scheduled_timestamp_ns is None
+        else scheduled_timestamp_ns
+    )
+    msg.sequence_number = sequence_number
 
     return msg
 
 
-def compute_stats(sample: List[float] | List[int], units: str) -> Dict[str, float]:
+# fixed layout of an encoded bench_t: fingerprint, int32 num_bytes,
+# byte[num_bytes] blob, then the three int64 fields
+_BENCH_T_NUM_BYTES = struct.Struct(">i")
+_BENCH_T_TAIL = struct.Struct(">qqq")
+_BENCH_T_BLOB_OFFSET = 8 + _BENCH_T_NUM_BYTES.size
+
+
+class BenchTView:
+    """
+    Lazy, zero-copy decoder of an encoded bench_t. Only num_bytes is read
+    up front; blob is a memoryview slice of the received buffer and the
+    timestamps are unpacked in place on first access.
+    """
+
+    __slots__ = ("_data", "num_bytes", "_tail")
+
+    def __init__(self, data: bytes):
+        if not data.startswith(bench_t._get_packed_fingerprint()):
+            raise ValueError("Decode error")
+        self._data = data
+        self.num_bytes = _BENCH_T_NUM_BYTES.unpack_from(data, 8)[0]
+        if len(data) < _BENCH_T_BLOB_OFFSET + self.num_bytes + _BENCH_T_TAIL.size:
+            raise ValueError("Decode error")
+        self._tail: Optional[tuple] = None
+
+    @property
+    def blob(self) -> memoryview:
+        return memoryview(self._data)[
+            _BENCH_T_BLOB_OFFSET : _BENCH_T_BLOB_OFFSET + self.num_bytes
+        ]
+
+    def _unpack_tail(self) -> tuple:
+        if self._tail is None:
+            self._tail = _BENCH_T_TAIL.unpack_from(
+                self._data, _BENCH_T_BLOB_OFFSET + self.num_bytes
+            )
+        return self._tail
+
+    @property
+    def creation_timestamp_ns(self) -> int:
+        return self._unpack_tail()[0]
+
+    @property
+    def scheduled_timestamp_ns(self) -> int:
+        return self._unpack_tail()[1]
+
+    @property
+    def sequence_number(self) -> int:
+        return self._unpack_tail()[2]
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    """Returns (value, position after it) of the protobuf varint at `pos`."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class BenchView:
     """
-    Given a list of examples in specified units, return
-    min, max, p50, p90, p95.
+    Zero-copy decoder of a serialized proto Bench. The scalar fields are
+    parsed from the wire format directly; blob is a memoryview slice of the
+    received buffer instead of the copy that ParseFromString (and every
+    access of Bench.blob) makes.
     """
+
+    __slots__ = (
+        "_data",
+        "_blob_start",
+        "_blob_end",
+        "creation_timestamp_ns",
+        "scheduled_timestamp_ns",
+        "sequence_number",
+    )
+    # field number -> attribute of the varint fields
+    _VARINT_FIELDS = {
+        2: "creation_timestamp_ns",
+        3: "scheduled_timestamp_ns",
+        4: "sequence_number",
+    }
+
+    def __init__(self, data: bytes):
+        self._data = data
+        # NOTE: proto3 omits fields that hold their default value
+        self._blob_start = self._blob_end = 0
+        self.creation_timestamp_ns = 0
+        self.scheduled_timestamp_ns = 0
+        self.sequence_number = 0
+        pos = 0
+        while pos < len(data):
+            key, pos = _read_varint(data, pos)
+            field, wire_type = key >> 3, key & 0x7
+            if wire_type == 0:
+                value, pos = _read_varint(data, pos)
+                if field in self._VARINT_FIELDS:
+                    setattr(self, self._VARINT_FIELDS[field], value)
+            elif wire_type == 2:
+                length, pos = _read_varint(data, pos)
+                if field == 1:
+                    self._blob_start, self._blob_end = pos, pos + length
+                pos += length
+            elif wire_type in (1, 5):
+                pos += 8 if wire_type == 1 else 4
+            else:
+                raise ValueError(f"Decode error: wire type {wire_type}")
+        if pos != len(data):
+            raise ValueError("Decode error")
+
+    @property
+    def blob(self) -> memoryview:
+        return memoryview(self._data)[self._blob_start : self._blob_end]
+
+
+class Codec:
+    """
+    How one benchmark message type is built, encoded and decoded. Every such
+    type has blob, creation_timestamp_ns, scheduled_timestamp_ns and
+    sequence_number fields.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        msg_type: type,
+        generate: Callable[..., object],
+        encode: Callable[[object], bytes],
+        decode: Callable[[bytes], object],
+        decode_view: Optional[Callable[[bytes], object]] = None,
+        blob_access_copies: bool = False,
+        zero_copy: bool = False,
+    ):
+        """
+        :param generate:           (num_bytes, payload_pool, scheduled_timestamp_ns,
+                                   sequence_number) -> message, like generate_lcm_benchmark_msg
+        :param decode_view:        decoder whose blob is a memoryview of the encoded buffer
+        :param blob_access_copies: whether reading msg.blob returns a fresh copy (protobuf)
+        :param zero_copy:          whether decode is such a view decoder
+        """
+        self.name = name
+        self.msg_type = msg_type
+        self.generate = generate
+        self.encode = encode
+        self.decode = decode
+        self.decode_view = decode_view
+        self.blob_access_copies = blob_access_copies
+        self.zero_copy = zero_copy
+
+    def __repr__(self) -> str:
+        return f"Codec({self.name})"
+
+    def zero_copy_variant(self) -> "Codec":
+        """This codec, decoding with its view decoder instead."""
+        if self.zero_copy:
+            return self
+        if self.decode_view is None:
+            raise ValueError(f"{self.name} has no zero-copy decoder")
+        return Codec(
+            f"{self.name}_zero_copy",
+            self.msg_type,
+            self.generate,
+            self.encode,
+            self.decode_view,
+            zero_copy=True,
+        )
+
+
+LCM_CODEC = Codec(
+    "lcm",
+    bench_t,
+    generate_lcm_benchmark_msg,
+    bench_t.encode,
+    bench_t.decode,
+    decode_view=BenchTView,
+)
+PROTO_CODEC = Codec(
+    "proto",
+    Bench,
+    generate_proto_benchmark_msg,
+    Bench.SerializeToString,
+    Bench.FromString,
+    decode_view=BenchView,
+    blob_access_copies=True,
+)
+
+
+class SequenceTracker:
+    """
+    Receive-side accounting of sequence numbers 0 .. expected - 1.
+
+    Every arrival is classified as "new", "reordered" (new, but lower than a
+    sequence number already seen), "duplicate" or "unexpected" (outside the
+    expected range). Seen sequence numbers are tracked in a bitmap of
+    `expected` bytes.
+    """
+
+    NEW = "new"
+    REORDERED = "reordered"
+    DUPLICATE = "duplicate"
+    UNEXPECTED = "unexpected"
+
+    def __init__(self, expected: int):
+        if expected <= 0:
+            raise ValueError("expected must be > 0")
+        self.expected = expected
+        self._seen = bytearray(expected)
+        self.highest = -1
+        self.received = 0
+        self.unique = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.unexpected = 0
+        self.gaps = 0
+
+    def observe(self, sequence_number: int) -> str:
+        """Account for one arrival and return its classification."""
+        self.received += 1
+        if not (0 <= sequence_number < self.expected):
+            self.unexpected += 1
+            return SequenceTracker.UNEXPECTED
+        if self._seen[sequence_number]:
+            self.duplicates += 1
+            return SequenceTracker.DUPLICATE
+
+        self._seen[sequence_number] = 1
+        self.unique += 1
+        if sequence_number < self.highest:
+            self.reordered += 1
+            return SequenceTracker.REORDERED
+        if sequence_number > self.highest + 1:
+            # a jump forward: everything in between is (so far) missing
+            self.gaps += 1
+        self.highest = sequence_number
+        return SequenceTracker.NEW
+
+    def complete(self) -> bool:
+        """True once every expected sequence number has arrived."""
+        return self.unique == self.expected
+
+    def lost(self) -> int:
+        return self.expected - self.unique
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "expected_msgs": self.expected,
+            "received_msgs": self.received,
+            "unique_msgs": self.unique,
+            "lost_msgs": self.lost(),
+            "loss_rate": self.lost() / self.expected,
+            "duplicate_msgs": self.duplicates,
+            "reordered_msgs": self.reordered,
+            "unexpected_msgs": self.unexpected,
+            "sequence_gaps": self.gaps,
+        }
+
+
+# (label, percentile) pairs reported by compute_stats
+REPORTED_PERCENTILES = (
+    ("p50", 50),
+    ("p90", 90),
+    ("p95", 95),
+    ("p99", 99),
+    ("p999", 99.9),
+    ("p9999", 99.99),
+)
+
+
+def compute_stats(
+    sample: List[float] | List[int] | SampleRecorder | LogHistogram, units: str
+) -> Dict[str, float]:
+    """
+    Given a list of examples (or a streaming recorder) in specified units,
+    return min, max, mean, stddev, p50, p90, p95, p99, p99.9 and p99.99.
+
+    Lists give exact percentiles. Recorders/histograms use bounded memory and
+    report percentiles within the histogram's relative error.
+    """
+    if isinstance(sample, SampleRecorder):
+        sample = sample.histogram
+
+    if isinstance(sample, LogHistogram):
+        if sample.count == 0:
+            raise ValueError("sample histogram must not be empty")
+        stats = {
+            f"min_{units}": sample.min,
+            f"max_{units}": sample.max,
+            f"mean_{units}": sample.mean(),
+            f"stddev_{units}": sample.stddev(),
+        }
+        for label, p in REPORTED_PERCENTILES:
+            stats[f"{label}_{units}"] = sample.percentile(p)
+        return stats
+
     if not sample:
         raise ValueError("sample list must not be empty")
 
-    return {
+    stats = {
         f"min_{units}": min(sample),
         f"max_{units}": max(sample),
         f"mean_{units}": float(mean(sample)),
         f"stddev_{units}": float(std(sample)),
-        f"p50_{units}": float(percentile(sample, 50)),
-        f"p90_{units}": float(percentile(sample, 90)),
-        f"p95_{units}": float(percentile(sample, 95)),
     }
+    for label, p in REPORTED_PERCENTILES:
+        stats[f"{label}_{units}"] = float(percentile(sample, p))
+    return stats
@@ -0,0 +1,290 @@
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+from time import time as now
+from time import time_ns
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import yaml
+
+from backends import backend_names
+from benchmark import REPORTED_PERCENTILES, compute_stats
+from results import open_samples
+from runner import run_fanout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUBSCRIBER_COUNTS = [1, 2, 5, 10, 20]
+
+
+def merge_fanout_reports(
+    num_subscribers: int,
+    pub_report: Optional[Dict[str, Any]],
+    sub_reports: List[Optional[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """
+    Merge the reports of one fan-out run into a single scaling point.
+
+    Latency is summarized per subscriber (mean and worst over subscribers) and,
+    when every subscriber kept its samples, over all deliveries pooled. A
+    subscriber without a report counts as having lost everything.
+    """
+    point: Dict[str, Any] = {
+        "num_subscribers": num_subscribers,
+        "reporting_subscribers": sum(r is not None for r in sub_reports),
+    }
+    if pub_report is not None:
+        publish = pub_report.get("publish_duration_statistics", {})
+        point["publish_p50_ms"] = publish.get("p50_ms")
+        point["publish_p99_ms"] = publish.get("p99_ms")
+
+    per_subscriber: List[Dict[str, Any]] = []
+    for report in sub_reports:
+        if report is None:
+            per_subscriber.append({"loss_rate": 1.0})
+            continue
+        latency = report.get("oneway_latency_statistics", {})
+        delivery = report.get("delivery_statistics", {})
+        per_subscriber.append(
+            {
+                "subscriber_pid": report["parameters"].get("subscriber_pid"),
+                "report_path": report["report_path"],
+                "p50_latency_ms": latency.get("p50_ms"),
+                "p99_latency_ms": latency.get("p99_ms"),
+                "loss_rate": delivery.get("loss_rate", 1.0),
+                "delivered_throughput_hz": delivery.get("delivered_throughput_hz", 0.0),
+            }
+        )
+    point["subscribers"] = per_subscriber
+
+    for key in ("p50_latency_ms", "p99_latency_ms", "loss_rate"):
+        values = [s[key] for s in per_subscriber if s.get(key) is not None]
+        if values:
+            point[f"mean_{key}"] = float(np.mean(values))
+            point[f"worst_{key}"] = float(np.max(values))
+    point["total_delivered_throughput_hz"] = sum(
+        s.get("delivered_throughput_hz", 0.0) for s in per_subscriber
+    )
+
+    # NOTE: percentiles of different subscribers cannot be combined, so the pooled
+    #       distribution needs every subscriber's raw samples (--keep-samples)
+    pooled: List[np.ndarray] = []
+    for report in sub_reports:
+        samples = open_samples(Path(report["report_path"]), report) if report else None
+        if samples is None:
+            pooled = []
+            break
+        with samples:
+            pooled.append(samples["oneway_latencies_ms"])
+    if pooled and sum(len(p) for p in pooled) > 0:
+        point["pooled_oneway_latency_statistics"] = compute_stats(
+            np.concatenate(pooled).tolist(), "ms"
+        )
+    return point
+
+
+def plot_scaling(points: List[Dict[str, Any]], output_dir: Path) -> None:
+    # NOTE: imported here so the benchmark itself runs where matplotlib is not installed
+    import matplotlib.pyplot as plt
+
+    for keys, label, filename in (
+        (
+            ("mean_p50_latency_ms", "mean_p99_latency_ms", "worst_p99_latency_ms"),
+            "One-way Latency (ms)",
+            "fanout_latency",
+        ),
+        (("mean_loss_rate", "worst_loss_rate"), "Loss Rate", "fanout_loss"),
+        (
+            ("publish_p50_ms", "publish_p99_ms"),
+            "Publish Duration (ms)",
+            "fanout_publish",
+        ),
+    ):
+        plt.figure()
+        for mw in sorted({p["middleware"] for p in points}):
+            for num_bytes in sorted({p["num_bytes"] for p in points}):
+                series = sorted(
+                    (
+                        p
+                        for p in points
+                        if (p["middleware"], p["num_bytes"]) == (mw, num_bytes)
+                    ),
+                    key=lambda p: p["num_subscribers"],
+                )
+                for key in keys:
+                    xy = [
+                        (p["num_subscribers"], p[key])
+                        for p in series
+                        if p.get(key) is not None
+                    ]
+                    if xy:
+                        plt.plot(
+                            *zip(*xy),
+                            marker="o",
+                            label=f"{mw} {num_bytes / 1024.0:g} KiB {key}",
+                        )
+        plt.xlabel("Subscribers")
+        plt.ylabel(label)
+        plt.title(f"{label} vs. Subscriber Count")
+        plt.grid(linestyle="--", alpha=0.5)
+        plt.legend(fontsize="small")
+        plt.tight_layout()
+        plt.savefig(output_dir / f"{filename}.png")
+        plt.close()
+
+
+def main(
+    middlewares: List[str],
+    subscriber_counts: List[int],
+    sizes_bytes: List[int],
+    transmission_rate: float,
+    num_msgs: int,
+    results_dir: Path | str,
+    lcm_url: str,
+    channel_name: str,
+    receive_timeout_s: float,
+    keep_samples: bool,
+    plot: bool,
+    log_level: str,
+    resource_interval_s: float = 0.0,
+) -> None:
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        level=getattr(logging, log_level),
+    )
+    assert all(n > 0 for n in subscriber_counts), "subscriber counts must be > 0"
+
+    if isinstance(results_dir, str):
+        results_dir = Path(results_dir)
+    run_id = f"fanout_{time_ns()}"
+    results_dir = results_dir / run_id
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    extra_args = ["--keep-samples"] if keep_samples else []
+    if resource_interval_s > 0:
+        extra_args += ["--resource-interval-s", str(resource_interval_s)]
+    points: List[Dict[str, Any]] = []
+    for middleware in middlewares:
+        for num_bytes in sizes_bytes:
+            for num_subscribers in subscriber_counts:
+                run_dir = (
+                    results_dir / f"{middleware}_{num_bytes}B_{num_subscribers}subs"
+                )
+                pub_report, sub_reports = run_fanout(
+                    middleware,
+                    num_bytes,
+                    transmission_rate,
+                    num_msgs,
+                    run_dir,
+                    num_subscribers,
+                    channel_name=channel_name,
+                    publisher_args=["--lcm-url", lcm_url, *extra_args],
+                    subscriber_args=[
+                        "--lcm-url",
+                        lcm_url,
+                        "--receive-timeout-s",
+                        str(receive_timeout_s),
+                        *extra_args,
+                    ],
+                    run_id=run_id,
+                )
+                point = merge_fanout_reports(num_subscribers, pub_report, sub_reports)
+                point.update({"middleware": middleware, "num_bytes": num_bytes})
+                points.append(point)
+                logger.info(
+                    f"[{middleware} {num_bytes} B] {num_subscribers} subscribers: "
+                    f"worst p99={point.get('worst_p99_latency_ms', float('nan')):.3f} ms, "
+                    f"worst loss={point.get('worst_loss_rate', float('nan')):.4%}"
+                )
+
+    report: Dict[str, Any] = {
+        "timestamp_us": int(now() * 1e6),
+        "run_id": run_id,
+        "parameters": {
+            "middlewares": middlewares,
+            "subscriber_counts": subscriber_counts,
+            "sizes_bytes": sizes_bytes,
+            "transmission_rate_hz": transmission_rate,
+            "num_msgs": num_msgs,
+            "resource_interval_s": resource_interval_s,
+            "percentiles": [label for label, _ in REPORTED_PERCENTILES],
+        },
+        "scaling": points,
+    }
+    out = results_dir / f"fanout_scaling_{report['timestamp_us']}.yaml"
+    with open(out, "w") as f:
+        yaml.dump(report, f)
+    logger.info(f"Wrote fan-out scaling report to {out}")
+
+    if plot:
+        plot_scaling(points, results_dir)
+        logger.info(f"Wrote fan-out scaling plots to {results_dir}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Measure how latency and loss scale with the number of subscribers"
+    )
+    parser.add_argument(
+        "--middleware", nargs="+", choices=backend_names(), default=["lcm", "ecal"]
+    )
+    parser.add_argument(
+        "--subscriber-counts",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SUBSCRIBER_COUNTS,
+        help="Numbers of subscribers to run (default=1 2 5 10 20)",
+    )
+    parser.add_argument("--sizes-bytes", nargs="+", type=int, default=[1024])
+    parser.add_argument("--transmission-rate", type=float, default=100.0)
+    parser.add_argument("--num-msgs", type=int, default=500)
+    parser.add_argument(
+        "--lcm-url", type=str, default="udpm://239.255.76.67:7667?ttl=1"
+    )
+    parser.add_argument("--channel-name", type=str, default="/benchmark")
+    parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--receive-timeout-s",
+        type=float,
+        default=2.0,
+        help="Subscriber receive timeout once messages flow (default=2.0)",
+    )
+    parser.add_argument(
+        "--keep-samples",
+        action="store_true",
+        help="Keep per-message samples so latency can also be pooled over all subscribers",
+    )
+    parser.add_argument(
+        "--resource-interval-s",
+        type=float,
+        default=0.0,
+        help="Have both sides of every run sample their resource usage this often, "
+        "e.g. 0.1 (default=0, off)",
+    )
+    parser.add_argument(
+        "--plot", action="store_true", help="Also plot the scaling curves (matplotlib)"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set the logging level. (default=INFO)",
+    )
+    args = parser.parse_args()
+
+    main(
+        middlewares=args.middleware,
+        subscriber_counts=args.subscriber_counts,
+        sizes_bytes=args.sizes_bytes,
+        transmission_rate=args.transmission_rate,
+        num_msgs=args.num_msgs,
+        results_dir=args.results_dir,
+        lcm_url=args.lcm_url,
+        channel_name=args.channel_name,
+        receive_timeout_s=args.receive_timeout_s,
+        keep_samples=args.keep_samples,
+        plot=args.plot,
+        log_level=args.log_level,
+        resource_interval_s=args.resource_interval_s,
+    )
@@ -1,97 +1,511 @@
 import logging
-import sys
 from argparse import ArgumentParser
+from array import array
 from pathlib import Path
-from time import perf_counter, sleep
+from time import perf_counter, perf_counter_ns
 from time import time as now
 from time import time_ns
-from typing import Any, Dict, List
-
-import ecal.core.core as ecal_core
-import yaml
-# NOTE: see relevant note about ProtoPublisher in eCALPublisher below
-# from ecal.core.publisher import ProtoPublisher
-from lcm import LCM
-
-from bench_pb2 import Bench
-from benchmark import (LCMHandshake, compute_stats, eCALMonitor,
-                       generate_lcm_benchmark_msg,
-                       generate_proto_benchmark_msg)
-from lcmtypes import bench_t
+from typing import Any, Dict, List, Optional, Tuple
+
+from backends import Backend, backend_names, get_backend
+from benchmark import (PAYLOAD_PATTERNS, Codec, PayloadPool, compute_stats,
+                       echo_channel)
+from clock_sync import DEFAULT_CLOCK_SYNC_TIMEOUT_S, ClockSync
+from gc_monitor import GcMonitor
+from histogram import LogHistogram, SampleRecorder
+from live_metrics import LiveMetrics, create_live_metrics
+from publishers import BasePublisher
+from resources import (DEFAULT_RESOURCE_INTERVAL_S, ResourceSampler,
+                       create_sampler)
+from results import write_report
+from run_profile import RunProfile, load_profile
+from scheduler import (CATCH_UP_POLICIES, SLEEP_STRATEGIES, MultiRateScheduler,
+                       RateScheduler)
+from session import END, FINISH, START, Phase, SessionControl, build_phases
+from tracing import DEFAULT_TRACE_CAPACITY, SpanTracer
+from workload import TopicSpec, load_workload
 
 logger = logging.getLogger(__name__)
 
+BENCHMARK_MODES = ("oneway", "roundtrip")
+
 
 class BenchmarkMessage:
-    def __init__(self, num_bytes: int, middleware: str):
-        if middleware == "lcm":
-            self._inner: bench_t | Bench = generate_lcm_benchmark_msg(num_bytes)
-        else:
-            self._inner: bench_t | Bench = generate_proto_benchmark_msg(num_bytes)
+    def __init__(
+        self,
+        num_bytes: int,
+        codec: Codec,
+        payload_pool: PayloadPool | None = None,
+        scheduled_time_ns: int | None = None,
+        sequence_number: int = 0,
+    ):
+        self._inner = codec.generate(
+            num_bytes, payload_pool, scheduled_time_ns, sequence_number
+        )
         self.num_bytes = num_bytes
-        self.middleware = middleware
+        self.codec = codec
         self.creation_time_ns = self._inner.creation_timestamp_ns
+        self.scheduled_time_ns = self._inner.scheduled_timestamp_ns
+        self.sequence_number = sequence_number
 
     def serialize(self) -> bytes:
-        if type(self._inner) == bench_t:
-            return self._inner.encode()
-        elif type(self._inner) == Bench:
-            return self._inner.SerializeToString()
-        raise ValueError("self._inner must be either a bench_t or Bench message")
-
-
-class BasePublisher:
-    def send(self, data: bytes) -> None:
-        raise NotImplementedError
+        return self.codec.encode(self._inner)
+
+    @staticmethod
+    def sequence_number_of(data: bytes, codec: Codec) -> int:
+        """Decode an (echoed) serialized message just to get its sequence number."""
+        return codec.decode(data).sequence_number
+
+
+def await_echo(
+    publisher: BasePublisher, sequence_number: int, sent_ns: int, timeout_s: float
+) -> Optional[float]:
+    """
+    Wait for the echo of message `sequence_number` and return its round-trip
+    time in ms (both ends stamped with perf_counter_ns() in this process, so no
+    clock synchronization is needed), or None if it did not arrive in time.
+    Late echoes of earlier messages are discarded.
+    """
+    deadline_ns = sent_ns + int(timeout_s * 1e9)
+    while True:
+        remaining_s = (deadline_ns - perf_counter_ns()) / 1e9
+        if remaining_s <= 0:
+            return None
+        reply = publisher.wait_reply(remaining_s)
+        if reply is None:
+            return None
+        data, arrival_ns = reply
+        seq = BenchmarkMessage.sequence_number_of(data, publisher.codec)
+        if seq == sequence_number:
+            return (arrival_ns - sent_ns) / 1e6
+        logger.debug(f"Discarding late echo of msg {seq}")
+
+
+def send_phase(
+    publisher: BasePublisher,
+    transmission_rate_setpoint: float,
+    num_bytes: int,
+    num_msgs: int,
+    payload_pattern: str,
+    scheduler_strategy: str,
+    scheduler_catch_up: str,
+    keep_samples: bool,
+    roundtrip: bool,
+    reply_timeout_s: float,
+    tracer: Optional[SpanTracer] = None,
+    resources: Optional[ResourceSampler] = None,
+    gc_monitor: Optional[GcMonitor] = None,
+    live: Optional[LiveMetrics] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Send num_msgs messages of num_bytes at transmission_rate_setpoint and
+    return the run's (report statistics, raw per-message columns). With a
+    tracer every step of every message is recorded as a span, with a resource
+    sampler the process's resource usage during the run is reported, with
+    a GC monitor its GC pauses and allocations, and live metrics get every
+    message's measurements while the run is going on.
+    """
+    # NOTE: payload bytes are generated once up front so that the timed loop
+    #       below measures the middleware and not the payload generator
+    payload_pool = PayloadPool(num_bytes, payload_pattern)
+
+    scheduler = RateScheduler(
+        transmission_rate_setpoint, scheduler_strategy, scheduler_catch_up
+    )
+    serialization_durations_ms = SampleRecorder(keep_samples)
+    publish_durations_ms = SampleRecorder(keep_samples)
+    overshot_durations_ms = SampleRecorder(keep_samples)
+    actual_rates_hz = SampleRecorder(keep_samples)
+    send_lateness_ms = SampleRecorder(keep_samples)
+    roundtrip_latencies_ms = SampleRecorder(keep_samples)
+    reply_timeouts = 0
+    # NOTE: per-message send times are only retained alongside the other raw samples
+    scheduled_send_offsets_s = array("d")
+    actual_send_offsets_s = array("d")
+    # sequence number of every sample in the per-message columns, and of the
+    # samples of the columns that only get one on some messages (per event)
+    sequence_numbers = array("q")
+    roundtrip_sequence_numbers = array("q")
+    rate_sequence_numbers = array("q")
+    overshot_sequence_numbers = array("q")
+    first_send_s = last_send_s = 0.0
+
+    if resources is not None:
+        resources.begin()
+    if gc_monitor is not None:
+        gc_monitor.begin_phase()
+    anchor_s = scheduler.start()
+    for i in range(num_msgs):
+        wait_start_s = perf_counter()
+        scheduled_s = scheduler.wait()
+        woke_s = perf_counter()
+        over_ms = scheduler.last_lateness_s * 1e3
+        if gc_monitor is not None:
+            gc_monitor.message_start()
+
+        # NOTE: the intended send time travels with the message so the subscriber
+        #       can correct for coordinated omission when this loop stalls
+        bm = BenchmarkMessage(
+            num_bytes,
+            publisher.codec,
+            payload_pool,
+            scheduler.to_time_ns(scheduled_s),
+            i,
+        )
 
-    def close(self) -> None:
-        pass
+        t0 = perf_counter()
+        data = bm.serialize()
+        t1 = perf_counter()
+        serialize_ms = (t1 - t0) * 1e3
 
-    def msg_type(self) -> type:
-        raise NotImplementedError
+        sent_ns = perf_counter_ns()
+        t2 = perf_counter()
+        publisher.send(data)
+        t3 = perf_counter()
+        publish_ms = (t3 - t2) * 1e3
 
+        rtt_ms: Optional[float] = None
+        if roundtrip:
+            rtt_ms = await_echo(publisher, i, sent_ns, reply_timeout_s)
+            if rtt_ms is None:
+                reply_timeouts += 1
+                logger.warning(f"No echo for msg {i} within {reply_timeout_s} s")
+        t4 = perf_counter()
 
-class LcmPublisher(BasePublisher):
-    def __init__(self, url: str, channel: str):
-        self._conn = LCM(provider=url)
-        self._channel = channel
+        logger.info(
+            f"{'(ignoring first message in saved report)' if i == 0 else ''} "
+            f"Sent msg {i+1}/{num_msgs}: ({num_bytes} bytes) (creation_time_ns={bm.creation_time_ns}) "
+            f"encode msg took {serialize_ms:.3f} ms, send msg took {publish_ms:.3f} ms "
+            f"{f'round trip took {rtt_ms:.3f} ms' if rtt_ms is not None else ''}"
+        )
+        if tracer is not None:
+            tracer.span("wait", wait_start_s, woke_s, i)
+            tracer.span("generate", woke_s, t0, i)
+            tracer.span("serialize", t0, t1, i)
+            tracer.span("send", t2, t3, i, flow_start=True)
+            if roundtrip:
+                tracer.span("await_echo", t3, t4, i)
+            tracer.span("log", t4, perf_counter(), i)
 
-        handshake = LCMHandshake(url, channel)
-        handshake.wait_for_subscriber()
+        if i == 0:
+            # NOTE: we do not "count" first message durations in reported statistics as it includes
+            #       extra overhead that the other messages don't have
+            continue
 
-    def send(self, data: bytes) -> None:
-        self._conn.publish(self._channel, data)
+        serialization_durations_ms.record(serialize_ms)
+        publish_durations_ms.record(publish_ms)
+        send_lateness_ms.record((t2 - scheduled_s) * 1e3)
+        if rtt_ms is not None:
+            roundtrip_latencies_ms.record(rtt_ms)
+            if keep_samples:
+                roundtrip_sequence_numbers.append(i)
+        if live is not None:
+            live.record("publish_ms", publish_ms)
+            live.record("send_lateness_ms", (t2 - scheduled_s) * 1e3)
+            if rtt_ms is not None:
+                live.record("roundtrip_latency_ms", rtt_ms)
+        if gc_monitor is not None:
+            # NOTE: the perf_counter() window each measurement was taken over
+            windows = {"publish": (publish_ms, t2, t3)}
+            if rtt_ms is not None:
+                windows["roundtrip"] = (rtt_ms, t2, t4)
+            gc_monitor.message_end(i, windows)
+        if keep_samples:
+            sequence_numbers.append(i)
+            scheduled_send_offsets_s.append(scheduled_s - anchor_s)
+            actual_send_offsets_s.append(t2 - anchor_s)
+
+        # NOTE: rates are computed from the actual send start times; with absolute
+        #       deadlines timer jitter on one send no longer shifts the ones after it
+        if i == 1:
+            first_send_s = t2
+        elif t2 > last_send_s:
+            actual_rates_hz.record(1.0 / (t2 - last_send_s))
+            if keep_samples:
+                rate_sequence_numbers.append(i)
+        last_send_s = t2
+
+        if over_ms > 0:
+            overshot_durations_ms.record(over_ms)
+            if keep_samples:
+                overshot_sequence_numbers.append(i)
+            logger.debug(
+                f"Publish loop overshot by {over_ms:.3f} ms (period was {scheduler.period_s*1e3:.3f} ms)"
+            )
+    resource_usage = resources.end() if resources is not None else None
+    gc_stats, gc_columns = (
+        gc_monitor.end_phase(keep_samples) if gc_monitor is not None else ({}, {})
+    )
 
-    def msg_type(self) -> type:
-        return bench_t
+    serialize_stats = compute_stats(serialization_durations_ms, "ms")
+    publish_stats = compute_stats(publish_durations_ms, "ms")
+    overshot_stats = (
+        compute_stats(overshot_durations_ms, "ms") if overshot_durations_ms else {}
+    )
+    lateness_stats = compute_stats(send_lateness_ms, "ms") if send_lateness_ms else {}
+    rate_stats = compute_stats(actual_rates_hz, "hz") if actual_rates_hz else {}
+    if last_send_s > first_send_s:
+        rate_stats["overall_hz"] = len(actual_rates_hz) / (last_send_s - first_send_s)
 
+    columns: Dict[str, Any] = {}
+    statistics: Dict[str, Any] = {
+        "serialization_duration_statistics": serialize_stats,
+        "publish_duration_statistics": publish_stats,
+        "overshot_publish_duration_statistics": overshot_stats,
+        "actual_transmission_rate_statistics": rate_stats,
+        "send_lateness_statistics": lateness_stats,
+        "skipped_send_periods": scheduler.skipped_periods,
+    }
+    if roundtrip:
+        statistics["roundtrip_latency_statistics"] = (
+            compute_stats(roundtrip_latencies_ms, "ms")
+            if roundtrip_latencies_ms
+            else {}
+        )
+        statistics["reply_timeouts"] = reply_timeouts
+    if resource_usage is not None:
+        statistics["resource_usage"] = resource_usage
+    if gc_monitor is not None:
+        statistics["gc_statistics"] = gc_stats
+    if keep_samples:
+        # NOTE: per message (one row per recorded message, in sequence_numbers
+        #       order): serialization, publish, send offsets, send lateness and
+        #       gc_overlap_publish_ms. Per event (only some messages have one, each
+        #       column next to the sequence numbers it belongs to): overshoots,
+        #       rates (from the previous send to this one) and round trips
+        #       (timeouts have none, gc_overlap_roundtrip_ms matches them)
+        columns = {
+            "sequence_numbers": sequence_numbers,
+            "serialization_durations_ms": serialization_durations_ms.samples,
+            "publish_durations_ms": publish_durations_ms.samples,
+            "scheduled_send_offsets_s": scheduled_send_offsets_s,
+            "actual_send_offsets_s": actual_send_offsets_s,
+            "send_lateness_ms": send_lateness_ms.samples,
+            "overshot_sequence_numbers": overshot_sequence_numbers,
+            "overshot_publish_durations_ms": overshot_durations_ms.samples,
+            "transmission_rate_sequence_numbers": rate_sequence_numbers,
+            "actual_transmission_rates_hz": actual_rates_hz.samples,
+        }
+        if roundtrip:
+            columns["roundtrip_sequence_numbers"] = roundtrip_sequence_numbers
+            columns["roundtrip_latencies_ms"] = roundtrip_latencies_ms.samples
+        columns.update(gc_columns)
+
+    return statistics, columns
+
+
+def send_workload(
+    publishers: List[BasePublisher],
+    topics: List[TopicSpec],
+    scheduler_strategy: str,
+    scheduler_catch_up: str,
+    keep_samples: bool,
+    resources: Optional[ResourceSampler] = None,
+    live: Optional[LiveMetrics] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Send every topic of a workload concurrently and return the run's (report
+    statistics, raw per-message columns).
+
+    All topics are sent from this one thread in deadline order, so a large
+    message on one topic delays the sends due on the others just like it
+    would in a multi-topic process; that contention shows up as per-topic
+    send lateness. Statistics are reported per topic under topic_statistics
+    and over all topics at the top level.
+    """
+    # NOTE: payload bytes are generated once up front so that the timed loop
+    #       below measures the middleware and not the payload generator
+    payload_pools = [PayloadPool(t.num_bytes, t.pattern) for t in topics]
+    scheduler = MultiRateScheduler(
+        [t.rate_hz for t in topics], scheduler_strategy, scheduler_catch_up
+    )
+    serialization_durations_ms = [SampleRecorder() for _ in topics]
+    publish_durations_ms = [SampleRecorder() for _ in topics]
+    send_lateness_ms = [SampleRecorder() for _ in topics]
+    first_send_s = [0.0] * len(topics)
+    last_send_s = [0.0] * len(topics)
+    sent = [0] * len(topics)
+    # NOTE: one row per recorded message, topic_index and sequence_numbers say
+    #       which topic and which of its messages it belongs to
+    columns: Dict[str, Any] = {
+        "topic_index": array("i"),
+        "sequence_numbers": array("q"),
+        "serialization_durations_ms": array("d"),
+        "publish_durations_ms": array("d"),
+        "send_lateness_ms": array("d"),
+    }
 
-class eCALPublisher(BasePublisher):
-    def __init__(self, topic: str):
-        ecal_core.initialize(sys.argv, f"benchmark_publisher_{topic}")
-        # NOTE: We purposefully do not use ProtoPublisher so that we can
-        #       measure the decode time directly by doing it ourselves
-        # self._pub = ProtoPublisher(topic, Bench)
-        self._pub = ecal_core.publisher(topic, "proto:" + Bench.DESCRIPTOR.full_name)
-        logger.info(
-            f"Waiting for at least one subscriber to register to topic {topic}..."
+    remaining = sum(t.num_msgs for t in topics)
+    if resources is not None:
+        resources.begin()
+    scheduler.start()
+    while remaining:
+        i, scheduled_s = scheduler.wait()
+        topic = topics[i]
+        seq = sent[i]
+        sent[i] += 1
+        remaining -= 1
+        if sent[i] == topic.num_msgs:
+            scheduler.stop(i)
+
+        bm = BenchmarkMessage(
+            topic.num_bytes,
+            publishers[i].codec,
+            payload_pools[i],
+            scheduler.to_time_ns(scheduled_s),
+            seq,
         )
+        t0 = perf_counter()
+        data = bm.serialize()
+        t1 = perf_counter()
+        publishers[i].send(data)
+        t2 = perf_counter()
 
-        with eCALMonitor() as monitor:
-            while not monitor.has_subscriber(topic):
-                sleep(0.01)
-        logger.info(
-            f"Found at least one subscriber for {topic}. Continuing on to rest of process path"
+        logger.debug(
+            f"[{topic.name}] Sent msg {seq+1}/{topic.num_msgs} ({topic.num_bytes} bytes), "
+            f"{scheduler.last_lateness_s*1e3:.3f} ms late"
         )
+        last_send_s[i] = t1
+        if seq == 0:
+            # NOTE: we do not "count" first message durations in reported statistics as it includes
+            #       extra overhead that the other messages don't have
+            first_send_s[i] = t1
+            continue
 
-    def send(self, data: bytes) -> None:
-        self._pub.send(data)
+        serialization_durations_ms[i].record((t1 - t0) * 1e3)
+        publish_durations_ms[i].record((t2 - t1) * 1e3)
+        send_lateness_ms[i].record((t1 - scheduled_s) * 1e3)
+        if live is not None:
+            live.record("publish_ms", (t2 - t1) * 1e3)
+            live.record("send_lateness_ms", (t1 - scheduled_s) * 1e3)
+        if keep_samples:
+            columns["topic_index"].append(i)
+            columns["sequence_numbers"].append(seq)
+            columns["serialization_durations_ms"].append((t1 - t0) * 1e3)
+            columns["publish_durations_ms"].append((t2 - t1) * 1e3)
+            columns["send_lateness_ms"].append((t1 - scheduled_s) * 1e3)
+    resource_usage = resources.end() if resources is not None else None
+
+    def merged(recorders: List[SampleRecorder]) -> Dict[str, float]:
+        total = LogHistogram()
+        for recorder in recorders:
+            total.merge(recorder.histogram)
+        return compute_stats(total, "ms") if total.count else {}
+
+    topic_stats: Dict[str, Any] = {}
+    for i, topic in enumerate(topics):
+        topic_stats[topic.name] = {
+            "serialization_duration_statistics": (
+                compute_stats(serialization_durations_ms[i], "ms")
+                if serialization_durations_ms[i]
+                else {}
+            ),
+            "publish_duration_statistics": (
+                compute_stats(publish_durations_ms[i], "ms")
+                if publish_durations_ms[i]
+                else {}
+            ),
+            "send_lateness_statistics": (
+                compute_stats(send_lateness_ms[i], "ms") if send_lateness_ms[i] else {}
+            ),
+            "actual_transmission_rate_hz": (
+                (sent[i] - 1) / (last_send_s[i] - first_send_s[i])
+                if last_send_s[i] > first_send_s[i]
+                else 0.0
+            ),
+            "skipped_send_periods": scheduler.skipped_periods[i],
+        }
+
+    elapsed_s = max(last_send_s) - min(first_send_s)
+    statistics: Dict[str, Any] = {
+        "serialization_duration_statistics": merged(serialization_durations_ms),
+        "publish_duration_statistics": merged(publish_durations_ms),
+        "send_lateness_statistics": merged(send_lateness_ms),
+        "aggregate_transmission_rate_hz": (
+            (sum(sent) - len(topics)) / elapsed_s if elapsed_s > 0 else 0.0
+        ),
+        "aggregate_transmission_mb_per_s": (
+            sum((n - 1) * t.num_bytes for n, t in zip(sent, topics)) / elapsed_s / 1e6
+            if elapsed_s > 0
+            else 0.0
+        ),
+        "topic_statistics": topic_stats,
+    }
+    if resource_usage is not None:
+        statistics["resource_usage"] = resource_usage
+    return statistics, (columns if keep_samples else {})
 
-    def msg_type(self) -> type:
-        return Bench
 
-    def close(self) -> None:
-        ecal_core.finalize()
+def run_workload(
+    backend: Backend,
+    lcm_url: str,
+    channel_name: str,
+    workload: Path | str,
+    results_dir: Path,
+    scheduler_strategy: str,
+    scheduler_catch_up: str,
+    keep_samples: bool,
+    num_subscribers: int,
+    run_id: str,
+    resources: Optional[ResourceSampler] = None,
+    run_profile: Optional[RunProfile] = None,
+    live: Optional[LiveMetrics] = None,
+) -> None:
+    """Publish every topic of a workload spec and write one report for the run."""
+    topics = load_workload(workload)
+    logger.info(f"Running workload {workload} with {len(topics)} topics")
+
+    # NOTE: one handshake for all topics, set up before the publishers so that no
+    #       announcement is missed (LCM: one ready channel, eCAL: every topic)
+    handshake = backend.create_handshake(
+        lcm_url, channel_name, [t.name for t in topics]
+    )
+    publishers = [
+        backend.create_publisher(lcm_url, t.name, num_subscribers=0) for t in topics
+    ]
+    logger.info(f"Waiting for {num_subscribers} subscriber(s) on {channel_name}...")
+    handshake.wait_for_subscribers(num_subscribers)
+    if run_profile is not None:
+        run_profile.after_setup()
+
+    statistics, columns = send_workload(
+        publishers,
+        topics,
+        scheduler_strategy,
+        scheduler_catch_up,
+        keep_samples,
+        resources,
+        live,
+    )
+    for publisher in publishers:
+        publisher.close()
+
+    report: Dict[str, Any] = {
+        "timestamp_us": int(now() * 1e6),
+        "parameters": {
+            "middleware": backend.name,
+            **backend.describe(),
+            "channel_name": channel_name,
+            "workload": str(workload),
+            "topics": [t.to_dict() for t in topics],
+            "scheduler_strategy": scheduler_strategy,
+            "scheduler_catch_up": scheduler_catch_up,
+            "keep_samples": keep_samples,
+            "num_subscribers": num_subscribers,
+            "run_id": run_id,
+            "resource_interval_s": resources.interval_s if resources else 0.0,
+            "profile": run_profile.describe() if run_profile else None,
+            "live_metrics_interval_s": live.interval_s if live else 0.0,
+            "message_type": str(publishers[0].msg_type()),
+        },
+        **statistics,
+    }
+    out = (
+        results_dir
+        / f"{backend.name}_publisher_benchmark_{report['timestamp_us']}.yaml"
+    )
+    write_report(out, report, columns)
+    logger.info(f"Wrote report to {out}")
 
 
 def main(
@@ -104,6 +518,28 @@ def main(
     results_dir: Path | str,
     log_level: str,
     log_output: str,
+    payload_pattern: str = "random",
+    scheduler_strategy: str = "hybrid",
+    scheduler_catch_up: str = "burst",
+    keep_samples: bool = False,
+    mode: str = "oneway",
+    reply_timeout_s: float = 1.0,
+    run_id: str = "",
+    session_sizes_bytes: Optional[List[int]] = None,
+    session_rates: Optional[List[float]] = None,
+    phase_duration_s: Optional[float] = None,
+    num_subscribers: int = 1,
+    workload: Optional[Path | str] = None,
+    trace: bool = False,
+    trace_capacity: int = DEFAULT_TRACE_CAPACITY,
+    resource_interval_s: float = 0.0,
+    profile: Optional[Path | str] = None,
+    gc_instrumentation: bool = False,
+    trace_malloc: bool = False,
+    clock_sync: bool = False,
+    live_metrics_interval_s: float = 0.0,
+    live_metrics_window_s: Optional[float] = None,
+    live_metrics_port: int = 0,
 ) -> None:
     logging.basicConfig(
         format="%(asctime)s [%(levelname)s] %(message)s",
@@ -113,127 +549,378 @@ def main(
     logger.info(
         f"Starting benchmark ({middleware}): "
         f"channel={channel_name!r}, rate={transmission_rate_setpoint}Hz, "
-        f"num_bytes={num_bytes}, num_msgs={num_msgs}"
+        f"num_bytes={num_bytes}, num_msgs={num_msgs}, payload={payload_pattern}, mode={mode}"
     )
 
-    assert middleware in ("lcm", "ecal"), "middleware must be 'lcm' or 'ecal'"
+    backend = get_backend(middleware)
+    assert mode in BENCHMARK_MODES, f"mode must be one of {BENCHMARK_MODES}"
+    assert reply_timeout_s > 0, "reply_timeout_s must be > 0"
     assert transmission_rate_setpoint > 0, "transmission_rate_setpoint must be > 0"
     assert num_msgs > 0, "num_msgs must be > 0"
+    assert num_subscribers > 0, "num_subscribers must be > 0"
+    # NOTE: every subscriber would echo, and the control channel expects one answer
+    assert num_subscribers == 1 or mode == "oneway", "roundtrip needs 1 subscriber"
+    assert num_subscribers == 1 or not (
+        session_sizes_bytes or session_rates
+    ), "sessions need 1 subscriber"
+    assert not workload or (
+        mode == "oneway" and not (session_sizes_bytes or session_rates)
+    ), "a workload is a single one-way run"
+    assert (
+        not workload or backend.supports_workload
+    ), f"{middleware} does not support workloads"
+    assert not (trace and workload), "workloads are not traced"
+    assert not (
+        (gc_instrumentation or trace_malloc) and workload
+    ), "workloads are not GC instrumented"
+    assert not (clock_sync and workload), "workloads are not clock synchronized"
+    assert (
+        not clock_sync or backend.clock_sync is not None
+    ), f"{middleware} has no clock synchronization"
+
+    # NOTE: applied before the middleware is created so that its threads inherit
+    #       the affinity and scheduling policy
+    run_profile = load_profile(profile, "publisher")
+    if run_profile.callback_cpus is not None:
+        logger.warning("callback_cpus only applies to subscribers, ignoring it")
+    run_profile.apply()
 
     if isinstance(results_dir, str):
         results_dir = Path(results_dir)
     results_dir = results_dir / str(time_ns())
     results_dir.mkdir(parents=True, exist_ok=True)
 
-    if middleware == "lcm":
-        publisher: BasePublisher = LcmPublisher(lcm_url, channel_name)
-    elif middleware == "ecal":
-        publisher = eCALPublisher(channel_name)
-    else:
-        raise ValueError(f"{middleware} not supported")
-
-    period_s = 1.0 / transmission_rate_setpoint
-    serialization_durations_ms: List[float] = []
-    publish_durations_ms: List[float] = []
-    overshot_durations_ms: List[float] = []
-    publish_timestamps_s: List[float] = []
-
-    for i in range(num_msgs):
-        loop_start = perf_counter()
-
-        bm = BenchmarkMessage(num_bytes, middleware)
-
-        t0 = perf_counter()
-        data = bm.serialize()
-        t1 = perf_counter()
-        serialize_ms = (t1 - t0) * 1e3
-
-        t2 = perf_counter()
-        publisher.send(data)
-        t3 = perf_counter()
-        publish_ms = (t3 - t2) * 1e3
-
-        total_s = t3 - loop_start
-
-        logger.info(
-            f"{'(ignoring first message in saved report)' if i == 0 else ''} "
-            f"Sent msg {i+1}/{num_msgs}: ({num_bytes} bytes) (creation_time_ns={bm.creation_time_ns}) "
-            f"encode msg took {serialize_ms:.3f} ms, send msg took {publish_ms:.3f} ms "
+    resources = create_sampler("publisher", resource_interval_s)
+    live = create_live_metrics(
+        "publisher",
+        "publish_ms",
+        live_metrics_interval_s,
+        live_metrics_window_s,
+        live_metrics_port,
+        results_dir,
+        {"middleware": middleware, "channel": channel_name, "run_id": run_id},
+    )
+    if workload:
+        run_workload(
+            backend,
+            lcm_url,
+            channel_name,
+            workload,
+            results_dir,
+            scheduler_strategy,
+            scheduler_catch_up,
+            keep_samples,
+            num_subscribers,
+            run_id,
+            resources,
+            run_profile,
+            live,
         )
-
-        if i == 0:
-            # NOTE: we do not "count" first message durations in reported statistics as it includes
-            #       extra overhead that the other messages don't have
-            if total_s < period_s:
-                sleep(period_s - total_s)
-            continue
-
-        serialization_durations_ms.append(serialize_ms)
-        publish_durations_ms.append(publish_ms)
-        publish_timestamps_s.append(t3)
-
-        if total_s < period_s:
-            sleep(period_s - total_s)
-        else:
-            over_ms = (total_s - period_s) * 1e3
-            overshot_durations_ms.append(over_ms)
-            logger.debug(
-                f"Publish loop overshot by {over_ms:.3f} ms (period was {period_s*1e3:.3f} ms)"
-            )
-
-    publisher.close()
-
-    serialize_stats = compute_stats(serialization_durations_ms, "ms")
-    publish_stats = compute_stats(publish_durations_ms, "ms")
-    overshot_stats = (
-        compute_stats(overshot_durations_ms, "ms") if overshot_durations_ms else {}
+        if resources is not None:
+            resources.close()
+        if live is not None:
+            live.close()
+        return
+
+    # NOTE: in round-trip mode the subscriber runs as an echo responder (--echo) and
+    #       republishes every message on the reply channel
+    roundtrip = mode == "roundtrip"
+    reply_channel = echo_channel(channel_name) if roundtrip else None
+    # NOTE: answered from before the subscribers announce themselves (they probe
+    #       first) until every one of them has probed after its last run
+    clock: Optional[ClockSync] = None
+    if clock_sync:
+        clock = backend.create_clock_sync(lcm_url, channel_name, server=True)
+        clock.serve()
+    publisher = backend.create_publisher(
+        lcm_url, channel_name, reply_channel, num_subscribers
     )
-    actual_rates_hz = [
-        1.0 / (t2 - t1)
-        for t1, t2 in zip(publish_timestamps_s, publish_timestamps_s[1:])
-        if t2 > t1
-    ]
-    rate_stats = compute_stats(actual_rates_hz, "hz") if actual_rates_hz else {}
-
-    report: Dict[str, Any] = {
-        "timestamp_us": int(now() * 1e6),
-        "parameters": {
-            "middleware": middleware,
-            "channel_name": channel_name,
-            "transmission_rate_hz_setpoint": transmission_rate_setpoint,
-            "num_bytes": num_bytes,
-            "num_msgs": num_msgs,
-            "message_type": str(publisher.msg_type()),
-        },
-        "serialization_durations_ms": serialization_durations_ms,
-        "serialization_duration_statistics": serialize_stats,
-        "publish_durations_ms": publish_durations_ms,
-        "publish_duration_statistics": publish_stats,
-        "overshot_publish_durations_ms": overshot_durations_ms,
-        "overshot_publish_duration_statistics": overshot_stats,
-        "actual_transmission_rates_hz": actual_rates_hz,
-        "actual_transmission_rate_statistics": rate_stats,
-    }
 
-    out = (
-        results_dir / f"{middleware}_publisher_benchmark_{report['timestamp_us']}.yaml"
-    )
-    with open(out, "w") as f:
-        yaml.dump(report, f)
-    logger.info(f"Wrote report to {out}")
+    # NOTE: a session steps one publisher/subscriber pair through every phase
+    #       over a control channel instead of restarting both per size and rate
+    control: Optional[SessionControl] = None
+    if session_sizes_bytes or session_rates:
+        phases = build_phases(
+            session_sizes_bytes or [num_bytes],
+            session_rates or [transmission_rate_setpoint],
+            num_msgs,
+            phase_duration_s,
+        )
+        control = backend.create_session_control(lcm_url, channel_name, publisher=True)
+    else:
+        phases = [Phase(0, num_bytes, transmission_rate_setpoint, num_msgs)]
+    run_profile.after_setup()
+
+    gc_monitor: Optional[GcMonitor] = None
+    if gc_instrumentation or trace_malloc:
+        gc_monitor = GcMonitor("publisher", trace_malloc, results_dir)
+        gc_monitor.install()
+
+    tracer: Optional[SpanTracer] = None
+    trace_path: Optional[Path] = None
+    if trace:
+        tracer = SpanTracer(f"publisher ({middleware})", trace_capacity)
+        # NOTE: one trace covers every phase of a session
+        trace_path = results_dir / f"{middleware}_publisher_trace_{time_ns()}.json"
+
+    for phase in phases:
+        if control is not None:
+            logger.info(f"Starting {phase}")
+            if not control.request(START, phase):
+                break
+        if tracer is not None:
+            tracer.set_phase(phase.index)
+        if live is not None and control is not None:
+            live.set_phase(phase.index)
+
+        statistics, columns = send_phase(
+            publisher,
+            phase.transmission_rate_hz,
+            phase.num_bytes,
+            phase.num_msgs,
+            payload_pattern,
+            scheduler_strategy,
+            scheduler_catch_up,
+            keep_samples,
+            roundtrip,
+            reply_timeout_s,
+            tracer,
+            resources,
+            gc_monitor,
+            live,
+        )
+        if control is not None:
+            # NOTE: waits until the subscriber has drained this phase, so that no
+            #       message of it can be counted in the next one
+            control.request(END, phase)
+
+        report: Dict[str, Any] = {
+            "timestamp_us": int(now() * 1e6),
+            "parameters": {
+                "middleware": middleware,
+                **backend.describe(),
+                "channel_name": channel_name,
+                "transmission_rate_hz_setpoint": phase.transmission_rate_hz,
+                "num_bytes": phase.num_bytes,
+                "num_msgs": phase.num_msgs,
+                "payload_pattern": payload_pattern,
+                "scheduler_strategy": scheduler_strategy,
+                "scheduler_catch_up": scheduler_catch_up,
+                "keep_samples": keep_samples,
+                "mode": mode,
+                "num_subscribers": num_subscribers,
+                "run_id": run_id,
+                "resource_interval_s": resources.interval_s if resources else 0.0,
+                "profile": run_profile.describe(),
+                "gc_instrumentation": gc_monitor is not None,
+                "tracemalloc": trace_malloc,
+                "clock_sync": clock_sync,
+                "live_metrics_interval_s": live.interval_s if live else 0.0,
+                "message_type": str(publisher.msg_type()),
+            },
+            **statistics,
+        }
+        if control is not None:
+            report["parameters"]["phase_index"] = phase.index
+            report["parameters"]["num_phases"] = len(phases)
+        if trace_path is not None:
+            report["parameters"]["trace_file"] = trace_path.name
+
+        out = (
+            results_dir
+            / f"{middleware}_publisher_benchmark_{report['timestamp_us']}.yaml"
+        )
+        write_report(out, report, columns)
+        logger.info(f"Wrote report to {out}")
+        run_profile.between_phases()
+
+    if control is not None:
+        # NOTE: nothing is left to wait for, so a lost FINISHED only costs a second
+        control.request(FINISH, phases[-1], timeout_s=1.0)
+        control.close()
+    if clock is not None:
+        if not clock.wait_for_done(num_subscribers, DEFAULT_CLOCK_SYNC_TIMEOUT_S):
+            logger.warning("Not every subscriber finished probing the clock")
+        clock.close()
+    publisher.close()
+    if resources is not None:
+        resources.close()
+    if live is not None:
+        live.close()
+    if gc_monitor is not None:
+        gc_monitor.uninstall()
+    if tracer is not None:
+        tracer.write(trace_path)
+        logger.info(
+            f"Wrote trace of {tracer.count} spans to {trace_path}"
+            f" ({tracer.dropped_spans} dropped)"
+        )
 
 
 if __name__ == "__main__":
-    parser = ArgumentParser(description="Benchmark LCM or eCAL publisher")
-    parser.add_argument("--middleware", choices=("lcm", "ecal"), default="lcm")
+    parser = ArgumentParser(description="Benchmark a middleware publisher")
     parser.add_argument(
-        "--lcm-url", type=str, default="udpm://239.255.76.67:7667?ttl=1"
+        "--middleware",
+        choices=backend_names(),
+        default="lcm",
+        help="Backend to benchmark, see backends.py (default=lcm)",
+    )
+    parser.add_argument(
+        "--lcm-url",
+        type=str,
+        default="udpm://239.255.76.67:7667?ttl=1",
+        help="LCM provider; raw transports also use it for their handshake, and raw "
+        "udp for its multicast group",
     )
     parser.add_argument("--channel-name", type=str, default="/benchmark")
     parser.add_argument("--transmission-rate", type=int, default=100)
     parser.add_argument("--num-bytes", type=int, default=1024)
     parser.add_argument("--num-msgs", type=int, default=5)
+    parser.add_argument(
+        "--payload-pattern",
+        choices=PAYLOAD_PATTERNS,
+        default="random",
+        help="Content of the message blob (default=random)",
+    )
+    parser.add_argument(
+        "--scheduler-strategy",
+        choices=SLEEP_STRATEGIES,
+        default="hybrid",
+        help="How the publisher waits for each send deadline (default=hybrid)",
+    )
+    parser.add_argument(
+        "--scheduler-catch-up",
+        choices=CATCH_UP_POLICIES,
+        default="burst",
+        help="What the publisher does after missing a send deadline (default=burst)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=BENCHMARK_MODES,
+        default="oneway",
+        help="roundtrip: wait for each message to be echoed back by a subscriber "
+        "started with --echo and report clock-independent round-trip latency (default=oneway)",
+    )
+    parser.add_argument(
+        "--reply-timeout-s",
+        type=float,
+        default=1.0,
+        help="Round-trip mode: how long to wait for each echo (default=1.0)",
+    )
+    parser.add_argument(
+        "--num-subscribers",
+        type=int,
+        default=1,
+        help="Fan-out: wait for this many distinct subscriber processes before sending (default=1)",
+    )
+    parser.add_argument(
+        "--workload",
+        type=Path,
+        default=None,
+        help="YAML spec of many topics (rate, size, pattern each) to send concurrently "
+        "instead of --channel-name; see workloads/mixed.yaml",
+    )
+    parser.add_argument(
+        "--session-sizes-bytes",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Run one session over these message sizes (x --session-rates) in this "
+        "process; the subscriber must be started with --session",
+    )
+    parser.add_argument(
+        "--session-rates",
+        nargs="+",
+        type=float,
+        default=None,
+        help="Send rates (Hz) of a session (default=--transmission-rate)",
+    )
+    parser.add_argument(
+        "--phase-duration-s",
+        type=float,
+        default=None,
+        help="Session only: send rate * this many messages per phase instead of --num-msgs",
+    )
+    parser.add_argument(
+        "--keep-samples",
+        action="store_true",
+        help="Also save every per-message sample, not just the streaming statistics",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a span for every step of every message and write them as "
+        "Chrome trace JSON next to the reports (open in https://ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--trace-capacity",
+        type=int,
+        default=DEFAULT_TRACE_CAPACITY,
+        help="Spans the preallocated trace buffer holds, later ones are dropped "
+        f"(default={DEFAULT_TRACE_CAPACITY})",
+    )
+    parser.add_argument(
+        "--resource-interval-s",
+        type=float,
+        default=0.0,
+        help="Sample CPU time, context switches, RSS and kernel UDP counters from "
+        f"/proc this often during a run, e.g. {DEFAULT_RESOURCE_INTERVAL_S}; the sampler "
+        "thread competes with the measurement, so it is off by default (default=0)",
+    )
+    parser.add_argument(
+        "--gc-instrumentation",
+        action="store_true",
+        help="Time every GC pause, count allocations per message and report which "
+        "fraction of the p99 outliers overlapped a pause",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="--gc-instrumentation plus tracemalloc: peak allocation per message and "
+        "a snapshot per phase next to the reports (slow)",
+    )
+    parser.add_argument(
+        "--live-metrics-interval-s",
+        type=float,
+        default=0.0,
+        help="Publish rolling-window throughput and p50/p99 of the publish duration, "
+        "send lateness and round trip this often while running: appended to "
+        "<middleware>_publisher_live_metrics.jsonl and written as Prometheus text "
+        "to .prom next to the reports, 0 disables (default=0)",
+    )
+    parser.add_argument(
+        "--live-metrics-window-s",
+        type=float,
+        default=None,
+        help="Length of the rolling window (default: --live-metrics-interval-s)",
+    )
+    parser.add_argument(
+        "--live-metrics-port",
+        type=int,
+        default=0,
+        help="Also serve the live metrics on http://127.0.0.1:<port>/metrics "
+        "(default=0, not served)",
+    )
+    parser.add_argument(
+        "--clock-sync",
+        action="store_true",
+        help="Answer the clock probes of subscribers started with --clock-sync, "
+        "which correct their one-way latencies for the offset between the clocks",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="Run profile YAML (CPU affinity, SCHED_FIFO, GC control) to run this "
+        "process with; see profiles/pinned.yaml",
+    )
     parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default="",
+        help="Identifier shared by the publisher and subscriber reports of one run",
+    )
     parser.add_argument(
         "--log-level",
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
@@ -265,4 +952,26 @@ if __name__ == "__main__":
         results_dir=args.results_dir,
         log_level=args.log_level,
         log_output=args.log_output,
+        payload_pattern=args.payload_pattern,
+        scheduler_strategy=args.scheduler_strategy,
+        scheduler_catch_up=args.scheduler_catch_up,
+        keep_samples=args.keep_samples,
+        mode=args.mode,
+        reply_timeout_s=args.reply_timeout_s,
+        run_id=args.run_id,
+        session_sizes_bytes=args.session_sizes_bytes,
+        session_rates=args.session_rates,
+        phase_duration_s=args.phase_duration_s,
+        num_subscribers=args.num_subscribers,
+        workload=args.workload,
+        trace=args.trace,
+        trace_capacity=args.trace_capacity,
+        resource_interval_s=args.resource_interval_s,
+        profile=args.profile,
+        gc_instrumentation=args.gc_instrumentation,
+        trace_malloc=args.tracemalloc,
+        clock_sync=args.clock_sync,
+        live_metrics_interval_s=args.live_metrics_interval_s,
+        live_metrics_window_s=args.live_metrics_window_s,
+        live_metrics_port=args.live_metrics_port,
     )
@@ -0,0 +1,391 @@
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+from time import time as now
+from time import time_ns
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from backends import backend_names
+from runner import run_pair
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES_BYTES = [
+    1024 * kib for kib in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+]
+
+
+class Thresholds:
+    """What a trial at a given send rate must achieve to count as sustainable."""
+
+    def __init__(
+        self, max_loss_rate: float, max_p99_latency_ms: float, min_rate_fraction: float
+    ):
+        self.max_loss_rate = max_loss_rate
+        self.max_p99_latency_ms = max_p99_latency_ms
+        self.min_rate_fraction = min_rate_fraction
+
+    def check(
+        self,
+        rate_hz: float,
+        pub_report: Optional[Dict[str, Any]],
+        sub_report: Optional[Dict[str, Any]],
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Return (sustainable, trial summary) for one trial's reports."""
+        summary: Dict[str, Any] = {"rate_hz": rate_hz}
+        if pub_report is None or sub_report is None:
+            summary["failure"] = "missing report"
+            return False, summary
+
+        delivery = sub_report.get("delivery_statistics", {})
+        # NOTE: coordinated-omission corrected latency, so a publisher that falls
+        #       behind its schedule is penalized instead of hiding the backlog
+        latency = sub_report.get("corrected_oneway_latency_statistics", {})
+        sent_hz = pub_report.get("actual_transmission_rate_statistics", {}).get(
+            "overall_hz", 0.0
+        )
+        summary.update(
+            {
+                "sent_hz": sent_hz,
+                "delivered_hz": delivery.get("delivered_throughput_hz", 0.0),
+                "loss_rate": delivery.get("loss_rate", 1.0),
+                "p99_latency_ms": latency.get("p99_ms", float("inf")),
+            }
+        )
+
+        if summary["loss_rate"] > self.max_loss_rate:
+            summary["failure"] = "loss"
+        elif summary["p99_latency_ms"] > self.max_p99_latency_ms:
+            summary["failure"] = "p99 latency"
+        elif sent_hz < self.min_rate_fraction * rate_hz:
+            summary["failure"] = "publisher could not keep up"
+        return "failure" not in summary, summary
+
+
+def find_max_rate(
+    middleware: str,
+    num_bytes: int,
+    thresholds: Thresholds,
+    results_dir: Path,
+    start_rate_hz: float,
+    max_rate_hz: float,
+    ramp_factor: float,
+    rel_tolerance: float,
+    trial_duration_s: float,
+    min_trial_msgs: int,
+    trial_args: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Find the highest send rate for one (middleware, size) that meets the
+    thresholds: ramp the rate geometrically until a trial fails, then binary
+    search between the last passing and the first failing rate until they are
+    within rel_tolerance of each other.
+    """
+    trials: List[Dict[str, Any]] = []
+    best: Optional[Dict[str, Any]] = None
+
+    def trial(rate_hz: float) -> bool:
+        nonlocal best
+        num_msgs = max(min_trial_msgs, int(rate_hz * trial_duration_s))
+        trial_dir = (
+            results_dir / f"{middleware}_{num_bytes}B_{rate_hz:.0f}Hz_{time_ns()}"
+        )
+        pub_report, sub_report = run_pair(
+            middleware, num_bytes, rate_hz, num_msgs, trial_dir, **trial_args
+        )
+        ok, summary = thresholds.check(rate_hz, pub_report, sub_report)
+        summary["results_dir"] = str(trial_dir)
+        trials.append(summary)
+        logger.info(
+            f"[{middleware} {num_bytes} B] {rate_hz:.0f} Hz: "
+            f"{'ok' if ok else 'FAILED (' + summary['failure'] + ')'} "
+            f"loss={summary.get('loss_rate', float('nan')):.4%} "
+            f"p99={summary.get('p99_latency_ms', float('nan')):.3f} ms"
+        )
+        if ok and (best is None or rate_hz > best["rate_hz"]):
+            best = summary
+        return ok
+
+    # 1) ramp
+    lo, hi = 0.0, None
+    rate = start_rate_hz
+    while rate <= max_rate_hz:
+        if not trial(rate):
+            hi = rate
+            break
+        lo = rate
+        rate *= ramp_factor
+    if hi is None:
+        logger.warning(
+            f"[{middleware} {num_bytes} B] still sustainable at {lo:.0f} Hz, "
+            f"capacity is capped by --max-rate"
+        )
+
+    # even the start rate failed: ramp down until something passes
+    if lo == 0 and hi is not None:
+        rate = hi / ramp_factor
+        while rate >= 1.0:
+            if trial(rate):
+                lo = rate
+                break
+            hi = rate
+            rate /= ramp_factor
+
+    # 2) binary search between last pass and first failure
+    while hi is not None and lo > 0 and hi / lo > 1 + rel_tolerance:
+        mid = (lo + hi) / 2
+        if trial(mid):
+            lo = mid
+        else:
+            hi = mid
+
+    delivered_hz = best["delivered_hz"] if best else 0.0
+    return {
+        "middleware": middleware,
+        "num_bytes": num_bytes,
+        "max_sustainable_rate_hz": lo,
+        "capped_by_max_rate": hi is None,
+        "delivered_msgs_per_s": delivered_hz,
+        "delivered_mb_per_s": delivered_hz * num_bytes / 1e6,
+        "p99_latency_ms": best["p99_latency_ms"] if best else None,
+        "loss_rate": best["loss_rate"] if best else None,
+        "trials": trials,
+    }
+
+
+def plot_capacity_curve(curve: List[Dict[str, Any]], output_dir: Path) -> None:
+    # NOTE: imported here so the search itself runs where matplotlib is not installed
+    import matplotlib.pyplot as plt
+
+    for key, label, filename in (
+        (
+            "delivered_msgs_per_s",
+            "Max Sustainable Rate (msgs/s)",
+            "capacity_msgs_per_s",
+        ),
+        (
+            "delivered_mb_per_s",
+            "Max Sustainable Throughput (MB/s)",
+            "capacity_mb_per_s",
+        ),
+    ):
+        plt.figure()
+        for mw in sorted({point["middleware"] for point in curve}):
+            points = sorted(
+                (p["num_bytes"] / 1024.0, p[key])
+                for p in curve
+                if p["middleware"] == mw
+            )
+            plt.plot(*zip(*points), marker="o", label=mw)
+        plt.xscale("log", base=2)
+        plt.xlabel("Message Size (KiB)")
+        plt.ylabel(label)
+        plt.title(f"{label} vs. Message Size")
+        plt.grid(linestyle="--", alpha=0.5)
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(output_dir / f"{filename}.png")
+        plt.close()
+
+
+def main(
+    middlewares: List[str],
+    sizes_bytes: List[int],
+    results_dir: Path | str,
+    max_loss_rate: float,
+    max_p99_latency_ms: float,
+    min_rate_fraction: float,
+    start_rate_hz: float,
+    max_rate_hz: float,
+    ramp_factor: float,
+    rel_tolerance: float,
+    trial_duration_s: float,
+    min_trial_msgs: int,
+    lcm_url: str,
+    channel_name: str,
+    plot: bool,
+    log_level: str,
+    resource_interval_s: float = 0.0,
+) -> None:
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        level=getattr(logging, log_level),
+    )
+    assert ramp_factor > 1, "ramp_factor must be > 1"
+    assert (
+        0 < start_rate_hz <= max_rate_hz
+    ), "must have 0 < start_rate_hz <= max_rate_hz"
+
+    if isinstance(results_dir, str):
+        results_dir = Path(results_dir)
+    results_dir = results_dir / f"saturation_{time_ns()}"
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    thresholds = Thresholds(max_loss_rate, max_p99_latency_ms, min_rate_fraction)
+    resource_args = (
+        ["--resource-interval-s", str(resource_interval_s)]
+        if resource_interval_s > 0
+        else []
+    )
+    trial_args = {
+        "channel_name": channel_name,
+        "publisher_args": ["--lcm-url", lcm_url, *resource_args],
+        "subscriber_args": [
+            "--lcm-url",
+            lcm_url,
+            "--receive-timeout-s",
+            "1.0",
+            *resource_args,
+        ],
+    }
+
+    curve: List[Dict[str, Any]] = []
+    for middleware in middlewares:
+        for num_bytes in sizes_bytes:
+            curve.append(
+                find_max_rate(
+                    middleware,
+                    num_bytes,
+                    thresholds,
+                    results_dir / "trials",
+                    start_rate_hz,
+                    max_rate_hz,
+                    ramp_factor,
+                    rel_tolerance,
+                    trial_duration_s,
+                    min_trial_msgs,
+                    trial_args,
+                )
+            )
+            point = curve[-1]
+            logger.info(
+                f"[{middleware} {num_bytes} B] capacity: "
+                f"{point['max_sustainable_rate_hz']:.0f} Hz, "
+                f"{point['delivered_mb_per_s']:.3f} MB/s"
+            )
+
+    report: Dict[str, Any] = {
+        "timestamp_us": int(now() * 1e6),
+        "parameters": {
+            "middlewares": middlewares,
+            "sizes_bytes": sizes_bytes,
+            "max_loss_rate": max_loss_rate,
+            "max_p99_latency_ms": max_p99_latency_ms,
+            "min_rate_fraction": min_rate_fraction,
+            "start_rate_hz": start_rate_hz,
+            "max_rate_hz": max_rate_hz,
+            "ramp_factor": ramp_factor,
+            "rel_tolerance": rel_tolerance,
+            "trial_duration_s": trial_duration_s,
+            "resource_interval_s": resource_interval_s,
+        },
+        "capacity_curve": curve,
+    }
+    out = results_dir / f"capacity_curve_{report['timestamp_us']}.yaml"
+    with open(out, "w") as f:
+        yaml.dump(report, f)
+    logger.info(f"Wrote capacity curve to {out}")
+
+    if plot:
+        plot_capacity_curve(curve, results_dir)
+        logger.info(f"Wrote capacity curve plots to {results_dir}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Find the maximum sustainable send rate per message size "
+        "(ramp + binary search over publisher/subscriber runs)"
+    )
+    parser.add_argument(
+        "--middleware", nargs="+", choices=backend_names(), default=["lcm", "ecal"]
+    )
+    parser.add_argument(
+        "--sizes-bytes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES_BYTES,
+        help="Message sizes to search (default=1 KiB .. 1 MiB in powers of 2)",
+    )
+    parser.add_argument(
+        "--max-loss-rate",
+        type=float,
+        default=0.0,
+        help="Highest loss rate a sustainable rate may have (default=0.0)",
+    )
+    parser.add_argument(
+        "--max-p99-latency-ms",
+        type=float,
+        default=10.0,
+        help="Highest corrected p99 one-way latency a sustainable rate may have (default=10.0)",
+    )
+    parser.add_argument(
+        "--min-rate-fraction",
+        type=float,
+        default=0.95,
+        help="Fraction of the target rate the publisher must actually reach (default=0.95)",
+    )
+    parser.add_argument("--start-rate", type=float, default=100.0)
+    parser.add_argument("--max-rate", type=float, default=100_000.0)
+    parser.add_argument(
+        "--ramp-factor",
+        type=float,
+        default=2.0,
+        help="Rate multiplier between ramp trials (default=2.0)",
+    )
+    parser.add_argument(
+        "--rel-tolerance",
+        type=float,
+        default=0.05,
+        help="Stop the binary search once pass/fail rates are this close (default=0.05)",
+    )
+    parser.add_argument(
+        "--trial-duration-s",
+        type=float,
+        default=2.0,
+        help="Nominal length of each trial; sets its message count (default=2.0)",
+    )
+    parser.add_argument("--min-trial-msgs", type=int, default=100)
+    parser.add_argument(
+        "--lcm-url", type=str, default="udpm://239.255.76.67:7667?ttl=1"
+    )
+    parser.add_argument("--channel-name", type=str, default="/benchmark")
+    parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--resource-interval-s",
+        type=float,
+        default=0.0,
+        help="Have both sides of every trial sample their resource usage this often, "
+        "e.g. 0.1 (default=0, off)",
+    )
+    parser.add_argument(
+        "--plot", action="store_true", help="Also plot the capacity curves (matplotlib)"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set the logging level. (default=INFO)",
+    )
+    args = parser.parse_args()
+
+    main(
+        middlewares=args.middleware,
+        sizes_bytes=args.sizes_bytes,
+        results_dir=args.results_dir,
+        max_loss_rate=args.max_loss_rate,
+        max_p99_latency_ms=args.max_p99_latency_ms,
+        min_rate_fraction=args.min_rate_fraction,
+        start_rate_hz=args.start_rate,
+        max_rate_hz=args.max_rate,
+        ramp_factor=args.ramp_factor,
+        rel_tolerance=args.rel_tolerance,
+        trial_duration_s=args.trial_duration_s,
+        min_trial_msgs=args.min_trial_msgs,
+        lcm_url=args.lcm_url,
+        channel_name=args.channel_name,
+        plot=args.plot,
+        log_level=args.log_level,
+        resource_interval_s=args.resource_interval_s,
+    )
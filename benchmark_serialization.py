@@ -0,0 +1,461 @@
+"""
+Transport-free serialization microbenchmark.
+
+Times encode and decode of every codec in-process, without any middleware or
+publish loop: bench_t (LCM) and Bench (protobuf) with their eager and
+zero-copy decoders, next to a struct-packed layout and a raw bytes copy as
+baselines. Every (codec, size) cell runs warmup iterations, then repeated
+timed batches; the per-operation time of each batch is one sample. Protobuf
+is benchmarked once per requested implementation (upb/cpp/python, see
+api_implementation.Type()), each in a child process because the
+implementation is fixed when google.protobuf is first imported.
+"""
+
+import gc
+import logging
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from collections import namedtuple
+from pathlib import Path
+from struct import Struct
+from time import perf_counter_ns
+from time import time as now
+from time import time_ns
+from typing import Any, Callable, Dict, List, Tuple
+
+from google.protobuf.internal import api_implementation
+
+from benchmark import (LCM_CODEC, PAYLOAD_PATTERNS, PROTO_CODEC, Codec,
+                       PayloadPool, compute_stats, generate_lcm_benchmark_msg)
+from histogram import SampleRecorder
+from results import write_report
+
+logger = logging.getLogger(__name__)
+
+PROTOBUF_IMPLEMENTATIONS = ("upb", "cpp", "python")
+# NOTE: set before google.protobuf is imported, it selects the implementation
+PROTOBUF_IMPLEMENTATION_ENV = "PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"
+DEFAULT_SIZES_BYTES = [64, 1024, 65536, 1048576]
+
+# what a decoded baseline message looks like; the same fields as bench_t / Bench
+_DecodedMsg = namedtuple(
+    "_DecodedMsg",
+    [
+        "num_bytes",
+        "blob",
+        "creation_timestamp_ns",
+        "scheduled_timestamp_ns",
+        "sequence_number",
+    ],
+)
+# struct baseline: the bench_t fields in one fixed header, followed by the blob
+_STRUCT_HEADER = Struct("<iqqq")
+
+
+def _struct_encode(msg: Any) -> bytes:
+    return (
+        _STRUCT_HEADER.pack(
+            msg.num_bytes,
+            msg.creation_timestamp_ns,
+            msg.scheduled_timestamp_ns,
+            msg.sequence_number,
+        )
+        + msg.blob
+    )
+
+
+def _struct_decode(data: bytes) -> _DecodedMsg:
+    num_bytes, creation, scheduled, sequence_number = _STRUCT_HEADER.unpack_from(data)
+    blob = data[_STRUCT_HEADER.size : _STRUCT_HEADER.size + num_bytes]
+    return _DecodedMsg(num_bytes, blob, creation, scheduled, sequence_number)
+
+
+def _raw_encode(msg: Any) -> bytes:
+    return bytes(msg.blob)
+
+
+def _raw_decode(data: bytes) -> _DecodedMsg:
+    # NOTE: bytes(data) would return data itself, a memoryview forces the copy
+    return _DecodedMsg(len(data), bytes(memoryview(data)), 0, 0, 0)
+
+
+STRUCT_CODEC = Codec(
+    "struct", None, generate_lcm_benchmark_msg, _struct_encode, _struct_decode
+)
+RAW_CODEC = Codec("raw", None, generate_lcm_benchmark_msg, _raw_encode, _raw_decode)
+
+CODECS: Dict[str, Codec] = {
+    "lcm": LCM_CODEC,
+    "lcm_zero_copy": LCM_CODEC.zero_copy_variant(),
+    "proto": PROTO_CODEC,
+    "proto_zero_copy": PROTO_CODEC.zero_copy_variant(),
+    "struct": STRUCT_CODEC,
+    "raw": RAW_CODEC,
+}
+# codecs whose cost depends on the protobuf implementation
+PROTOBUF_CODECS = ("proto", "proto_zero_copy")
+
+
+def _read_fields(msg: Any) -> tuple:
+    # NOTE: part of every timed decode, lazy decoders only do their work here
+    return (
+        msg.blob,
+        msg.creation_timestamp_ns,
+        msg.scheduled_timestamp_ns,
+        msg.sequence_number,
+    )
+
+
+def time_batches(
+    operation: Callable[[], object], num_batches: int, batch_size: int
+) -> SampleRecorder:
+    """
+    Run num_batches timed batches of batch_size calls of `operation`. Records
+    the mean time per call (ms) of every batch.
+    """
+    recorder = SampleRecorder(keep_samples=True)
+    calls = range(batch_size)
+    for _ in range(num_batches):
+        t0 = perf_counter_ns()
+        for _ in calls:
+            operation()
+        recorder.record((perf_counter_ns() - t0) / batch_size / 1e6)
+    return recorder
+
+
+def benchmark_codec(
+    codec: Codec,
+    num_bytes: int,
+    payload_pattern: str,
+    num_batches: int,
+    batch_size: int,
+    warmup: int,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Time encode and decode of one message of num_bytes, returns the cell's
+    (report statistics, per-batch columns).
+    """
+    msg = codec.generate(num_bytes, PayloadPool(num_bytes, payload_pattern))
+    data = codec.encode(msg)
+    decoded = codec.decode(data)
+    assert bytes(decoded.blob) == bytes(msg.blob), f"{codec} does not round trip"
+
+    encode, decode = codec.encode, codec.decode
+    for _ in range(warmup):
+        encode(msg)
+    for _ in range(warmup):
+        _read_fields(decode(data))
+    # NOTE: collect leftovers of the previous cell now instead of inside a batch
+    gc.collect()
+    encode_durs_ms = time_batches(lambda: encode(msg), num_batches, batch_size)
+    gc.collect()
+    decode_durs_ms = time_batches(
+        lambda: _read_fields(decode(data)), num_batches, batch_size
+    )
+
+    def throughput(recorder: SampleRecorder) -> float:
+        # NOTE: payload bytes per second at the median time per call
+        return num_bytes / (compute_stats(recorder, "ms")["p50_ms"] / 1e3) / 1e6
+
+    statistics = {
+        "encoded_bytes": len(data),
+        "encode_duration_statistics": compute_stats(encode_durs_ms, "ms"),
+        "decode_duration_statistics": compute_stats(decode_durs_ms, "ms"),
+        "throughput_statistics": {
+            "encode_p50_mb_s": throughput(encode_durs_ms),
+            "decode_p50_mb_s": throughput(decode_durs_ms),
+        },
+    }
+    columns = {
+        "encode_batch_durations_ms": encode_durs_ms.samples,
+        "decode_batch_durations_ms": decode_durs_ms.samples,
+    }
+    return statistics, columns
+
+
+def run_in_child(
+    protobuf_implementation: str, codecs: List[str], cli_args: List[str]
+) -> bool:
+    """Run the protobuf codecs under another implementation; False if it is unavailable."""
+    env = dict(os.environ, **{PROTOBUF_IMPLEMENTATION_ENV: protobuf_implementation})
+    # NOTE: captured so that an unavailable implementation does not dump its traceback
+    result = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            *cli_args,
+            "--codecs",
+            *codecs,
+            "--protobuf-implementations",
+            protobuf_implementation,
+        ],
+        env=env,
+        cwd=Path(__file__).parent,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        logger.debug(result.stderr)
+        return False
+    sys.stderr.write(result.stderr)
+    return True
+
+
+def main(
+    codecs: List[str],
+    sizes_bytes: List[int],
+    protobuf_implementations: List[str],
+    payload_pattern: str,
+    num_batches: int,
+    batch_size: int,
+    warmup: int,
+    results_dir: Path | str,
+    run_id: str,
+    keep_samples: bool,
+    plot: bool,
+    log_level: str,
+) -> None:
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        level=getattr(logging, log_level),
+    )
+    assert num_batches > 0 and batch_size > 0, "batches must not be empty"
+    assert warmup >= 0, "warmup must be >= 0"
+
+    current_implementation = api_implementation.Type()
+    protobuf_codecs = [c for c in codecs if c in PROTOBUF_CODECS]
+    run_id = run_id or f"serialization_{time_ns()}"
+    if isinstance(results_dir, str):
+        results_dir = Path(results_dir)
+    run_dir = results_dir / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    # NOTE: an implementation forced through the environment (as for our child
+    #       processes) is the only one this process can run
+    forced = os.environ.get(PROTOBUF_IMPLEMENTATION_ENV)
+    if forced and protobuf_codecs and current_implementation != forced:
+        sys.exit(
+            f"protobuf implementation {forced} is not available "
+            f"(got {current_implementation})"
+        )
+    run_protobuf_here = current_implementation in protobuf_implementations
+
+    # NOTE: one untimed pass over every codec at the largest size first. Until
+    #       glibc has raised its mmap threshold, large buffers are mmapped and page
+    #       faulted anew on every call, which made whichever cell ran first
+    #       (e.g. 1 MiB bench_t encode) look several times slower
+    for name in codecs:
+        if name not in PROTOBUF_CODECS or run_protobuf_here:
+            benchmark_codec(
+                CODECS[name], max(sizes_bytes), payload_pattern, 1, batch_size, warmup
+            )
+
+    points: List[Dict[str, Any]] = []
+    for name in codecs:
+        if name in PROTOBUF_CODECS and not run_protobuf_here:
+            continue
+        implementation = current_implementation if name in PROTOBUF_CODECS else None
+        for num_bytes in sizes_bytes:
+            statistics, columns = benchmark_codec(
+                CODECS[name],
+                num_bytes,
+                payload_pattern,
+                num_batches,
+                batch_size,
+                warmup,
+            )
+            report: Dict[str, Any] = {
+                "timestamp_us": int(now() * 1e6),
+                "parameters": {
+                    "benchmark": "serialization",
+                    "codec": name,
+                    "protobuf_implementation": implementation,
+                    "num_bytes": num_bytes,
+                    "payload_pattern": payload_pattern,
+                    "num_batches": num_batches,
+                    "batch_size": batch_size,
+                    "warmup_iterations": warmup,
+                    "run_id": run_id,
+                    "python_version": sys.version.split()[0],
+                },
+                **statistics,
+            }
+            label = f"{name}_{implementation}" if implementation else name
+            out = (
+                run_dir
+                / f"serialization_{label}_{num_bytes}B_{report['timestamp_us']}.yaml"
+            )
+            write_report(out, report, columns if keep_samples else {})
+            points.append(
+                {
+                    "codec": label,
+                    "num_bytes": num_bytes,
+                    "encode_p50_ms": statistics["encode_duration_statistics"]["p50_ms"],
+                    "decode_p50_ms": statistics["decode_duration_statistics"]["p50_ms"],
+                }
+            )
+            logger.info(
+                f"[{label} {num_bytes} B] encode p50="
+                f"{points[-1]['encode_p50_ms'] * 1e3:.2f} us, decode p50="
+                f"{points[-1]['decode_p50_ms'] * 1e3:.2f} us"
+            )
+
+    others = [
+        impl for impl in protobuf_implementations if impl != current_implementation
+    ]
+    if protobuf_codecs and others and not forced:
+        cli_args = [
+            "--sizes-bytes",
+            *map(str, sizes_bytes),
+            "--payload-pattern",
+            payload_pattern,
+            "--num-batches",
+            str(num_batches),
+            "--batch-size",
+            str(batch_size),
+            "--warmup",
+            str(warmup),
+            "--results-dir",
+            str(results_dir),
+            "--run-id",
+            run_id,
+            "--log-level",
+            log_level,
+            *(["--keep-samples"] if keep_samples else []),
+        ]
+        for implementation in others:
+            if not run_in_child(implementation, protobuf_codecs, cli_args):
+                logger.warning(
+                    f"Skipped protobuf implementation {implementation} (not available)"
+                )
+
+    logger.info(f"Wrote serialization reports to {run_dir}")
+    if plot:
+        plot_serialization(run_dir)
+        logger.info(f"Wrote serialization plots to {run_dir}")
+
+
+def plot_serialization(run_dir: Path) -> None:
+    """Encode / decode p50 per call vs. message size, one line per codec."""
+    # NOTE: imported here so the benchmark itself runs where matplotlib is not installed
+    import matplotlib.pyplot as plt
+    import yaml
+
+    series: Dict[str, List[tuple]] = {}
+    for path in sorted(run_dir.glob("serialization_*.yaml")):
+        report = yaml.safe_load(path.read_text())
+        params = report["parameters"]
+        label = params["codec"]
+        if params.get("protobuf_implementation"):
+            label += f" ({params['protobuf_implementation']})"
+        series.setdefault(label, []).append(
+            (
+                params["num_bytes"],
+                report["encode_duration_statistics"]["p50_ms"],
+                report["decode_duration_statistics"]["p50_ms"],
+            )
+        )
+
+    for column, operation in ((1, "Encode"), (2, "Decode")):
+        plt.figure()
+        for label, points in sorted(series.items()):
+            points.sort()
+            plt.plot(
+                [p[0] / 1024.0 for p in points],
+                [p[column] for p in points],
+                marker="o",
+                label=label,
+            )
+        plt.xscale("log")
+        plt.yscale("log")
+        plt.xlabel("Message Size (KiB)")
+        plt.ylabel(f"{operation} Duration p50 (ms)")
+        plt.title(f"{operation} Duration vs. Message Size")
+        plt.grid(linestyle="--", alpha=0.5)
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(run_dir / f"serialization_{operation.lower()}.png")
+        plt.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Benchmark message encode/decode without any transport"
+    )
+    parser.add_argument(
+        "--codecs", nargs="+", choices=list(CODECS), default=list(CODECS)
+    )
+    parser.add_argument(
+        "--sizes-bytes", nargs="+", type=int, default=DEFAULT_SIZES_BYTES
+    )
+    parser.add_argument(
+        "--protobuf-implementations",
+        nargs="+",
+        choices=PROTOBUF_IMPLEMENTATIONS,
+        default=list(PROTOBUF_IMPLEMENTATIONS),
+        help="Protobuf implementations to run the proto codecs under; unavailable "
+        "ones are skipped (default=upb cpp python)",
+    )
+    parser.add_argument(
+        "--payload-pattern",
+        choices=PAYLOAD_PATTERNS,
+        default="random",
+        help="Content of the message blob (default=random)",
+    )
+    parser.add_argument(
+        "--num-batches",
+        type=int,
+        default=50,
+        help="Timed batches per codec, size and operation (default=50)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="Calls per timed batch (default=100)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=100,
+        help="Untimed calls before the first batch (default=100)",
+    )
+    parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default="",
+        help="Directory under --results-dir for the reports (default=serialization_<ns>)",
+    )
+    parser.add_argument(
+        "--keep-samples",
+        action="store_true",
+        help="Also save the per-batch timings, not just their statistics",
+    )
+    parser.add_argument(
+        "--plot", action="store_true", help="Also plot the results (matplotlib)"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set the logging level. (default=INFO)",
+    )
+    args = parser.parse_args()
+
+    main(
+        codecs=args.codecs,
+        sizes_bytes=args.sizes_bytes,
+        protobuf_implementations=args.protobuf_implementations,
+        payload_pattern=args.payload_pattern,
+        num_batches=args.num_batches,
+        batch_size=args.batch_size,
+        warmup=args.warmup,
+        results_dir=args.results_dir,
+        run_id=args.run_id,
+        keep_samples=args.keep_samples,
+        plot=args.plot,
+        log_level=args.log_level,
+    )
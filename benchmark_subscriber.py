@@ -1,133 +1,541 @@
 import logging
-import sys
+import os
 from argparse import ArgumentParser
+from array import array
 from pathlib import Path
-from queue import Full as QueueFull
-from queue import Queue
 from time import perf_counter
 from time import time as now
 from time import time_ns
-from typing import Any, Dict, List, Tuple
-
-import ecal.core.core as ecal_core
-import yaml
-# NOTE: see relevant note about ProtoSubscriber in eCALSubscriber below
-# from ecal.core.subscriber import ProtoSubscriber
-from lcm import LCM
-
-from bench_pb2 import Bench
-from benchmark import LCMHandshake, compute_stats
-from lcmtypes import bench_t
+from typing import Any, Dict, List, Optional, Tuple
+
+from backends import backend_names, get_backend
+from benchmark import SequenceTracker, compute_stats
+from clock_sync import ClockEstimate, ClockSync, clock_sync_report
+from gc_monitor import GcMonitor
+from histogram import LogHistogram, SampleRecorder
+from live_metrics import LiveMetrics, create_live_metrics
+from resources import (DEFAULT_RESOURCE_INTERVAL_S, ResourceSampler,
+                       create_sampler)
+from results import write_report
+from run_profile import load_profile
+from session import (DEFAULT_REQUEST_TIMEOUT_S, END, FINISH, START, Phase,
+                     SessionControl)
+from subscribers import BaseSubscriber
+from tracing import DEFAULT_TRACE_CAPACITY, SpanTracer
+from workload import TopicSpec, load_workload
 
 logger = logging.getLogger(__name__)
 
+# session mode: how long a wait for data runs before the control channel is checked
+CONTROL_POLL_INTERVAL_S = 0.05
+
 
-class BenchmarkMessage:
+def await_control(
+    control: SessionControl, phase: Phase, kind: int, timeout_s: float
+) -> bool:
     """
-    Uniform wrapper for both LCM bench_t and Protobuf Bench messages.
+    Answer the publisher's control messages until it sends `kind` for `phase`
+    (True) or timeout_s passes (False). A repeated START for `phase` means our
+    STARTED got lost and is answered again.
     """
+    deadline = perf_counter() + timeout_s
+    while True:
+        request = control.poll(max(0.0, deadline - perf_counter()))
+        if request is None:
+            return False
+        request_kind, request_phase = request
+        if request_phase.index != phase.index:
+            logger.debug(f"Ignoring control message {request_kind} for {request_phase}")
+        elif request_kind == kind:
+            return True
+        elif request_kind == START:
+            control.acknowledge(START, phase)
+
+
+def receive_phase(
+    subscriber: BaseSubscriber,
+    num_msgs: int,
+    keep_samples: bool,
+    receive_timeout_s: float,
+    control: Optional[SessionControl] = None,
+    phase: Optional[Phase] = None,
+    tracer: Optional[SpanTracer] = None,
+    resources: Optional[ResourceSampler] = None,
+    gc_monitor: Optional[GcMonitor] = None,
+    clock_correction_ns: int = 0,
+    live: Optional[LiveMetrics] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Receive one run of num_msgs messages and return its (report statistics,
+    raw per-message columns). In a session (control and phase given) it only
+    returns once the publisher has ended the phase. With a tracer every step
+    of every message is recorded as a span, with a resource sampler the
+    process's resource usage from the first message on is reported, and with
+    a GC monitor its GC pauses and allocations. clock_correction_ns is added
+    to this process's timestamps to bring them onto the publisher's clock.
+    Live metrics get every message's latencies while the run is going on.
+    """
+    handle_durs_ms = SampleRecorder(keep_samples)
+    decode_durs_ms = SampleRecorder(keep_samples)
+    oneway_latency_durs_ms = SampleRecorder(keep_samples)
+    corrected_oneway_latency_durs_ms = SampleRecorder(keep_samples)
+    # end-to-end latency split: transport (creation -> callback entry), queueing
+    # (callback entry -> decode start), decode, and whatever is left over
+    transport_latency_durs_ms = SampleRecorder(keep_samples)
+    queueing_durs_ms = SampleRecorder(keep_samples)
+    # transport measured from the middleware's own send timestamp (eCAL only)
+    middleware_transport_latency_durs_ms = SampleRecorder(keep_samples)
+    sizes = SampleRecorder(keep_samples)
+    end_to_end_throughput_hz = SampleRecorder(keep_samples)
+    # copies of the message on the receive path (see BaseSubscriber._decode)
+    copy_durs_ms = SampleRecorder(keep_samples)
+    copied_bytes = SampleRecorder(keep_samples)
+    num_copies = 0
+    # sequence number of every sample in the per-message columns, and of the
+    # samples of the columns that only get one on some messages (per event)
+    sequence_numbers = array("q")
+    middleware_transport_sequence_numbers = array("q")
+    throughput_sequence_numbers = array("q")
+
+    tracker = SequenceTracker(num_msgs)
+    first_receive_s = last_receive_s = 0.0
+    # NOTE: in a session the wait for data is sliced so that the control channel
+    #       is checked in between; the phase ends once the publisher says so
+    poll_s = CONTROL_POLL_INTERVAL_S if control is not None else receive_timeout_s
+    phase_ended = False
+    last_activity_s = perf_counter()
+    dropped_msgs_before = subscriber.dropped_msgs
+
+    i = 0
+    while not tracker.complete():
+        # NOTE: wait indefinitely for the first message (the publisher may start later),
+        #       afterwards the run ends once no message arrived for receive_timeout_s
+        if gc_monitor is not None and i > 0:
+            gc_monitor.message_start()
+        receive_start_s = perf_counter()
+        received = subscriber.receive(None if i == 0 and control is None else poll_s)
+        if received is None:
+            if control is not None and not phase_ended:
+                phase_ended = await_control(control, phase, END, 0.0)
+                if phase_ended or perf_counter() - last_activity_s < receive_timeout_s:
+                    continue
+            if not phase_ended:
+                logger.warning(
+                    f"No message for {receive_timeout_s:.3f} s, ending run with "
+                    f"{tracker.unique}/{num_msgs} msgs received"
+                )
+            break
+        last_activity_s = perf_counter()
+        bm, handle_ms, decode_ms = received
+        receive_time_ns = time_ns() + clock_correction_ns
+        bm.callback_time_ns += clock_correction_ns
+        last_receive_s = perf_counter()
+
+        status = tracker.observe(bm.sequence_number)
+        if status in (SequenceTracker.DUPLICATE, SequenceTracker.UNEXPECTED):
+            logger.warning(
+                f"Received {status} msg (sequence_number={bm.sequence_number})"
+            )
+            continue
+        elif status == SequenceTracker.REORDERED:
+            logger.debug(
+                f"Received reordered msg (sequence_number={bm.sequence_number})"
+            )
+
+        oneway_latency_ms = (receive_time_ns - bm.creation_time_ns) / 1e6
+        # NOTE: measured from the publisher's intended send time so that stalls in the
+        #       publish loop count against latency instead of silently delaying sends
+        #       (coordinated omission correction)
+        corrected_oneway_latency_ms = (receive_time_ns - bm.scheduled_time_ns) / 1e6
+        transport_latency_ms = (bm.callback_time_ns - bm.creation_time_ns) / 1e6
 
-    def __init__(
-        self, num_bytes: int, blob: bytes, creation_time_ns: int, msg_type: type
-    ):
-        self.num_bytes = num_bytes
-        self.blob = blob
-        self.creation_time_ns = creation_time_ns
-        self.msg_type: type = msg_type
-
-    @classmethod
-    def from_lcm(cls, lcm_msg: bench_t) -> "BenchmarkMessage":
-        return cls(
-            lcm_msg.num_bytes,
-            bytes(lcm_msg.blob),
-            lcm_msg.creation_timestamp_ns,
-            bench_t,
-        )
-
-    @classmethod
-    def from_proto(cls, proto_msg: Bench) -> "BenchmarkMessage":
-        return cls(
-            len(proto_msg.blob), proto_msg.blob, proto_msg.creation_timestamp_ns, Bench
+        logger.info(
+            f"{'(ignoring first message in saved report)' if i == 0 else ''} "
+            f"Received msg {i+1}/{num_msgs} (seq {bm.sequence_number}): ({bm.num_bytes} bytes) (creation_time_ns={bm.creation_time_ns}) "
+            f"decode msg took {decode_ms:.3f} ms, handle msg took {handle_ms:.3f} ms, one way latency: {oneway_latency_ms:.3f} ms "
+            f"(corrected: {corrected_oneway_latency_ms:.3f} ms, transport: {transport_latency_ms:.3f} ms, "
+            f"queueing: {bm.queueing_ms:.3f} ms, {bm.num_copies} copies: {bm.copy_ms:.3f} ms) "
         )
+        if tracer is not None:
+            seq = bm.sequence_number
+            decode_end_s = bm.decode_start_s + decode_ms / 1e3
+            tracer.span("receive", receive_start_s, last_receive_s, seq)
+            # NOTE: an already queued message was decoded before receive() was called
+            tracer.span(
+                "wait", receive_start_s, max(receive_start_s, bm.decode_start_s), seq
+            )
+            tracer.span("decode", bm.decode_start_s, decode_end_s, seq, flow_end=True)
+            tracer.span(
+                "copy",
+                decode_end_s,
+                min(decode_end_s + bm.copy_ms / 1e3, last_receive_s),
+                seq,
+            )
+            # NOTE: a message can wait in the queue while the previous one is still
+            #       processed, so queueing overlaps the other spans
+            tracer.span(
+                "queueing", bm.callback_s, bm.decode_start_s, seq, asynchronous=True
+            )
+            tracer.span("process", last_receive_s, perf_counter(), seq)
+
+        if i == 0:
+            first_receive_s = last_receive_s
+            # NOTE: the wait for the publisher to start is not part of the run
+            if resources is not None:
+                resources.begin()
+            if gc_monitor is not None:
+                gc_monitor.begin_phase()
+        else:
+            # NOTE: we do not "count" first message durations in reported statistics as it includes
+            #       extra overhead that the other messages don't have
+            handle_durs_ms.record(handle_ms)
+            decode_durs_ms.record(decode_ms)
+
+            oneway_latency_durs_ms.record(oneway_latency_ms)
+            corrected_oneway_latency_durs_ms.record(corrected_oneway_latency_ms)
+            transport_latency_durs_ms.record(transport_latency_ms)
+            queueing_durs_ms.record(bm.queueing_ms)
+            if live is not None:
+                live.record("oneway_latency_ms", oneway_latency_ms)
+                live.record("corrected_oneway_latency_ms", corrected_oneway_latency_ms)
+            if bm.middleware_send_time_ns is not None:
+                middleware_transport_latency_durs_ms.record(
+                    (bm.callback_time_ns - bm.middleware_send_time_ns) / 1e6
+                )
+                if keep_samples:
+                    middleware_transport_sequence_numbers.append(bm.sequence_number)
+            sizes.record(bm.num_bytes)
+            copy_durs_ms.record(bm.copy_ms)
+            copied_bytes.record(bm.copied_bytes)
+            num_copies += bm.num_copies
+            if oneway_latency_ms > 0:
+                end_to_end_throughput_hz.record(1.0 / (oneway_latency_ms / 1000.0))
+                if keep_samples:
+                    throughput_sequence_numbers.append(bm.sequence_number)
+            if keep_samples:
+                sequence_numbers.append(bm.sequence_number)
+            if gc_monitor is not None:
+                # NOTE: the perf_counter() window each measurement was taken over
+                gc_monitor.message_end(
+                    bm.sequence_number,
+                    {
+                        "handle": (
+                            handle_ms,
+                            receive_start_s,
+                            receive_start_s + handle_ms / 1e3,
+                        ),
+                        "oneway_latency": (
+                            oneway_latency_ms,
+                            last_receive_s - oneway_latency_ms / 1e3,
+                            last_receive_s,
+                        ),
+                    },
+                )
+        i += 1
+    resource_usage = resources.end() if resources is not None and i > 0 else None
+    gc_stats, gc_columns = (
+        gc_monitor.end_phase(keep_samples)
+        if gc_monitor is not None and i > 0
+        else ({}, {})
+    )
 
+    # NOTE: with message loss the statistics below may be empty
+    def stats_or_empty(recorder: SampleRecorder, units: str) -> Dict[str, float]:
+        return compute_stats(recorder, units) if recorder else {}
 
-class BaseSubscriber:
-    def receive(self) -> Tuple[BenchmarkMessage, float, float]:
-        """
-        Block until the next message arrives.
-        Returns (BenchmarkMessage, handle_ms, decode_ms).
-        """
-        raise NotImplementedError
-
-    def msg_type(self) -> type:
-        raise NotImplementedError
-
-    def close(self) -> None:
-        """Cleanup resources if necessary."""
-        pass
-
-
-class LcmSubscriber(BaseSubscriber):
-    def __init__(self, url: str, channel: str):
-        self._conn = LCM(provider=url)
-        self._last_data: bytes = b""
-        self._conn.subscribe(channel, self._callback)
-        # TODO: how do I handle if publisher is started after subscriber?
-        handshake = LCMHandshake(url, channel)
-        handshake.send_ready()
-
-    def _callback(self, _: str, data: bytes) -> None:
-        self._last_data = data
-
-    def receive(self) -> Tuple[BenchmarkMessage, float, float]:
-        t0 = perf_counter()
-        self._conn.handle()  # blocks until _last_data set
-        handle_ms = (perf_counter() - t0) * 1e3
-
-        t1 = perf_counter()
-        raw = bench_t.decode(self._last_data)
-        decode_ms = (perf_counter() - t1) * 1e3
-
-        return BenchmarkMessage.from_lcm(raw), handle_ms, decode_ms
-
-    def msg_type(self) -> type:
-        return bench_t
+    handle_stats = stats_or_empty(handle_durs_ms, "ms")
+    decode_stats = stats_or_empty(decode_durs_ms, "ms")
+    oneway_latency_stats = stats_or_empty(oneway_latency_durs_ms, "ms")
+    corrected_oneway_latency_stats = stats_or_empty(
+        corrected_oneway_latency_durs_ms, "ms"
+    )
+    transport_latency_stats = stats_or_empty(transport_latency_durs_ms, "ms")
+    queueing_stats = stats_or_empty(queueing_durs_ms, "ms")
+    middleware_transport_latency_stats = stats_or_empty(
+        middleware_transport_latency_durs_ms, "ms"
+    )
+    size_stats = stats_or_empty(sizes, "bytes")
+    copy_stats = stats_or_empty(copy_durs_ms, "ms")
+    copied_bytes_stats = stats_or_empty(copied_bytes, "bytes")
+    receive_copy_stats: Dict[str, float] = {}
+    if sizes:
+        receive_copy_stats = {
+            "copies_per_msg": num_copies / sizes.histogram.count,
+            # NOTE: bytes copied per payload byte received
+            "copy_amplification": copied_bytes.histogram.mean()
+            / sizes.histogram.mean(),
+        }
+
+    latency_breakdown: Dict[str, float] = {}
+    if oneway_latency_durs_ms:
+        latency_breakdown = {
+            "transport_mean_ms": transport_latency_durs_ms.histogram.mean(),
+            "queueing_mean_ms": queueing_durs_ms.histogram.mean(),
+            "decode_mean_ms": decode_durs_ms.histogram.mean(),
+            "copy_mean_ms": copy_durs_ms.histogram.mean(),
+        }
+        latency_breakdown["other_mean_ms"] = (
+            oneway_latency_durs_ms.histogram.mean() - sum(latency_breakdown.values())
+        )
+    end_to_end_throughput_stats = stats_or_empty(end_to_end_throughput_hz, "hz")
 
+    # NOTE: a throughput figure is only meaningful next to how much was lost
+    delivery_stats: Dict[str, Any] = tracker.stats()
+    delivery_stats["subscriber_dropped_msgs"] = (
+        subscriber.dropped_msgs - dropped_msgs_before
+    )
+    if last_receive_s > first_receive_s:
+        delivery_stats["delivered_throughput_hz"] = (tracker.unique - 1) / (
+            last_receive_s - first_receive_s
+        )
+    if tracker.lost():
+        logger.warning(
+            f"Lost {tracker.lost()}/{num_msgs} msgs "
+            f"(loss rate {delivery_stats['loss_rate']:.4%})"
+        )
 
-class eCALSubscriber(BaseSubscriber):
-    def __init__(self, channel: str):
-        ecal_core.initialize(sys.argv, f"benchmark_subscriber_{channel}")
-        # NOTE: We purposefully do not use ProtoSubscriber so that we can
-        #       measure the decode time directly by doing it ourselves
-        # self._sub = ProtoSubscriber(channel, Bench)
-        self._sub = ecal_core.subscriber(channel, "proto:" + Bench.DESCRIPTOR.full_name)
-        self._queue = Queue(maxsize=100)
-        self._sub.set_callback(self._callback)
+    if control is not None and not phase_ended:
+        if not await_control(control, phase, END, DEFAULT_REQUEST_TIMEOUT_S):
+            logger.error(f"Publisher never ended {phase}")
 
-    def _callback(self, topic: str, msg: bytes, timestamp: float) -> None:
-        logger.debug(f"[{topic}] Received message")
-        try:
-            self._queue.put_nowait(msg)
-        except QueueFull:
-            logger.error("queue is full")
+    columns: Dict[str, Any] = {}
+    statistics: Dict[str, Any] = {
+        "delivery_statistics": delivery_stats,
+        "handle_duration_statistics": handle_stats,
+        "decode_duration_statistics": decode_stats,
+        "copy_duration_statistics": copy_stats,
+        "copied_bytes_statistics": copied_bytes_stats,
+        "receive_copy_statistics": receive_copy_stats,
+        "oneway_latency_statistics": oneway_latency_stats,
+        "corrected_oneway_latency_statistics": corrected_oneway_latency_stats,
+        "transport_latency_statistics": transport_latency_stats,
+        "queueing_duration_statistics": queueing_stats,
+        "middleware_transport_latency_statistics": middleware_transport_latency_stats,
+        "oneway_latency_breakdown": latency_breakdown,
+        "num_bytes_statistics": size_stats,
+        "end_to_end_throughput_statistics": end_to_end_throughput_stats,
+    }
+    if resource_usage is not None:
+        statistics["resource_usage"] = resource_usage
+    if gc_stats:
+        statistics["gc_statistics"] = gc_stats
+    if keep_samples:
+        # NOTE: per message (one row per recorded message, in arrival order, which
+        #       sequence_numbers gives): everything but the columns below and the
+        #       gc_pause_* ones. Per event (only some messages have one, each column
+        #       next to the sequence numbers it belongs to): middleware transport
+        #       latencies (eCAL only) and end-to-end throughput (positive latencies)
+        columns = {
+            "sequence_numbers": sequence_numbers,
+            "handle_durations_ms": handle_durs_ms.samples,
+            "decode_durations_ms": decode_durs_ms.samples,
+            "copy_durations_ms": copy_durs_ms.samples,
+            "copied_bytes_list": copied_bytes.samples,
+            "oneway_latencies_ms": oneway_latency_durs_ms.samples,
+            "corrected_oneway_latencies_ms": corrected_oneway_latency_durs_ms.samples,
+            "transport_latencies_ms": transport_latency_durs_ms.samples,
+            "queueing_durations_ms": queueing_durs_ms.samples,
+            "num_bytes_list": sizes.samples,
+            "middleware_transport_sequence_numbers": middleware_transport_sequence_numbers,
+            "middleware_transport_latencies_ms": middleware_transport_latency_durs_ms.samples,
+            "throughput_sequence_numbers": throughput_sequence_numbers,
+            "end_to_end_throughput_hz": end_to_end_throughput_hz.samples,
+            **gc_columns,
+        }
+
+    return statistics, columns
+
+
+def clock_correction_ns(
+    estimate: Optional[ClockEstimate], injected_offset_ns: int
+) -> int:
+    """What brings this process's (possibly shifted) clock onto the publisher's."""
+    return injected_offset_ns + (estimate.offset_ns if estimate is not None else 0)
+
+
+def probe_clock_after(
+    clock: ClockSync,
+    before: Optional[ClockEstimate],
+    injected_offset_ns: int,
+    statistics: Dict[str, Any],
+) -> Optional[ClockEstimate]:
+    """
+    Probe the publisher's clock again after a run, add the run's clock_sync
+    report to its statistics and return the latest estimate.
+    """
+    after = clock.probe()
+    statistics["clock_sync"] = clock_sync_report(before, after, injected_offset_ns)
+    return after if after is not None else before
 
-    def receive(self) -> Tuple[BenchmarkMessage, float, float]:
-        t0 = perf_counter()
-        raw_msg: bytes = self._queue.get(block=True)
-        handle_ms = (perf_counter() - t0) * 1e3
 
-        t1 = perf_counter()
-        msg: Bench = Bench()
-        msg.ParseFromString(raw_msg)
-        decode_ms = (perf_counter() - t1) * 1e3
+def write_subscriber_report(
+    results_dir: Path,
+    subscriber: BaseSubscriber,
+    statistics: Dict[str, Any],
+    columns: Dict[str, Any],
+    parameters: Dict[str, Any],
+) -> None:
+    report: Dict[str, Any] = {
+        "timestamp_us": int(now() * 1e6),
+        "parameters": dict(parameters, message_type=str(subscriber.msg_type())),
+        **statistics,
+    }
+    out = (
+        results_dir
+        / f"{parameters['middleware']}_subscriber_benchmark_report_{report['timestamp_us']}.yaml"
+    )
+    write_report(out, report, columns)
+    logger.info(f"Wrote report to {out}")
 
-        return BenchmarkMessage.from_proto(msg), handle_ms, decode_ms
 
-    def msg_type(self) -> type:
-        return Bench
+def receive_workload(
+    subscriber: BaseSubscriber,
+    topics: List[TopicSpec],
+    keep_samples: bool,
+    receive_timeout_s: float,
+    resources: Optional[ResourceSampler] = None,
+    live: Optional[LiveMetrics] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Receive every topic of a workload and return the run's (report statistics,
+    raw per-message columns). Statistics are reported per topic under
+    topic_statistics and over all topics at the top level.
+    """
+    index = {t.name: i for i, t in enumerate(topics)}
+    trackers = [SequenceTracker(t.num_msgs) for t in topics]
+    handle_durs_ms = [SampleRecorder() for _ in topics]
+    decode_durs_ms = [SampleRecorder() for _ in topics]
+    copy_durs_ms = [SampleRecorder() for _ in topics]
+    oneway_latency_durs_ms = [SampleRecorder() for _ in topics]
+    corrected_oneway_latency_durs_ms = [SampleRecorder() for _ in topics]
+    transport_latency_durs_ms = [SampleRecorder() for _ in topics]
+    queueing_durs_ms = [SampleRecorder() for _ in topics]
+    first_receive_s = [0.0] * len(topics)
+    last_receive_s = [0.0] * len(topics)
+    dropped_msgs_before = subscriber.dropped_msgs
+    # NOTE: one row per recorded message, topic_index and sequence_numbers say
+    #       which topic and which of its messages it belongs to
+    columns: Dict[str, Any] = {
+        "topic_index": array("i"),
+        "sequence_numbers": array("q"),
+        "oneway_latencies_ms": array("d"),
+        "corrected_oneway_latencies_ms": array("d"),
+        "transport_latencies_ms": array("d"),
+    }
 
-    def close(self) -> None:
-        ecal_core.finalize()
+    received_any = False
+    while not all(tracker.complete() for tracker in trackers):
+        # NOTE: wait indefinitely for the first message (the publisher may start later),
+        #       afterwards the run ends once no message arrived for receive_timeout_s
+        received = subscriber.receive(receive_timeout_s if received_any else None)
+        if received is None:
+            logger.warning(
+                f"No message for {receive_timeout_s:.3f} s, ending run with "
+                f"{sum(t.unique for t in trackers)}/{sum(t.num_msgs for t in topics)} "
+                "msgs received"
+            )
+            break
+        if not received_any and resources is not None:
+            resources.begin()
+        received_any = True
+        bm, handle_ms, decode_ms = received
+        receive_time_ns = time_ns()
+        i = index.get(bm.topic)
+        if i is None:
+            logger.warning(f"Received msg on unexpected topic {bm.topic!r}")
+            continue
+        last_receive_s[i] = perf_counter()
+
+        status = trackers[i].observe(bm.sequence_number)
+        if status in (SequenceTracker.DUPLICATE, SequenceTracker.UNEXPECTED):
+            logger.warning(
+                f"[{bm.topic}] Received {status} msg (sequence_number={bm.sequence_number})"
+            )
+            continue
+        if trackers[i].unique == 1:
+            # NOTE: we do not "count" first message durations in reported statistics as it includes
+            #       extra overhead that the other messages don't have
+            first_receive_s[i] = last_receive_s[i]
+            continue
+
+        oneway_latency_ms = (receive_time_ns - bm.creation_time_ns) / 1e6
+        # NOTE: measured from the intended send time (coordinated omission correction),
+        #       so time a topic spent waiting behind the others counts against it
+        corrected_oneway_latency_ms = (receive_time_ns - bm.scheduled_time_ns) / 1e6
+        transport_latency_ms = (bm.callback_time_ns - bm.creation_time_ns) / 1e6
+        handle_durs_ms[i].record(handle_ms)
+        decode_durs_ms[i].record(decode_ms)
+        copy_durs_ms[i].record(bm.copy_ms)
+        oneway_latency_durs_ms[i].record(oneway_latency_ms)
+        corrected_oneway_latency_durs_ms[i].record(corrected_oneway_latency_ms)
+        transport_latency_durs_ms[i].record(transport_latency_ms)
+        queueing_durs_ms[i].record(bm.queueing_ms)
+        if live is not None:
+            live.record("oneway_latency_ms", oneway_latency_ms)
+            live.record("corrected_oneway_latency_ms", corrected_oneway_latency_ms)
+        if keep_samples:
+            columns["topic_index"].append(i)
+            columns["sequence_numbers"].append(bm.sequence_number)
+            columns["oneway_latencies_ms"].append(oneway_latency_ms)
+            columns["corrected_oneway_latencies_ms"].append(corrected_oneway_latency_ms)
+            columns["transport_latencies_ms"].append(transport_latency_ms)
+    resource_usage = resources.end() if resources is not None and received_any else None
+
+    def stats_or_empty(recorder: SampleRecorder, units: str) -> Dict[str, float]:
+        return compute_stats(recorder, units) if recorder else {}
+
+    def merged(recorders: List[SampleRecorder]) -> Dict[str, float]:
+        total = LogHistogram()
+        for recorder in recorders:
+            total.merge(recorder.histogram)
+        return compute_stats(total, "ms") if total.count else {}
+
+    recorders = {
+        "handle_duration_statistics": handle_durs_ms,
+        "decode_duration_statistics": decode_durs_ms,
+        "copy_duration_statistics": copy_durs_ms,
+        "oneway_latency_statistics": oneway_latency_durs_ms,
+        "corrected_oneway_latency_statistics": corrected_oneway_latency_durs_ms,
+        "transport_latency_statistics": transport_latency_durs_ms,
+        "queueing_duration_statistics": queueing_durs_ms,
+    }
+    topic_stats: Dict[str, Any] = {}
+    for i, topic in enumerate(topics):
+        delivery_stats: Dict[str, Any] = trackers[i].stats()
+        if last_receive_s[i] > first_receive_s[i]:
+            delivery_stats["delivered_throughput_hz"] = (trackers[i].unique - 1) / (
+                last_receive_s[i] - first_receive_s[i]
+            )
+        if trackers[i].lost():
+            logger.warning(
+                f"[{topic.name}] Lost {trackers[i].lost()}/{topic.num_msgs} msgs "
+                f"(loss rate {delivery_stats['loss_rate']:.4%})"
+            )
+        topic_stats[topic.name] = {"delivery_statistics": delivery_stats}
+        for key, per_topic in recorders.items():
+            topic_stats[topic.name][key] = stats_or_empty(per_topic[i], "ms")
+
+    # NOTE: counts add up over topics, the loss rate is recomputed from the totals
+    per_topic_delivery = [tracker.stats() for tracker in trackers]
+    delivery_stats = {
+        key: sum(stats[key] for stats in per_topic_delivery)
+        for key in per_topic_delivery[0]
+        if key != "loss_rate"
+    }
+    delivery_stats["loss_rate"] = (
+        delivery_stats["lost_msgs"] / delivery_stats["expected_msgs"]
+    )
+    delivery_stats["subscriber_dropped_msgs"] = (
+        subscriber.dropped_msgs - dropped_msgs_before
+    )
+    statistics: Dict[str, Any] = {
+        "delivery_statistics": delivery_stats,
+        **{key: merged(per_topic) for key, per_topic in recorders.items()},
+        "topic_statistics": topic_stats,
+    }
+    if resource_usage is not None:
+        statistics["resource_usage"] = resource_usage
+    return statistics, (columns if keep_samples else {})
 
 
 def main(
@@ -138,6 +546,25 @@ def main(
     results_dir: Path | str,
     log_level: str,
     log_output: str,
+    keep_samples: bool = False,
+    receive_timeout_s: float = 5.0,
+    echo: bool = False,
+    run_id: str = "",
+    session: bool = False,
+    workload: Optional[Path | str] = None,
+    use_asyncio: bool = False,
+    zero_copy: bool = False,
+    trace: bool = False,
+    trace_capacity: int = DEFAULT_TRACE_CAPACITY,
+    resource_interval_s: float = 0.0,
+    profile: Optional[Path | str] = None,
+    gc_instrumentation: bool = False,
+    trace_malloc: bool = False,
+    clock_sync: bool = False,
+    inject_clock_offset_ms: float = 0.0,
+    live_metrics_interval_s: float = 0.0,
+    live_metrics_window_s: Optional[float] = None,
+    live_metrics_port: int = 0,
 ) -> None:
     logging.basicConfig(
         format="%(asctime)s [%(levelname)s] %(message)s",
@@ -148,98 +575,390 @@ def main(
         f"Starting subscriber ({middleware}): channel={channel_name!r}, expecting {num_msgs} msgs"
     )
 
-    assert middleware in ("lcm", "ecal"), "middleware must be 'lcm' or 'ecal'"
+    backend = get_backend(middleware)
     assert channel_name, "channel_name must not be empty"
     assert num_msgs > 0, "num_msgs must be > 0"
+    assert receive_timeout_s > 0, "receive_timeout_s must be > 0"
+    assert not workload or not (echo or session), "a workload is a single one-way run"
+    assert (
+        not workload or backend.supports_workload
+    ), f"{middleware} does not support workloads"
+    assert (
+        not use_asyncio or backend.async_subscriber is not None
+    ), f"{middleware} has no asyncio subscriber"
+    assert (
+        not zero_copy or backend.codec.decode_view is not None
+    ), f"{middleware} has no zero-copy decoder"
+    assert not (trace and workload), "workloads are not traced"
+    assert not (
+        (gc_instrumentation or trace_malloc) and workload
+    ), "workloads are not GC instrumented"
+    assert not (
+        (clock_sync or inject_clock_offset_ms) and workload
+    ), "workloads are not clock synchronized"
+    assert (
+        not clock_sync or backend.clock_sync is not None
+    ), f"{middleware} has no clock synchronization"
+
+    # NOTE: applied before the middleware is created so that its threads inherit
+    #       the affinity and scheduling policy
+    run_profile = load_profile(profile, "subscriber")
+    run_profile.apply()
 
     if isinstance(results_dir, str):
         results_dir = Path(results_dir)
     results_dir = results_dir / str(time_ns())
     results_dir.mkdir(parents=True, exist_ok=True)
 
-    if middleware == "lcm":
-        subscriber: BaseSubscriber = LcmSubscriber(lcm_url, channel_name)
-    elif middleware == "ecal":
-        subscriber = eCALSubscriber(channel_name)
-    else:
-        raise ValueError(f"{middleware} not supported")
-
-    handle_durs_ms: List[float] = []
-    decode_durs_ms: List[float] = []
-    oneway_latency_durs_ms: List[float] = []
-    sizes: List[int] = []
-    creation_timestamps_s: List[float] = []
-
-    for i in range(num_msgs):
-        bm, handle_ms, decode_ms = subscriber.receive()
-        oneway_latency_ms = (time_ns() - bm.creation_time_ns) / 1e6
-
-        logger.info(
-            f"{'(ignoring first message in saved report)' if i == 0 else ''} "
-            f"Received msg {i+1}/{num_msgs}: ({bm.num_bytes} bytes) (creation_time_ns={bm.creation_time_ns}) "
-            f"decode msg took {decode_ms:.3f} ms, handle msg took {handle_ms:.3f} ms, one way latency: {oneway_latency_ms:.3f} ms "
-        )
-
-        if i != 0:
-            # NOTE: we do not "count" first message durations in reported statistics as it includes
-            #       extra overhead that the other messages don't have
-            handle_durs_ms.append(handle_ms)
-            decode_durs_ms.append(decode_ms)
-
-            oneway_latency_durs_ms.append(oneway_latency_ms)
-            sizes.append(bm.num_bytes)
-            creation_timestamps_s.append(bm.creation_time_ns / 1e9)
-
-    subscriber.close()
-
-    handle_stats = compute_stats(handle_durs_ms, "ms")
-    decode_stats = compute_stats(decode_durs_ms, "ms")
-    oneway_latency_stats = compute_stats(oneway_latency_durs_ms, "ms")
-    size_stats = compute_stats(sizes, "bytes")
-
-    end_to_end_throughput_hz = [
-        1.0 / (lat_ms / 1000.0) for lat_ms in oneway_latency_durs_ms if lat_ms > 0
-    ]
-    end_to_end_throughput_stats = compute_stats(end_to_end_throughput_hz, "hz")
-
-    report: Dict[str, Any] = {
-        "timestamp_us": int(now() * 1e6),
-        "parameters": {
-            "middleware": middleware,
-            "channel_name": channel_name,
-            "num_msgs": num_msgs,
-            "message_type": str(subscriber.msg_type()),
-        },
-        "handle_durations_ms": handle_durs_ms,
-        "handle_duration_statistics": handle_stats,
-        "decode_durations_ms": decode_durs_ms,
-        "decode_duration_statistics": decode_stats,
-        "oneway_latencies_ms": oneway_latency_durs_ms,
-        "oneway_latency_statistics": oneway_latency_stats,
-        "num_bytes_list": sizes,
-        "num_bytes_statistics": size_stats,
-        "end_to_end_throughput_hz": end_to_end_throughput_hz,
-        "end_to_end_throughput_statistics": end_to_end_throughput_stats,
+    topics = load_workload(workload) if workload else None
+    # NOTE: probed before the subscriber announces itself, so that the probes are
+    #       answered before the publisher starts sending
+    injected_offset_ns = int(inject_clock_offset_ms * 1e6)
+    clock: Optional[ClockSync] = None
+    clock_estimate: Optional[ClockEstimate] = None
+    if clock_sync:
+        clock = backend.create_clock_sync(lcm_url, channel_name, server=False)
+        clock.injected_offset_ns = injected_offset_ns
+        logger.info("Probing the publisher's clock...")
+        clock_estimate = clock.probe()
+
+    subscriber = backend.create_subscriber(
+        lcm_url,
+        channel_name,
+        echo,
+        [t.name for t in topics] if topics else None,
+        use_asyncio,
+        zero_copy,
+    )
+    if run_profile.callback_cpus is not None:
+        if subscriber.callback_threads:
+            subscriber.set_callback_affinity(run_profile.callback_cpus)
+        else:
+            logger.warning(
+                f"{middleware} calls back on the receiving thread, ignoring callback_cpus"
+            )
+    run_profile.after_setup()
+
+    parameters: Dict[str, Any] = {
+        "middleware": middleware,
+        **backend.describe(),
+        "channel_name": channel_name,
+        "num_msgs": num_msgs,
+        "keep_samples": keep_samples,
+        "receive_timeout_s": receive_timeout_s,
+        "echo": echo,
+        "asyncio": use_asyncio,
+        "zero_copy": zero_copy,
+        "run_id": run_id,
+        # NOTE: tells apart the reports of the subscribers of one fan-out run
+        "subscriber_pid": os.getpid(),
+        "profile": run_profile.describe(),
+        "gc_instrumentation": gc_instrumentation or trace_malloc,
+        "tracemalloc": trace_malloc,
+        "clock_sync": clock_sync,
+        "injected_clock_offset_ms": inject_clock_offset_ms,
     }
-
-    out = (
-        results_dir
-        / f"{middleware}_subscriber_benchmark_report_{report['timestamp_us']}.yaml"
+    resources = create_sampler("subscriber", resource_interval_s)
+    parameters["resource_interval_s"] = resources.interval_s if resources else 0.0
+    live = create_live_metrics(
+        "subscriber",
+        "oneway_latency_ms",
+        live_metrics_interval_s,
+        live_metrics_window_s,
+        live_metrics_port,
+        results_dir,
+        {"middleware": middleware, "channel": channel_name, "run_id": run_id},
     )
-    with open(out, "w") as f:
-        yaml.dump(report, f)
-    logger.info(f"Wrote report to {out}")
+    parameters["live_metrics_interval_s"] = live.interval_s if live else 0.0
+    gc_monitor: Optional[GcMonitor] = None
+    if gc_instrumentation or trace_malloc:
+        gc_monitor = GcMonitor("subscriber", trace_malloc, results_dir)
+        gc_monitor.install()
+    tracer: Optional[SpanTracer] = None
+    if trace:
+        tracer = SpanTracer(f"subscriber ({middleware})", trace_capacity)
+        trace_path = results_dir / f"{middleware}_subscriber_trace_{time_ns()}.json"
+        parameters["trace_file"] = trace_path.name
+
+    if topics:
+        statistics, columns = receive_workload(
+            subscriber, topics, keep_samples, receive_timeout_s, resources, live
+        )
+        parameters.update(
+            workload=str(workload),
+            topics=[t.to_dict() for t in topics],
+            num_msgs=sum(t.num_msgs for t in topics),
+        )
+        write_subscriber_report(
+            results_dir, subscriber, statistics, columns, parameters
+        )
+        subscriber.close()
+        if resources is not None:
+            resources.close()
+        if live is not None:
+            live.close()
+        return
+
+    if not session:
+        statistics, columns = receive_phase(
+            subscriber,
+            num_msgs,
+            keep_samples,
+            receive_timeout_s,
+            tracer=tracer,
+            resources=resources,
+            gc_monitor=gc_monitor,
+            clock_correction_ns=clock_correction_ns(clock_estimate, injected_offset_ns),
+            live=live,
+        )
+        if clock is not None:
+            probe_clock_after(clock, clock_estimate, injected_offset_ns, statistics)
+            clock.send_done()
+            clock.close()
+        write_subscriber_report(
+            results_dir, subscriber, statistics, columns, parameters
+        )
+        subscriber.close()
+        if resources is not None:
+            resources.close()
+        if live is not None:
+            live.close()
+        if gc_monitor is not None:
+            gc_monitor.uninstall()
+        if tracer is not None:
+            tracer.write(trace_path)
+            logger.info(
+                f"Wrote trace of {tracer.count} spans to {trace_path}"
+                f" ({tracer.dropped_spans} dropped)"
+            )
+        return
+
+    # NOTE: a session keeps this process (and its middleware setup) alive across
+    #       every phase the publisher announces on the control channel
+    control: SessionControl = backend.create_session_control(
+        lcm_url, channel_name, publisher=False
+    )
+    logger.info("Waiting for the publisher to start a session phase...")
+
+    finished_phases = set()
+    while True:
+        request = control.poll(CONTROL_POLL_INTERVAL_S)
+        if request is None:
+            continue
+        kind, phase = request
+        if kind == FINISH:
+            control.acknowledge(FINISH, phase)
+            break
+        if phase.index in finished_phases:
+            # NOTE: our ENDED got lost, the publisher is still waiting for it
+            if kind == END:
+                control.acknowledge(END, phase)
+            continue
+        if kind != START:
+            logger.warning(f"Unexpected control message {kind} for {phase}")
+            continue
+
+        logger.info(f"Starting {phase}")
+        control.acknowledge(START, phase)
+        if tracer is not None:
+            tracer.set_phase(phase.index)
+        if live is not None:
+            live.set_phase(phase.index)
+        statistics, columns = receive_phase(
+            subscriber,
+            phase.num_msgs,
+            keep_samples,
+            receive_timeout_s,
+            control,
+            phase,
+            tracer,
+            resources,
+            gc_monitor,
+            clock_correction_ns(clock_estimate, injected_offset_ns),
+            live,
+        )
+        if clock is not None:
+            # NOTE: the next phase is corrected with the latest estimate
+            clock_estimate = probe_clock_after(
+                clock, clock_estimate, injected_offset_ns, statistics
+            )
+        phase_parameters = dict(
+            parameters,
+            num_msgs=phase.num_msgs,
+            num_bytes=phase.num_bytes,
+            transmission_rate_hz_setpoint=phase.transmission_rate_hz,
+            phase_index=phase.index,
+        )
+        write_subscriber_report(
+            results_dir, subscriber, statistics, columns, phase_parameters
+        )
+        finished_phases.add(phase.index)
+        # NOTE: before ENDED, so the publisher does not start the next phase meanwhile
+        run_profile.between_phases()
+        control.acknowledge(END, phase)
+
+    control.close()
+    if clock is not None:
+        clock.send_done()
+        clock.close()
+    subscriber.close()
+    if resources is not None:
+        resources.close()
+    if live is not None:
+        live.close()
+    if gc_monitor is not None:
+        gc_monitor.uninstall()
+    if tracer is not None:
+        tracer.write(trace_path)
+        logger.info(
+            f"Wrote trace of {tracer.count} spans to {trace_path}"
+            f" ({tracer.dropped_spans} dropped)"
+        )
 
 
 if __name__ == "__main__":
-    parser = ArgumentParser(description="Benchmark LCM or eCAL subscription processing")
-    parser.add_argument("--middleware", choices=("lcm", "ecal"), default="lcm")
+    parser = ArgumentParser(description="Benchmark middleware subscription processing")
     parser.add_argument(
-        "--lcm-url", type=str, default="udpm://239.255.76.67:7667?ttl=1"
+        "--middleware",
+        choices=backend_names(),
+        default="lcm",
+        help="Backend to benchmark, see backends.py (default=lcm)",
+    )
+    parser.add_argument(
+        "--lcm-url",
+        type=str,
+        default="udpm://239.255.76.67:7667?ttl=1",
+        help="LCM provider; raw transports also use it for their handshake, and raw "
+        "udp for its multicast group",
     )
     parser.add_argument("--channel-name", type=str, default="/benchmark")
     parser.add_argument("--num-msgs", type=int, default=5)
+    parser.add_argument(
+        "--keep-samples",
+        action="store_true",
+        help="Also save every per-message sample, not just the streaming statistics",
+    )
+    parser.add_argument(
+        "--receive-timeout-s",
+        type=float,
+        default=5.0,
+        help="End the run once no message arrived for this long (default=5.0)",
+    )
+    parser.add_argument(
+        "--echo",
+        action="store_true",
+        help="Run as echo responder for the publisher's --mode roundtrip: "
+        "republish every message on <channel-name>_echo",
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Receive every phase of a publisher session (--session-sizes-bytes) "
+        "and write one report per phase; --num-msgs is taken from each phase",
+    )
+    parser.add_argument(
+        "--workload",
+        type=Path,
+        default=None,
+        help="YAML spec of the topics to receive (the publisher's --workload); "
+        "--num-msgs is taken from the spec",
+    )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Receive through an asyncio event loop shared by every channel "
+        "(LCM: loop.add_reader on its socket, eCAL: callbacks handed over with "
+        "call_soon_threadsafe)",
+    )
+    parser.add_argument(
+        "--zero-copy",
+        action="store_true",
+        help="Decode lazily in place: the blob stays a memoryview slice of the "
+        "received buffer instead of being copied out of it",
+    )
+    parser.add_argument(
+        "--gc-instrumentation",
+        action="store_true",
+        help="Time every GC pause, count allocations per message and report which "
+        "fraction of the p99 outliers overlapped a pause",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="--gc-instrumentation plus tracemalloc: peak allocation per message and "
+        "a snapshot per phase next to the reports (slow)",
+    )
+    parser.add_argument(
+        "--live-metrics-interval-s",
+        type=float,
+        default=0.0,
+        help="Publish rolling-window throughput and p50/p99 of the one-way latencies "
+        "this often while running: appended to <middleware>_subscriber_live_metrics.jsonl "
+        "and written as Prometheus text to .prom next to the reports, 0 disables "
+        "(default=0)",
+    )
+    parser.add_argument(
+        "--live-metrics-window-s",
+        type=float,
+        default=None,
+        help="Length of the rolling window (default: --live-metrics-interval-s)",
+    )
+    parser.add_argument(
+        "--live-metrics-port",
+        type=int,
+        default=0,
+        help="Also serve the live metrics on http://127.0.0.1:<port>/metrics "
+        "(default=0, not served)",
+    )
+    parser.add_argument(
+        "--clock-sync",
+        action="store_true",
+        help="Estimate the offset to the publisher's clock (which must also run with "
+        "--clock-sync) before and after every run, correct the one-way latencies "
+        "with it and report the error bound and drift",
+    )
+    parser.add_argument(
+        "--inject-clock-offset-ms",
+        type=float,
+        default=0.0,
+        help="Shift this process's clock by this much, to check --clock-sync on a "
+        "single host (default=0.0)",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="Run profile YAML (CPU affinity incl. eCAL callback threads, SCHED_FIFO, "
+        "GC control) to run this process with; see profiles/pinned.yaml",
+    )
+    parser.add_argument(
+        "--resource-interval-s",
+        type=float,
+        default=0.0,
+        help="Sample CPU time, context switches, RSS and kernel UDP counters from "
+        f"/proc this often during a run, e.g. {DEFAULT_RESOURCE_INTERVAL_S}; the sampler "
+        "thread competes with the measurement, so it is off by default (default=0)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a span for every step of every message and write them as "
+        "Chrome trace JSON next to the reports (open in https://ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--trace-capacity",
+        type=int,
+        default=DEFAULT_TRACE_CAPACITY,
+        help="Spans the preallocated trace buffer holds, later ones are dropped "
+        f"(default={DEFAULT_TRACE_CAPACITY})",
+    )
     parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default="",
+        help="Identifier shared by the publisher and subscriber reports of one run",
+    )
     parser.add_argument(
         "--log-level",
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
@@ -268,4 +987,23 @@ if __name__ == "__main__":
         results_dir=args.results_dir,
         log_level=args.log_level,
         log_output=args.log_output,
+        keep_samples=args.keep_samples,
+        receive_timeout_s=args.receive_timeout_s,
+        echo=args.echo,
+        run_id=args.run_id,
+        session=args.session,
+        workload=args.workload,
+        trace=args.trace,
+        trace_capacity=args.trace_capacity,
+        resource_interval_s=args.resource_interval_s,
+        use_asyncio=args.asyncio,
+        zero_copy=args.zero_copy,
+        profile=args.profile,
+        gc_instrumentation=args.gc_instrumentation,
+        trace_malloc=args.tracemalloc,
+        clock_sync=args.clock_sync,
+        inject_clock_offset_ms=args.inject_clock_offset_ms,
+        live_metrics_interval_s=args.live_metrics_interval_s,
+        live_metrics_window_s=args.live_metrics_window_s,
+        live_metrics_port=args.live_metrics_port,
     )
@@ -0,0 +1,419 @@
+import logging
+import re
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from pathlib import Path
+from queue import Queue
+from time import time as now
+from time import time_ns
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from backends import backend_names
+from runner import DEFAULT_GRACE_S, load_reports, run_pair
+from session import build_phases
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES_BYTES = [1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024]
+DEFAULT_RATES_HZ = [10.0, 100.0, 1000.0]
+
+
+def slot_lcm_url(lcm_url: str, slot: int) -> str:
+    """
+    Give each parallel slot its own UDP port, so that concurrent cells do not
+    receive (and spend time discarding) each other's multicast traffic.
+    """
+    if slot == 0:
+        return lcm_url
+    match = re.search(r":(\d+)", lcm_url.split("://", 1)[-1])
+    if match is None:
+        raise ValueError(f"cannot find a port in lcm url {lcm_url!r}")
+    port = int(match.group(1))
+    return lcm_url.replace(f":{port}", f":{port + slot}", 1)
+
+
+def run_cell(
+    cell: Dict[str, Any],
+    slot: int,
+    run_id: str,
+    results_dir: Path,
+    lcm_url: str,
+    channel_name: str,
+    receive_timeout_s: float,
+    publisher_args: List[str],
+    subscriber_args: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Run one (middleware, size, rate) cell and summarize where its reports went."""
+    cell_name = (
+        f"{cell['middleware']}_{cell['num_bytes']}B_{cell['transmission_rate']:g}Hz"
+    )
+    url = slot_lcm_url(lcm_url, slot)
+    logger.info(f"[slot {slot}] running {cell_name}")
+
+    pub_report, sub_report = run_pair(
+        cell["middleware"],
+        cell["num_bytes"],
+        cell["transmission_rate"],
+        cell["num_msgs"],
+        results_dir / cell_name,
+        # NOTE: the handshake channel is derived from the data channel, so a
+        #       per-slot channel also keeps concurrent handshakes apart
+        channel_name=f"{channel_name}_{slot}",
+        publisher_args=["--lcm-url", url, *publisher_args],
+        subscriber_args=[
+            "--lcm-url",
+            url,
+            "--receive-timeout-s",
+            str(receive_timeout_s),
+            *(subscriber_args or []),
+        ],
+        run_id=run_id,
+    )
+
+    summary = summarize_cell(cell, pub_report, sub_report)
+    logger.info(f"[slot {slot}] finished {cell_name} (ok={summary['ok']})")
+    return summary
+
+
+def run_session_cell(
+    middleware: str,
+    sizes_bytes: List[int],
+    rates_hz: List[float],
+    num_msgs: Optional[int],
+    duration_s: float,
+    slot: int,
+    run_id: str,
+    results_dir: Path,
+    lcm_url: str,
+    channel_name: str,
+    receive_timeout_s: float,
+    publisher_args: List[str],
+    subscriber_args: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run every phase of one middleware in a single publisher/subscriber session
+    and summarize each phase like a cell of its own.
+    """
+    # NOTE: the same phase list the publisher builds from its arguments below
+    phases = build_phases(
+        sizes_bytes, rates_hz, num_msgs or 0, None if num_msgs else duration_s
+    )
+    session_dir = results_dir / f"{middleware}_session"
+    url = slot_lcm_url(lcm_url, slot)
+    logger.info(f"[slot {slot}] running {middleware} session of {len(phases)} phases")
+
+    run_pair(
+        middleware,
+        phases[0].num_bytes,
+        phases[0].transmission_rate_hz,
+        phases[0].num_msgs,
+        session_dir,
+        channel_name=f"{channel_name}_{slot}",
+        publisher_args=[
+            "--lcm-url",
+            url,
+            "--session-sizes-bytes",
+            *map(str, sizes_bytes),
+            "--session-rates",
+            *map(str, rates_hz),
+            *([] if num_msgs else ["--phase-duration-s", str(duration_s)]),
+            *publisher_args,
+        ],
+        subscriber_args=[
+            "--lcm-url",
+            url,
+            "--receive-timeout-s",
+            str(receive_timeout_s),
+            "--session",
+            *(subscriber_args or []),
+        ],
+        timeout_s=sum(p.num_msgs / p.transmission_rate_hz for p in phases)
+        + DEFAULT_GRACE_S,
+        run_id=run_id,
+    )
+
+    pub_reports = {
+        report["parameters"].get("phase_index"): report
+        for report in load_reports(session_dir / "publisher")
+    }
+    sub_reports = {
+        report["parameters"].get("phase_index"): report
+        for report in load_reports(session_dir / "subscriber")
+    }
+    summaries = []
+    for phase in phases:
+        cell = {
+            "middleware": middleware,
+            "num_bytes": phase.num_bytes,
+            "transmission_rate": phase.transmission_rate_hz,
+            "num_msgs": phase.num_msgs,
+            "phase_index": phase.index,
+        }
+        summaries.append(
+            summarize_cell(
+                cell, pub_reports.get(phase.index), sub_reports.get(phase.index)
+            )
+        )
+    failed = sum(not summary["ok"] for summary in summaries)
+    logger.info(f"[slot {slot}] finished {middleware} session ({failed} phases failed)")
+    return summaries
+
+
+def summarize_cell(
+    cell: Dict[str, Any],
+    pub_report: Optional[Dict[str, Any]],
+    sub_report: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Where a cell's reports went, plus its headline loss and latency numbers."""
+    summary = dict(cell)
+    summary["publisher_report"] = pub_report["report_path"] if pub_report else None
+    summary["subscriber_report"] = sub_report["report_path"] if sub_report else None
+    summary["ok"] = pub_report is not None and sub_report is not None
+    if sub_report is not None:
+        delivery = sub_report.get("delivery_statistics", {})
+        summary["loss_rate"] = delivery.get("loss_rate")
+        summary["p99_oneway_latency_ms"] = sub_report.get(
+            "oneway_latency_statistics", {}
+        ).get("p99_ms")
+    return summary
+
+
+def main(
+    middlewares: List[str],
+    sizes_bytes: List[int],
+    rates_hz: List[float],
+    num_msgs: Optional[int],
+    duration_s: float,
+    results_dir: Path | str,
+    jobs: int,
+    lcm_url: str,
+    channel_name: str,
+    receive_timeout_s: float,
+    publisher_args: List[str],
+    log_level: str,
+    session: bool = False,
+    profile: Optional[Path] = None,
+    resource_interval_s: float = 0.0,
+) -> None:
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        level=getattr(logging, log_level),
+    )
+    assert jobs >= 1, "jobs must be >= 1"
+
+    if isinstance(results_dir, str):
+        results_dir = Path(results_dir)
+    run_id = f"sweep_{time_ns()}"
+    results_dir = results_dir / run_id
+    results_dir.mkdir(parents=True, exist_ok=True)
+    # NOTE: both sides of every cell run under the same profile (and only sample
+    #       their resource usage when asked to)
+    side_args = ["--profile", str(profile)] if profile else []
+    if resource_interval_s > 0:
+        side_args += ["--resource-interval-s", str(resource_interval_s)]
+
+    cells: List[Dict[str, Any]] = [
+        {
+            "middleware": middleware,
+            "num_bytes": num_bytes,
+            "transmission_rate": rate_hz,
+            # NOTE: both sides of a cell always get the same message count
+            "num_msgs": num_msgs or max(1, round(rate_hz * duration_s)),
+        }
+        for middleware, num_bytes, rate_hz in product(
+            middlewares, sizes_bytes, rates_hz
+        )
+    ]
+    logger.info(f"Sweep {run_id}: {len(cells)} cells, {jobs} in parallel")
+    # NOTE: recorded in the index, so results of cells that shared the host with
+    #       each other are not mistaken for isolated measurements
+    concurrent = jobs > 1 and (len(middlewares) if session else len(cells)) > 1
+    if concurrent:
+        logger.warning(
+            "Running cells concurrently, their latency and loss numbers affect "
+            "each other"
+        )
+
+    # each worker thread borrows a slot (channel name + LCM port) for one cell
+    # at a time, so no two running cells ever share a transport
+    slots: "Queue[int]" = Queue()
+    for slot in range(jobs):
+        slots.put(slot)
+
+    def run(cell: Dict[str, Any]) -> Dict[str, Any]:
+        slot = slots.get()
+        try:
+            return run_cell(
+                cell,
+                slot,
+                run_id,
+                results_dir,
+                lcm_url,
+                channel_name,
+                receive_timeout_s,
+                [*publisher_args, *side_args],
+                side_args,
+            )
+        finally:
+            slots.put(slot)
+
+    def run_session(middleware: str) -> List[Dict[str, Any]]:
+        slot = slots.get()
+        try:
+            return run_session_cell(
+                middleware,
+                sizes_bytes,
+                rates_hz,
+                num_msgs,
+                duration_s,
+                slot,
+                run_id,
+                results_dir,
+                lcm_url,
+                channel_name,
+                receive_timeout_s,
+                [*publisher_args, *side_args],
+                side_args,
+            )
+        finally:
+            slots.put(slot)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        if session:
+            # NOTE: one long-lived pair per middleware steps through every cell, so
+            #       interpreter startup and middleware discovery are paid only once
+            summaries = [
+                summary
+                for session_summaries in pool.map(run_session, middlewares)
+                for summary in session_summaries
+            ]
+        else:
+            summaries = list(pool.map(run, cells))
+
+    report: Dict[str, Any] = {
+        "timestamp_us": int(now() * 1e6),
+        "run_id": run_id,
+        "parameters": {
+            "middlewares": middlewares,
+            "sizes_bytes": sizes_bytes,
+            "rates_hz": rates_hz,
+            "num_msgs": num_msgs,
+            "duration_s": duration_s,
+            "jobs": jobs,
+            "concurrent_cells": concurrent,
+            "session": session,
+            "publisher_args": publisher_args,
+            "profile": str(profile) if profile else None,
+            "resource_interval_s": resource_interval_s,
+        },
+        "cells": summaries,
+    }
+    out = results_dir / f"sweep_{report['timestamp_us']}.yaml"
+    with open(out, "w") as f:
+        yaml.dump(report, f)
+
+    failed = sum(not summary["ok"] for summary in summaries)
+    logger.info(f"Wrote sweep index to {out} ({failed} of {len(cells)} cells failed)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Run publisher/subscriber pairs over a middleware x size x rate matrix"
+    )
+    parser.add_argument(
+        "--middleware", nargs="+", choices=backend_names(), default=["lcm", "ecal"]
+    )
+    parser.add_argument(
+        "--sizes-bytes", nargs="+", type=int, default=DEFAULT_SIZES_BYTES
+    )
+    parser.add_argument(
+        "--rates",
+        nargs="+",
+        type=float,
+        default=DEFAULT_RATES_HZ,
+        help="Send rates (Hz)",
+    )
+    parser.add_argument(
+        "--num-msgs",
+        type=int,
+        default=None,
+        help="Messages per cell (default=rate * --duration-s)",
+    )
+    parser.add_argument(
+        "--duration-s",
+        type=float,
+        default=5.0,
+        help="Nominal length of each cell when --num-msgs is not set (default=5.0)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Cells run in parallel; concurrent cells compete for CPU, cache and the "
+        "loopback interface and skew each other's latency and loss, so only use this "
+        "for quick overviews (each needs two cores) (default=1)",
+    )
+    parser.add_argument(
+        "--lcm-url", type=str, default="udpm://239.255.76.67:7667?ttl=1"
+    )
+    parser.add_argument("--channel-name", type=str, default="/benchmark")
+    parser.add_argument("--results-dir", type=str, default="./results")
+    parser.add_argument(
+        "--receive-timeout-s",
+        type=float,
+        default=2.0,
+        help="Subscriber receive timeout once messages flow (default=2.0)",
+    )
+    parser.add_argument(
+        "--publisher-args",
+        nargs="*",
+        default=[],
+        help="Extra arguments passed to every publisher, e.g. --publisher-args=--keep-samples",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="Run profile YAML both sides of every cell run with (see profiles/)",
+    )
+    parser.add_argument(
+        "--resource-interval-s",
+        type=float,
+        default=0.0,
+        help="Have both sides of every cell sample their resource usage this often, "
+        "e.g. 0.1 (default=0, off)",
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Run all sizes and rates of a middleware in one publisher/subscriber "
+        "session instead of one process pair per cell",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set the logging level. (default=INFO)",
+    )
+    args = parser.parse_args()
+
+    main(
+        middlewares=args.middleware,
+        sizes_bytes=args.sizes_bytes,
+        rates_hz=args.rates,
+        num_msgs=args.num_msgs,
+        duration_s=args.duration_s,
+        results_dir=args.results_dir,
+        jobs=args.jobs,
+        lcm_url=args.lcm_url,
+        channel_name=args.channel_name,
+        receive_timeout_s=args.receive_timeout_s,
+        publisher_args=args.publisher_args,
+        log_level=args.log_level,
+        session=args.session,
+        profile=args.profile,
+        resource_interval_s=args.resource_interval_s,
+    )
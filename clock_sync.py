@@ -0,0 +1,374 @@
+"""
+NTP-style estimate of the offset between the publisher's and a subscriber's
+wall clocks, so that one-way latencies measured across hosts can be
+corrected for it.
+
+The subscriber (the prober) sends timestamped probes, the publisher (the
+responder) answers each one with its own receive and send timestamps:
+
+    t1: probe sent       (subscriber clock)
+    t2: probe received   (publisher clock)
+    t3: reply sent       (publisher clock)
+    t4: reply received   (subscriber clock)
+
+    offset = ((t2 - t1) + (t3 - t4)) / 2    publisher clock - subscriber clock
+    delay  = (t4 - t1) - (t3 - t2)          round trip on the wire
+
+Whatever the asymmetry of the two directions, the true offset lies within
+delay / 2 of the estimate, so the probe with the smallest delay gives the
+estimate and its delay / 2 the error bound. Probing before and after a run
+also gives the drift between the two clocks. On LCM the probes ride the
+readiness handshake channel (lcmtypes.handshake_t), on eCAL a pair of
+topics next to the data channel.
+"""
+
+import logging
+import os
+import sys
+import threading
+from queue import Empty as QueueEmpty
+from queue import Full as QueueFull
+from queue import Queue
+from time import monotonic, sleep, time_ns
+from typing import Any, Dict, List, Optional, Set
+
+import ecal.core.core as ecal_core
+from lcm import LCM
+
+from control_pb2 import ClockProbe as ClockProbeProto
+from lcmtypes import handshake_t
+
+logger = logging.getLogger(__name__)
+
+# probe message kinds (same values in lcmtypes.handshake_t and control_pb2.ClockProbe)
+PROBE = handshake_t.PROBE
+PROBE_REPLY = handshake_t.PROBE_REPLY
+DONE = handshake_t.DONE
+
+DEFAULT_NUM_PROBES = 16
+# how long a probe waits for its reply before the next one is sent
+PROBE_TIMEOUT_S = 0.1
+# NOTE: probes are spaced out so that one burst of traffic does not queue them up
+PROBE_INTERVAL_S = 0.005
+# how long a subscriber probes for a responder (which may start later) and the
+# publisher waits for its subscribers to finish probing
+DEFAULT_CLOCK_SYNC_TIMEOUT_S = 60.0
+
+
+def clock_probe_channel(channel: str) -> str:
+    """eCAL topic on which subscribers send clock probes."""
+    return f"{channel}_clock"
+
+
+def clock_reply_channel(channel: str) -> str:
+    """eCAL topic on which the publisher answers clock probes."""
+    return f"{channel}_clock_reply"
+
+
+class Probe:
+    """One clock probe message; receive_ns is stamped by whoever received it."""
+
+    __slots__ = ("kind", "pid", "seq", "t1_ns", "t2_ns", "t3_ns", "receive_ns")
+
+    def __init__(
+        self,
+        kind: int,
+        pid: int,
+        seq: int = 0,
+        t1_ns: int = 0,
+        t2_ns: int = 0,
+        t3_ns: int = 0,
+        receive_ns: int = 0,
+    ):
+        self.kind = kind
+        self.pid = pid
+        self.seq = seq
+        self.t1_ns = t1_ns
+        self.t2_ns = t2_ns
+        self.t3_ns = t3_ns
+        self.receive_ns = receive_ns
+
+
+class ClockEstimate:
+    """The offset (publisher - subscriber clock) given by one burst of probes."""
+
+    def __init__(self, offset_ns: int, delay_ns: int, time_ns: int, num_probes: int):
+        """
+        :param offset_ns:  estimate from the probe with the smallest delay
+        :param delay_ns:   that probe's round trip on the wire
+        :param time_ns:    when it was taken (subscriber clock)
+        :param num_probes: answered probes the estimate was picked from
+        """
+        self.offset_ns = offset_ns
+        self.delay_ns = delay_ns
+        self.time_ns = time_ns
+        self.num_probes = num_probes
+
+    @property
+    def error_bound_ns(self) -> int:
+        return self.delay_ns // 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset_ms": self.offset_ns / 1e6,
+            "error_bound_ms": self.error_bound_ns / 1e6,
+            "delay_ms": self.delay_ns / 1e6,
+            "time_ns": self.time_ns,
+            "num_probes": self.num_probes,
+        }
+
+
+def estimate_offset(probes: List[Probe]) -> Optional[ClockEstimate]:
+    """The estimate of the answered probes' least delayed one (None if there is none)."""
+    best: Optional[ClockEstimate] = None
+    for probe in probes:
+        t1, t2, t3, t4 = probe.t1_ns, probe.t2_ns, probe.t3_ns, probe.receive_ns
+        delay_ns = max(0, (t4 - t1) - (t3 - t2))
+        if best is None or delay_ns < best.delay_ns:
+            best = ClockEstimate(((t2 - t1) + (t3 - t4)) // 2, delay_ns, t4, 0)
+    if best is not None:
+        best.num_probes = len(probes)
+    return best
+
+
+def clock_sync_report(
+    before: Optional[ClockEstimate],
+    after: Optional[ClockEstimate],
+    injected_offset_ns: int = 0,
+) -> Dict[str, Any]:
+    """
+    What a subscriber report records about the correction of its latencies:
+    the estimates before and after the run, the drift between them, and how
+    far off the latencies corrected with the `before` offset can be at most.
+    """
+    report: Dict[str, Any] = {
+        "applied_offset_ms": before.offset_ns / 1e6 if before is not None else 0.0,
+        "injected_offset_ms": injected_offset_ns / 1e6,
+        "before": before.to_dict() if before is not None else None,
+        "after": after.to_dict() if after is not None else None,
+    }
+    if before is None:
+        return report
+    if after is None:
+        report["latency_error_bound_ms"] = before.error_bound_ns / 1e6
+        return report
+    elapsed_ns = after.time_ns - before.time_ns
+    if elapsed_ns > 0:
+        report["drift_ppm"] = (after.offset_ns - before.offset_ns) / elapsed_ns * 1e6
+    # NOTE: a constant correction is off by the drift accumulated over the run on
+    #       top of the uncertainty of either estimate
+    report["latency_error_bound_ms"] = (
+        max(before.error_bound_ns, after.error_bound_ns)
+        + abs(after.offset_ns - before.offset_ns)
+    ) / 1e6
+    return report
+
+
+class ClockSync:
+    """
+    Clock probes between one publisher (server=True, the responder) and its
+    subscribers (the probers). The publisher answers probes in a background
+    thread from serve() until close(), and waits in wait_for_done() until
+    every subscriber has finished probing; a subscriber calls probe() before
+    and after its runs and send_done() at the end.
+
+    injected_offset_ns shifts this process's clock, so that the estimate can
+    be checked on one host.
+    """
+
+    def __init__(self, server: bool):
+        self.server = server
+        self.injected_offset_ns = 0
+        self._pid = os.getpid()
+        self._seq = 0
+        self._done_pids: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def now_ns(self) -> int:
+        return time_ns() + self.injected_offset_ns
+
+    def send(self, probe: Probe) -> None:
+        raise NotImplementedError
+
+    def poll(self, timeout_s: float) -> Optional[Probe]:
+        """The next probe message addressed to this side, or None after timeout_s."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve(self) -> None:
+        """Publisher: start answering probes in the background."""
+        self._thread = threading.Thread(
+            target=self._serve, name="clock-sync", daemon=True
+        )
+        self._thread.start()
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            probe = self.poll(PROBE_TIMEOUT_S)
+            if probe is None:
+                continue
+            if probe.kind == DONE:
+                self._done_pids.add(probe.pid)
+            elif probe.kind == PROBE:
+                probe.kind = PROBE_REPLY
+                probe.t2_ns = probe.receive_ns
+                probe.t3_ns = self.now_ns()
+                self.send(probe)
+
+    def wait_for_done(self, count: int, timeout_s: float) -> bool:
+        """Publisher: wait until `count` subscribers are done probing (False on timeout)."""
+        deadline = monotonic() + timeout_s
+        while len(self._done_pids) < count:
+            if monotonic() >= deadline:
+                return False
+            sleep(0.01)
+        return True
+
+    def probe(
+        self,
+        num_probes: int = DEFAULT_NUM_PROBES,
+        timeout_s: float = DEFAULT_CLOCK_SYNC_TIMEOUT_S,
+    ) -> Optional[ClockEstimate]:
+        """
+        Subscriber: send probes until num_probes were answered (or timeout_s
+        passed) and return the estimate, None if none was answered.
+        """
+        answered: List[Probe] = []
+        deadline = monotonic() + timeout_s
+        while len(answered) < num_probes and monotonic() < deadline:
+            self._seq += 1
+            self.send(Probe(PROBE, self._pid, self._seq, t1_ns=self.now_ns()))
+            reply_deadline = monotonic() + PROBE_TIMEOUT_S
+            while monotonic() < reply_deadline:
+                reply = self.poll(reply_deadline - monotonic())
+                if reply is None:
+                    break
+                # NOTE: replies to the other subscribers and to timed out probes
+                if reply.pid == self._pid and reply.seq == self._seq:
+                    answered.append(reply)
+                    break
+            sleep(PROBE_INTERVAL_S)
+        estimate = estimate_offset(answered)
+        if estimate is None:
+            logger.warning(f"No clock probe answered within {timeout_s:.1f} s")
+        else:
+            logger.info(
+                f"Clock offset {estimate.offset_ns / 1e6:+.3f} ms "
+                f"(+-{estimate.error_bound_ns / 1e6:.3f} ms, {len(answered)} probes)"
+            )
+        return estimate
+
+    def send_done(self) -> None:
+        """Subscriber: tell the publisher it is done probing."""
+        # NOTE: sent twice, like the ready ping, as nothing answers it
+        for _ in range(2):
+            self.send(Probe(DONE, self._pid))
+            sleep(0.01)
+
+
+class LcmClockSync(ClockSync):
+    def __init__(self, url: str, channel: str, server: bool):
+        super().__init__(server)
+        # NOTE: its own LCM instance (like LCMHandshake), the responder thread is
+        #       the only one to handle() it
+        self._conn = LCM(provider=url)
+        self._channel = f"{channel}_ready"
+        self._inbox: List[Probe] = []
+        self._conn.subscribe(self._channel, self._on_message)
+
+    def _on_message(self, _: str, data: bytes) -> None:
+        receive_ns = self.now_ns()
+        msg = handshake_t.decode(data)
+        wanted = (PROBE, DONE) if self.server else (PROBE_REPLY,)
+        if msg.kind in wanted:
+            self._inbox.append(
+                Probe(
+                    msg.kind,
+                    msg.pid,
+                    msg.seq,
+                    msg.t1_ns,
+                    msg.t2_ns,
+                    msg.t3_ns,
+                    receive_ns,
+                )
+            )
+
+    def send(self, probe: Probe) -> None:
+        msg = handshake_t()
+        msg.kind = probe.kind
+        msg.pid = probe.pid
+        msg.seq = probe.seq
+        msg.t1_ns = probe.t1_ns
+        msg.t2_ns = probe.t2_ns
+        msg.t3_ns = probe.t3_ns
+        self._conn.publish(self._channel, msg.encode())
+
+    def poll(self, timeout_s: float) -> Optional[Probe]:
+        deadline = monotonic() + timeout_s
+        # NOTE: handle_timeout() can return without having dispatched to _on_message
+        while not self._inbox:
+            remaining_ms = max(0, int((deadline - monotonic()) * 1e3))
+            if self._conn.handle_timeout(remaining_ms) <= 0 or remaining_ms == 0:
+                break
+        return self._inbox.pop(0) if self._inbox else None
+
+
+class eCALClockSync(ClockSync):
+    def __init__(self, channel: str, server: bool):
+        super().__init__(server)
+        # NOTE: initialize() is reference counted, see eCALSessionControl
+        ecal_core.initialize(sys.argv, f"benchmark_clock_sync_{channel}")
+        if server:
+            send_topic = clock_reply_channel(channel)
+            listen_topic = clock_probe_channel(channel)
+        else:
+            send_topic = clock_probe_channel(channel)
+            listen_topic = clock_reply_channel(channel)
+        topic_type = "proto:" + ClockProbeProto.DESCRIPTOR.full_name
+        self._pub = ecal_core.publisher(send_topic, topic_type)
+        self._sub = ecal_core.subscriber(listen_topic, topic_type)
+        self._inbox: Queue = Queue(maxsize=100)
+        self._sub.set_callback(self._on_message)
+
+    def _on_message(self, topic: str, msg: bytes, timestamp: float) -> None:
+        receive_ns = self.now_ns()
+        proto = ClockProbeProto.FromString(msg)
+        probe = Probe(
+            int(proto.kind),
+            proto.pid,
+            proto.seq,
+            proto.t1_ns,
+            proto.t2_ns,
+            proto.t3_ns,
+            receive_ns,
+        )
+        try:
+            self._inbox.put_nowait(probe)
+        except QueueFull:
+            logger.error("clock probe queue is full")
+
+    def send(self, probe: Probe) -> None:
+        proto = ClockProbeProto(
+            kind=probe.kind,
+            pid=probe.pid,
+            seq=probe.seq,
+            t1_ns=probe.t1_ns,
+            t2_ns=probe.t2_ns,
+            t3_ns=probe.t3_ns,
+        )
+        self._pub.send(proto.SerializeToString())
+
+    def poll(self, timeout_s: float) -> Optional[Probe]:
+        try:
+            return self._inbox.get(block=True, timeout=max(0.0, timeout_s))
+        except QueueEmpty:
+            return None
+
+    def close(self) -> None:
+        super().close()
+        ecal_core.finalize()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: control.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rcontrol.proto\x12\nprototypes\"\xda\x01\n\x05Phase\x12$\n\x04kind\x18\x01 \x01(\x0e\x32\x16.prototypes.Phase.Kind\x12\r\n\x05index\x18\x02 \x01(\x05\x12\x11\n\tnum_bytes\x18\x03 \x01(\x05\x12\x1c\n\x14transmission_rate_hz\x18\x04 \x01(\x01\x12\x10\n\x08num_msgs\x18\x05 \x01(\x03\"Y\n\x04Kind\x12\x0b\n\x07UNKNOWN\x10\x00\x12\t\n\x05START\x10\x01\x12\x0b\n\x07STARTED\x10\x02\x12\x07\n\x03\x45ND\x10\x03\x12\t\n\x05\x45NDED\x10\x04\x12\n\n\x06\x46INISH\x10\x05\x12\x0c\n\x08\x46INISHED\x10\x06\"\xb7\x01\n\nClockProbe\x12)\n\x04kind\x18\x01 \x01(\x0e\x32\x1b.prototypes.ClockProbe.Kind\x12\x0b\n\x03pid\x18\x02 \x01(\x05\x12\x0b\n\x03seq\x18\x03 \x01(\x05\x12\r\n\x05t1_ns\x18\x04 \x01(\x03\x12\r\n\x05t2_ns\x18\x05 \x01(\x03\x12\r\n\x05t3_ns\x18\x06 \x01(\x03\"7\n\x04Kind\x12\t\n\x05READY\x10\x00\x12\t\n\x05PROBE\x10\x01\x12\x0f\n\x0bPROBE_REPLY\x10\x02\x12\x08\n\x04\x44ONE\x10\x03\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'control_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _PHASE._serialized_start=30
+  _PHASE._serialized_end=248
+  _PHASE_KIND._serialized_start=159
+  _PHASE_KIND._serialized_end=248
+  _CLOCKPROBE._serialized_start=251
+  _CLOCKPROBE._serialized_end=434
+  _CLOCKPROBE_KIND._serialized_start=379
+  _CLOCKPROBE_KIND._serialized_end=434
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,260 @@
+"""
+Opt-in instrumentation of the recurring interpreter overheads on the hot
+path: garbage collection pauses and allocations.
+
+  - every collection is timed through gc.callbacks,
+  - every message's allocations are counted: the net change in allocated
+    memory blocks (sys.getallocatedblocks) and, with tracemalloc, the peak
+    of the memory it allocated,
+  - with tracemalloc every phase ends with a snapshot of what it allocated
+    and still holds (written next to the reports, tracemalloc.Snapshot.load
+    reads it back).
+
+A GC pause that overlaps the time window of a message's measurement (e.g.
+its publish call or its one-way latency) is annotated onto that message, so
+each report can state which fraction of its p99 outliers coincided with a
+collection.
+"""
+
+import gc
+import sys
+import tracemalloc
+from array import array
+from pathlib import Path
+from time import perf_counter, time_ns
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmark import compute_stats
+from histogram import SampleRecorder
+
+DEFAULT_TRACEMALLOC_FRAMES = 1
+# the longest pauses of a phase are reported with the ids of the messages they hit
+REPORTED_PAUSES = 20
+MAX_ANNOTATED_MSGS = 100
+TOP_ALLOCATION_SITES = 10
+
+
+class GcMonitor:
+    """
+    Records GC pauses and per-message allocations of one process, one phase
+    at a time: begin_phase(), then message_start() / message_end() around
+    every message, then end_phase() for the report.
+    """
+
+    def __init__(
+        self,
+        process: str,
+        trace_malloc: bool = False,
+        snapshot_dir: Optional[Path] = None,
+        frames: int = DEFAULT_TRACEMALLOC_FRAMES,
+    ):
+        """
+        :param process:      which side of the benchmark this is (publisher / subscriber)
+        :param trace_malloc: also trace allocations with tracemalloc (slow)
+        :param snapshot_dir: where the tracemalloc snapshot of every phase is written
+        :param frames:       stack frames tracemalloc keeps per allocation
+        """
+        self.process = process
+        self.trace_malloc = trace_malloc
+        self.snapshot_dir = snapshot_dir
+        self.frames = frames
+        self._collection_start_s = 0.0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._phase_start_s = perf_counter()
+        self._pause_start_s = array("d")
+        self._pause_end_s = array("d")
+        self._pause_generation = array("B")
+        self._pause_collected = array("q")
+        self._pause_msgs: List[List[int]] = []
+        # per measured quantity: its value and how much GC pause overlapped it, per message
+        self._metrics: Dict[str, Tuple[array, array]] = {}
+        self._allocated_blocks = SampleRecorder()
+        self._peak_bytes = SampleRecorder()
+        self._blocks_before = 0
+        self._traced_before = 0
+
+    def install(self) -> None:
+        gc.callbacks.append(self._on_collection)
+
+    def uninstall(self) -> None:
+        gc.callbacks.remove(self._on_collection)
+        if self.trace_malloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _on_collection(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == "start":
+            self._collection_start_s = perf_counter()
+            return
+        self._pause_start_s.append(self._collection_start_s)
+        self._pause_end_s.append(perf_counter())
+        self._pause_generation.append(info["generation"])
+        self._pause_collected.append(info["collected"])
+        self._pause_msgs.append([])
+
+    def begin_phase(self) -> None:
+        """Start recording a phase (discarding the previous one)."""
+        self._reset()
+        if self.trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            # NOTE: the snapshot at the end then only holds what this phase allocated
+            tracemalloc.clear_traces()
+
+    def message_start(self) -> None:
+        self._blocks_before = sys.getallocatedblocks()
+        if self.trace_malloc:
+            tracemalloc.reset_peak()
+            self._traced_before = tracemalloc.get_traced_memory()[0]
+
+    def message_end(
+        self, sequence_number: int, windows: Dict[str, Tuple[float, float, float]]
+    ) -> None:
+        """
+        Record the allocations since message_start() and, for every measured
+        quantity name -> (value_ms, start_s, end_s) of the message, how much GC
+        pause overlapped its perf_counter() window [start_s, end_s].
+        """
+        self._allocated_blocks.record(sys.getallocatedblocks() - self._blocks_before)
+        if self.trace_malloc:
+            self._peak_bytes.record(
+                tracemalloc.get_traced_memory()[1] - self._traced_before
+            )
+        for name, (value_ms, start_s, end_s) in windows.items():
+            values, overlaps = self._metrics.setdefault(name, (array("d"), array("d")))
+            values.append(value_ms)
+            overlaps.append(self._overlap_ms(sequence_number, start_s, end_s))
+
+    def _overlap_ms(self, sequence_number: int, start_s: float, end_s: float) -> float:
+        overlap_s = 0.0
+        # NOTE: pauses do not overlap each other, so walking back from the latest one
+        #       can stop at the first that ended before the window started
+        for k in range(len(self._pause_end_s) - 1, -1, -1):
+            pause_end_s = self._pause_end_s[k]
+            if pause_end_s <= start_s:
+                break
+            pause_start_s = self._pause_start_s[k]
+            if pause_start_s >= end_s:
+                continue
+            overlap_s += min(end_s, pause_end_s) - max(start_s, pause_start_s)
+            msgs = self._pause_msgs[k]
+            if len(msgs) < MAX_ANNOTATED_MSGS and (
+                not msgs or msgs[-1] != sequence_number
+            ):
+                msgs.append(sequence_number)
+        return overlap_s * 1e3
+
+    def end_phase(self, keep_samples: bool) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """The phase's (gc_statistics, per-message / per-pause columns)."""
+        # NOTE: building the report collects too, only the phase's pauses are reported
+        n = len(self._pause_end_s)
+        starts_s = self._pause_start_s[:n]
+        generations = self._pause_generation[:n]
+        pauses_ms = [
+            (end_s - start_s) * 1e3
+            for start_s, end_s in zip(starts_s, self._pause_end_s[:n])
+        ]
+        statistics: Dict[str, Any] = {
+            "process": self.process,
+            "collections": {
+                f"gen{generation}": generations.count(generation)
+                for generation in range(3)
+            },
+            "collected_objects": sum(self._pause_collected[:n]),
+            "total_pause_ms": sum(pauses_ms),
+            "pause_duration_statistics": (
+                compute_stats(pauses_ms, "ms") if pauses_ms else {}
+            ),
+            "allocated_blocks_statistics": (
+                compute_stats(self._allocated_blocks, "blocks")
+                if self._allocated_blocks
+                else {}
+            ),
+            "outlier_attribution": {
+                name: attribute_outliers(values, overlaps)
+                for name, (values, overlaps) in self._metrics.items()
+                if values
+            },
+            "longest_pauses": [
+                {
+                    "start_s": starts_s[k] - self._phase_start_s,
+                    "duration_ms": pauses_ms[k],
+                    "generation": generations[k],
+                    "collected": self._pause_collected[k],
+                    "message_ids": self._pause_msgs[k],
+                }
+                for k in sorted(
+                    range(len(pauses_ms)), key=pauses_ms.__getitem__, reverse=True
+                )[:REPORTED_PAUSES]
+            ],
+        }
+        if self.trace_malloc:
+            statistics["traced_peak_bytes_statistics"] = (
+                compute_stats(self._peak_bytes, "bytes") if self._peak_bytes else {}
+            )
+            statistics.update(self._snapshot())
+
+        columns: Dict[str, Any] = {}
+        if keep_samples:
+            columns = {
+                "gc_pause_start_s": array(
+                    "d", (s - self._phase_start_s for s in starts_s)
+                ),
+                "gc_pause_durations_ms": pauses_ms,
+                "gc_pause_generations": generations,
+                **{
+                    f"gc_overlap_{name}_ms": overlaps
+                    for name, (_, overlaps) in self._metrics.items()
+                },
+            }
+        return statistics, columns
+
+    def _snapshot(self) -> Dict[str, Any]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        current_bytes, _ = tracemalloc.get_traced_memory()
+        result: Dict[str, Any] = {
+            "traced_current_bytes": current_bytes,
+            "top_allocation_sites": [
+                {
+                    "site": str(stat.traceback),
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics("lineno")[:TOP_ALLOCATION_SITES]
+            ],
+        }
+        if self.snapshot_dir is not None:
+            path = (
+                self.snapshot_dir / f"{self.process}_tracemalloc_{time_ns()}.snapshot"
+            )
+            snapshot.dump(str(path))
+            result["tracemalloc_snapshot"] = path.name
+        return result
+
+
+def attribute_outliers(values_ms: array, overlaps_ms: array) -> Dict[str, Any]:
+    """
+    How many of the messages above the p99 of `values_ms` overlapped a GC
+    pause, next to how many of all messages did (what chance alone explains).
+    """
+    values = np.frombuffer(values_ms, dtype=np.float64)
+    with_gc = np.frombuffer(overlaps_ms, dtype=np.float64) > 0
+    p99 = float(np.percentile(values, 99))
+    outliers = values > p99
+    num_outliers = int(outliers.sum())
+    outliers_with_gc = int((outliers & with_gc).sum())
+    return {
+        "msgs": len(values),
+        "p99_ms": p99,
+        "outliers": num_outliers,
+        "outliers_with_gc": outliers_with_gc,
+        "gc_explained_fraction": (
+            outliers_with_gc / num_outliers if num_outliers else 0.0
+        ),
+        "msgs_with_gc_fraction": float(with_gc.mean()),
+    }
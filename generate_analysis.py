@@ -1,61 +1,241 @@
 #!/usr/bin/env python3
 import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import yaml
 
+from results import SAMPLES_FILE_KEY, open_samples
+
+# bump whenever parse_report's row layout changes so stale index entries are re-parsed
+INDEX_VERSION = 9
+# below this many new reports a process pool costs more than it saves
+MIN_REPORTS_FOR_POOL = 16
+# per-run resource usage (see resources.py) plotted for each side of the benchmark
+RESOURCE_USAGE_LABELS = {
+    "cpu_utilization": "CPU Utilization (CPU s / s)",
+    "cpu_ms_per_msg": "CPU Time per Message (ms)",
+    "ctx_switches_per_msg": "Context Switches per Message",
+    "involuntary_ctx_switches": "Involuntary Context Switches",
+    "rss_max_mib": "Peak RSS (MiB)",
+    "udp_rcvbuf_errors": "UDP RcvbufErrors (host)",
+    "udp_in_errors": "UDP InErrors (host)",
+}
+# measurements whose p99 outliers are attributed to GC pauses (see gc_monitor.py)
+GC_ATTRIBUTED_METRICS = {
+    "publisher": {"publish": "Publish Duration", "roundtrip": "Round-trip Latency"},
+    "subscriber": {"handle": "Handle Duration", "oneway_latency": "One-way Latency"},
+}
+
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _style(df: pd.DataFrame, middleware: str) -> Dict[str, Any]:
+    """
+    Legend label and hatching of a middleware, as recorded in its reports.
+    Baselines are hatched so they read as the floor under the others.
+    """
+    rows = df[df["middleware"] == middleware]
+    labels = rows["middleware_label"].dropna()
+    baseline = bool(rows["baseline"].fillna(False).astype(bool).any())
+    return {
+        "label": labels.iloc[0] if not labels.empty else middleware,
+        "hatch": "//" if baseline else None,
+    }
 
-def load_reports(input_dir: Path) -> pd.DataFrame:
-    rows = []
-    for filepath in input_dir.glob("*.yaml"):
-        report = yaml.safe_load(filepath.read_text())
-        params = report.get("parameters", {})
-
-        # determine message size (bytes)
-        msg_size = params.get("num_bytes") or report.get(
-            "num_bytes_statistics", {}
-        ).get("mean_bytes")
-        if msg_size is None:
-            continue
 
-        base = {
-            "middleware": params.get("middleware"),
-            "num_msgs": params.get("num_msgs"),
-            "num_bytes": msg_size,
-        }
-
-        # all the statistics dicts we care about
-        stat_dicts = {
-            "actual_transmission_rate_statistics": report.get(
-                "actual_transmission_rate_statistics", {}
-            ),
-            "publish_duration_statistics": report.get(
-                "publish_duration_statistics", {}
-            ),
-            "serialization_duration_statistics": report.get(
-                "serialization_duration_statistics", {}
-            ),
-            "end_to_end_throughput_statistics": report.get(
-                "end_to_end_throughput_statistics", {}
-            ),
-            "handle_duration_statistics": report.get("handle_duration_statistics", {}),
-            "decode_duration_statistics": report.get("decode_duration_statistics", {}),
-            "oneway_latency_statistics": report.get("oneway_latency_statistics", {}),
-        }
-
-        # flatten them, renaming any stddev_* → std_*
-        for prefix, stats in stat_dicts.items():
-            for stat_name, value in stats.items():
-                # normalize stddev → std
-                norm = stat_name.replace("stddev", "std")
-                col = f"{prefix}_{norm}"
-                base[col] = value
-
-        rows.append(base)
-
-    return pd.DataFrame(rows)
+def parse_report(filepath: Path) -> Optional[Dict[str, Any]]:
+    """
+    Parse one YAML report into a flat row of parameters and statistics, or
+    None if it is not a usable benchmark report.
+    """
+    report = yaml.load(filepath.read_text(), Loader=_YamlLoader)
+    if not isinstance(report, dict):
+        return None
+    params = report.get("parameters", {})
+    # NOTE: multi-topic workload reports mix message sizes, so they have no place on
+    #       the per-size plots; their per-topic statistics are in the report itself
+    if "workload" in params:
+        return None
+    # NOTE: transport-free codec timings, benchmark_serialization.py --plot plots them
+    if params.get("benchmark") == "serialization":
+        return None
+
+    # determine message size (bytes)
+    msg_size = params.get("num_bytes") or report.get("num_bytes_statistics", {}).get(
+        "mean_bytes"
+    )
+    if msg_size is None:
+        return None
+
+    base = {
+        "middleware": params.get("middleware"),
+        # NOTE: recorded by the backend registry; older reports only have the name
+        "middleware_label": params.get("middleware_label", params.get("middleware")),
+        "baseline": bool(params.get("baseline", False)),
+        # NOTE: run profile (see run_profile.py); older reports ran without one
+        "profile": (params.get("profile") or {}).get("name", "default"),
+        "num_msgs": params.get("num_msgs"),
+        "num_bytes": msg_size,
+        # NOTE: per-message columns stay on disk; only the path is kept here
+        "samples_report": (str(filepath) if report.get(SAMPLES_FILE_KEY) else None),
+    }
+
+    # all the statistics dicts we care about
+    stat_dicts = {
+        "actual_transmission_rate_statistics": report.get(
+            "actual_transmission_rate_statistics", {}
+        ),
+        "publish_duration_statistics": report.get("publish_duration_statistics", {}),
+        "serialization_duration_statistics": report.get(
+            "serialization_duration_statistics", {}
+        ),
+        "end_to_end_throughput_statistics": report.get(
+            "end_to_end_throughput_statistics", {}
+        ),
+        "handle_duration_statistics": report.get("handle_duration_statistics", {}),
+        "decode_duration_statistics": report.get("decode_duration_statistics", {}),
+        "copy_duration_statistics": report.get("copy_duration_statistics", {}),
+        "oneway_latency_statistics": report.get("oneway_latency_statistics", {}),
+        "corrected_oneway_latency_statistics": report.get(
+            "corrected_oneway_latency_statistics", {}
+        ),
+        "transport_latency_statistics": report.get("transport_latency_statistics", {}),
+        "queueing_duration_statistics": report.get("queueing_duration_statistics", {}),
+        "middleware_transport_latency_statistics": report.get(
+            "middleware_transport_latency_statistics", {}
+        ),
+        "oneway_latency_breakdown": report.get("oneway_latency_breakdown", {}),
+        "roundtrip_latency_statistics": report.get("roundtrip_latency_statistics", {}),
+        "delivery_statistics": report.get("delivery_statistics", {}),
+    }
+
+    # flatten them, renaming any stddev_* → std_*
+    for prefix, stats in stat_dicts.items():
+        for stat_name, value in stats.items():
+            # normalize stddev → std
+            norm = stat_name.replace("stddev", "std")
+            col = f"{prefix}_{norm}"
+            base[col] = value
+
+    # NOTE: both sides sample their resource usage, so the columns are named after
+    #       the side; the time series stay in the report
+    usage = report.get("resource_usage") or {}
+    if usage:
+        prefix = f"{usage.get('process', 'process')}_resource_usage"
+        deltas = usage.get("deltas", {})
+        for name, value in deltas.items():
+            base[f"{prefix}_{name}"] = value
+        base[f"{prefix}_rss_max_mib"] = deltas.get("rss_max_bytes", 0) / 2**20
+        num_msgs = params.get("num_msgs")
+        if num_msgs:
+            base[f"{prefix}_cpu_ms_per_msg"] = (
+                (deltas.get("cpu_user_s", 0) + deltas.get("cpu_system_s", 0))
+                * 1e3
+                / num_msgs
+            )
+            base[f"{prefix}_ctx_switches_per_msg"] = (
+                deltas.get("voluntary_ctx_switches", 0)
+                + deltas.get("involuntary_ctx_switches", 0)
+            ) / num_msgs
+
+    # NOTE: like resource usage, GC instrumentation is recorded by both sides
+    gc_stats = report.get("gc_statistics") or {}
+    if gc_stats:
+        prefix = f"{gc_stats.get('process', 'process')}_gc"
+        base[f"{prefix}_collections"] = sum(gc_stats.get("collections", {}).values())
+        base[f"{prefix}_total_pause_ms"] = gc_stats.get("total_pause_ms", 0.0)
+        base[f"{prefix}_pause_max_ms"] = gc_stats.get(
+            "pause_duration_statistics", {}
+        ).get("max_ms", 0.0)
+        for metric, attribution in gc_stats.get("outlier_attribution", {}).items():
+            for key in (
+                "outliers",
+                "outliers_with_gc",
+                "gc_explained_fraction",
+                "msgs_with_gc_fraction",
+            ):
+                base[f"{prefix}_{metric}_{key}"] = attribution[key]
+
+    # NOTE: subscribers started with --clock-sync report how their latencies were
+    #       corrected and how far off they can still be (see clock_sync.py)
+    clock = report.get("clock_sync") or {}
+    if clock:
+        base["clock_offset_ms"] = clock.get("applied_offset_ms")
+        base["clock_latency_error_bound_ms"] = clock.get("latency_error_bound_ms")
+        base["clock_drift_ppm"] = clock.get("drift_ppm")
+
+    return base
+
+
+def _read_index(index_path: Optional[Path]) -> Dict[str, Any]:
+    if index_path is None or not index_path.exists():
+        return {}
+    try:
+        index = json.loads(index_path.read_text())
+    except json.JSONDecodeError:
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    return index.get("reports", {})
+
+
+def load_reports(
+    input_dir: Path, index_path: Optional[Path] = None, workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Load every YAML report below input_dir (recursively, so sweep output
+    directories can be passed as-is) into one row per report.
+
+    When index_path is given, rows are cached there keyed by report path and
+    only reports whose (mtime, size) changed since the last call are parsed.
+    New reports are parsed across a process pool of `workers` processes
+    (default: one per CPU).
+    """
+    cached = _read_index(index_path)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    stale: List[Path] = []
+    for filepath in sorted(input_dir.rglob("*.yaml")):
+        st = filepath.stat()
+        key = str(filepath.resolve())
+        entry = cached.get(key)
+        if (
+            entry is not None
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and entry["size"] == st.st_size
+        ):
+            entries[key] = entry
+        else:
+            entries[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+            stale.append(filepath)
+
+    if len(stale) >= MIN_REPORTS_FOR_POOL and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(parse_report, stale, chunksize=8))
+    else:
+        rows = [parse_report(filepath) for filepath in stale]
+    for filepath, row in zip(stale, rows):
+        # NOTE: unusable reports are cached too (row=None) so they are not re-parsed
+        entries[str(filepath.resolve())]["row"] = row
+
+    if index_path is not None and (stale or len(entries) != len(cached)):
+        index_path.write_text(
+            json.dumps({"version": INDEX_VERSION, "reports": entries})
+        )
+    print(
+        f"Loaded {len(entries)} reports from {input_dir} "
+        f"({len(stale)} parsed, {len(entries) - len(stale)} from index)"
+    )
+
+    return pd.DataFrame(
+        [entry["row"] for entry in entries.values() if entry["row"] is not None]
+    )
 
 
 def plot_percentiles(df: pd.DataFrame, output_dir: Path, show: bool):
@@ -66,9 +246,15 @@ def plot_percentiles(df: pd.DataFrame, output_dir: Path, show: bool):
         "serialization_duration_statistics": "Serialization Duration (ms)",
         "handle_duration_statistics": "Handle Duration (ms)",
         "decode_duration_statistics": "Decode Duration (ms)",
+        "copy_duration_statistics": "Blob Copy Duration (ms)",
         "oneway_latency_statistics": "One-way Latency (ms)",
+        "corrected_oneway_latency_statistics": "Corrected One-way Latency (ms)",
+        "roundtrip_latency_statistics": "Round-trip Latency (ms)",
+        "transport_latency_statistics": "Transport Latency (ms)",
+        "queueing_duration_statistics": "Queueing Duration (ms)",
+        "middleware_transport_latency_statistics": "Middleware Transport Latency (ms)",
     }
-    percentiles = ["p50", "p90"]
+    percentiles = ["p50", "p90", "p99"]
 
     # discrete x-axis: sorted unique sizes in KiB
     sizes_kib = sorted(df["num_bytes"].unique() / 1024.0)
@@ -95,7 +281,7 @@ def plot_percentiles(df: pd.DataFrame, output_dir: Path, show: bool):
                     vals.append(sub[col].mean() if not sub.empty else 0.0)
 
                 x = [j + i * width for j in range(len(sizes_kib))]
-                plt.bar(x, vals, width=width, label=mw)
+                plt.bar(x, vals, width=width, **_style(df, mw))
 
             centers = [j + width * (n_mw - 1) / 2 for j in range(len(sizes_kib))]
             plt.xticks(centers, [f"{s:.1f}" for s in sizes_kib])
@@ -111,6 +297,88 @@ def plot_percentiles(df: pd.DataFrame, output_dir: Path, show: bool):
             plt.close()
 
 
+def plot_scalar(
+    df: pd.DataFrame, col: str, label: str, output_dir: Path, show: bool
+) -> None:
+    """Bar plot of one (already aggregated) column vs. message size per middleware."""
+    if col not in df or df[col].isna().all():
+        print(f"Did not find {col=}")
+        return
+
+    sizes_kib = sorted(df["num_bytes"].unique() / 1024.0)
+    mw_list = df["middleware"].dropna().unique()
+    width = 0.8 / len(mw_list)
+
+    plt.figure()
+    for i, mw in enumerate(mw_list):
+        vals = []
+        for s in sizes_kib:
+            sub = df[(df["middleware"] == mw) & ((df["num_bytes"] / 1024.0) == s)]
+            vals.append(sub[col].mean() if not sub.empty else 0.0)
+        x = [j + i * width for j in range(len(sizes_kib))]
+        plt.bar(x, vals, width=width, **_style(df, mw))
+
+    centers = [j + width * (len(mw_list) - 1) / 2 for j in range(len(sizes_kib))]
+    plt.xticks(centers, [f"{s:.1f}" for s in sizes_kib])
+    plt.xlabel("Message Size (KiB)")
+    plt.ylabel(label)
+    plt.title(f"{label} vs. Message Size")
+    plt.grid(axis="y", linestyle="--", alpha=0.5)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(output_dir / f"{col}_vs_msg_size.png")
+    if show:
+        plt.show()
+    plt.close()
+
+
+def plot_latency_cdf(df: pd.DataFrame, output_dir: Path, show: bool):
+    """
+    Plot the one-way latency CDF per message size for every run that kept
+    per-message samples. Only the latency column is read from each .npz.
+    """
+    column = "oneway_latencies_ms"
+    runs = df.dropna(subset=["samples_report"])
+    if runs.empty:
+        print("No reports with per-message samples, skipping latency CDF plots")
+        return
+
+    for num_bytes, by_size in runs.groupby("num_bytes"):
+        plotted = False
+        plt.figure()
+        for mw, by_mw in by_size.groupby("middleware"):
+            latencies = []
+            for report_path in by_mw["samples_report"]:
+                report_path = Path(report_path)
+                report = yaml.safe_load(report_path.read_text())
+                samples = open_samples(report_path, report)
+                if samples is None:
+                    continue
+                with samples:
+                    if column in samples.files:
+                        latencies.append(samples[column])
+            if not latencies:
+                continue
+
+            values = np.sort(np.concatenate(latencies))
+            cdf = np.arange(1, len(values) + 1) / len(values)
+            plt.plot(values, cdf, label=_style(df, mw)["label"])
+            plotted = True
+
+        if plotted:
+            plt.xscale("log")
+            plt.xlabel("One-way Latency (ms)")
+            plt.ylabel("Fraction of Messages")
+            plt.title(f"One-way Latency CDF ({num_bytes / 1024.0:.1f} KiB)")
+            plt.grid(linestyle="--", alpha=0.5)
+            plt.legend()
+            plt.tight_layout()
+            plt.savefig(output_dir / f"oneway_latency_cdf_{int(num_bytes)}_bytes.png")
+            if show:
+                plt.show()
+        plt.close()
+
+
 def plot_mean_std(df: pd.DataFrame, output_dir: Path, show: bool):
     metrics_labels = {
         "actual_transmission_rate_statistics": "Publisher Rate (Hz)",
@@ -119,7 +387,13 @@ def plot_mean_std(df: pd.DataFrame, output_dir: Path, show: bool):
         "serialization_duration_statistics": "Serialization Duration (ms)",
         "handle_duration_statistics": "Handle Duration (ms)",
         "decode_duration_statistics": "Decode Duration (ms)",
+        "copy_duration_statistics": "Blob Copy Duration (ms)",
         "oneway_latency_statistics": "One-way Latency (ms)",
+        "corrected_oneway_latency_statistics": "Corrected One-way Latency (ms)",
+        "roundtrip_latency_statistics": "Round-trip Latency (ms)",
+        "transport_latency_statistics": "Transport Latency (ms)",
+        "queueing_duration_statistics": "Queueing Duration (ms)",
+        "middleware_transport_latency_statistics": "Middleware Transport Latency (ms)",
     }
 
     sizes_kib = sorted(df["num_bytes"].unique() / 1024.0)
@@ -149,7 +423,7 @@ def plot_mean_std(df: pd.DataFrame, output_dir: Path, show: bool):
                     stds.append(0.0)
 
             x = [j + i * width for j in range(len(sizes_kib))]
-            plt.bar(x, means, width=width, yerr=stds, capsize=4, label=mw)
+            plt.bar(x, means, width=width, yerr=stds, capsize=4, **_style(df, mw))
 
         centers = [j + width * (n_mw - 1) / 2 for j in range(len(sizes_kib))]
         plt.xticks(centers, [f"{s:.1f}" for s in sizes_kib])
@@ -165,6 +439,83 @@ def plot_mean_std(df: pd.DataFrame, output_dir: Path, show: bool):
         plt.close()
 
 
+def report_gc_outliers(df: pd.DataFrame, output_dir: Path) -> None:
+    """
+    Pool the GC attribution of the p99 outliers over all runs of a middleware
+    and size, print it and write it to gc_outliers.csv.
+    """
+    rows = []
+    for process, metrics in GC_ATTRIBUTED_METRICS.items():
+        for metric in metrics:
+            outliers_col = f"{process}_gc_{metric}_outliers"
+            if outliers_col not in df:
+                continue
+            runs = df.dropna(subset=[outliers_col])
+            for (mw, num_bytes), group in runs.groupby(["middleware", "num_bytes"]):
+                outliers = int(group[outliers_col].sum())
+                with_gc = int(group[f"{process}_gc_{metric}_outliers_with_gc"].sum())
+                rows.append(
+                    {
+                        "middleware": mw,
+                        "num_bytes": num_bytes,
+                        "process": process,
+                        "metric": metric,
+                        "runs": len(group),
+                        "p99_outliers": outliers,
+                        "outliers_with_gc": with_gc,
+                        "gc_explained_fraction": (
+                            with_gc / outliers if outliers else 0.0
+                        ),
+                        # NOTE: what chance alone would explain
+                        "msgs_with_gc_fraction": group[
+                            f"{process}_gc_{metric}_msgs_with_gc_fraction"
+                        ].mean(),
+                    }
+                )
+    if not rows:
+        print("No GC instrumented reports, skipping GC outlier attribution")
+        return
+
+    summary = pd.DataFrame(rows)
+    for row in summary.itertuples():
+        print(
+            f"{row.middleware} {row.num_bytes / 1024.0:.1f} KiB {row.process} {row.metric}: "
+            f"GC overlapped {row.outliers_with_gc}/{row.p99_outliers} p99 outliers "
+            f"({row.gc_explained_fraction:.1%}, vs. {row.msgs_with_gc_fraction:.1%} "
+            "of all messages)"
+        )
+    summary.to_csv(output_dir / "gc_outliers.csv", index=False)
+
+
+def plot_gc(df: pd.DataFrame, output_dir: Path, show: bool) -> None:
+    """GC pause time and the share of p99 outliers GC explains vs. message size."""
+    for process, metrics in GC_ATTRIBUTED_METRICS.items():
+        side = process.capitalize()
+        plot_scalar(
+            df,
+            f"{process}_gc_total_pause_ms",
+            f"{side} Total GC Pause (ms)",
+            output_dir,
+            show,
+        )
+        for metric, label in metrics.items():
+            plot_scalar(
+                df,
+                f"{process}_gc_{metric}_gc_explained_fraction",
+                f"{side} {label} p99 Outliers Overlapping GC",
+                output_dir,
+                show,
+            )
+
+
+def plot_resource_usage(df: pd.DataFrame, output_dir: Path, show: bool) -> None:
+    """Resource usage of the publisher and the subscriber vs. message size."""
+    for process in ("publisher", "subscriber"):
+        for name, label in RESOURCE_USAGE_LABELS.items():
+            col = f"{process}_resource_usage_{name}"
+            plot_scalar(df, col, f"{process.capitalize()} {label}", output_dir, show)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Aggregate LCM/eCAL benchmark reports and plot stats"
@@ -174,16 +525,55 @@ def main():
     parser.add_argument(
         "--show", action="store_true", help="Display plots interactively"
     )
+    parser.add_argument(
+        "--index-file",
+        type=Path,
+        default=None,
+        help="Report summary index used to skip unchanged reports "
+        "(default=<output_dir>/report_index.json)",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Re-parse every report and do not read or write the index",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used to parse new reports (default=one per CPU)",
+    )
     args = parser.parse_args()
 
     args.output_dir.mkdir(parents=True, exist_ok=True)
-    df = load_reports(args.input_dir)
+    index_path = (
+        None
+        if args.no_index
+        else (args.index_file or args.output_dir / "report_index.json")
+    )
+    df = load_reports(args.input_dir, index_path, args.workers)
     if df.empty:
         print(f"No valid reports found in {args.input_dir}")
         return
 
+    # NOTE: runs under different profiles are compared as series of their own
+    if df["profile"].nunique() > 1:
+        suffix = " [" + df["profile"] + "]"
+        df["middleware"] = df["middleware"] + suffix
+        df["middleware_label"] = df["middleware_label"] + suffix
+    df = df.drop(columns=["profile"])
+
+    # per-message latency distributions (lazily loaded from .npz sample files)
+    plot_latency_cdf(df, args.output_dir, show=args.show)
+
+    # GC attribution pooled over runs (counts, so before they are averaged below)
+    report_gc_outliers(df, args.output_dir)
+
     # ─── collapse duplicate runs by middleware & message size ───
-    df = df.groupby(["middleware", "num_bytes"], as_index=False).mean()
+    df = df.drop(columns=["samples_report"])
+    df = df.groupby(
+        ["middleware", "middleware_label", "baseline", "num_bytes"], as_index=False
+    ).mean()
 
     # 1) write out aggregated CSV
     csv_file = args.output_dir / "aggregated.csv"
@@ -194,6 +584,21 @@ def main():
     plot_percentiles(df, args.output_dir, show=args.show)
     # 3) mean ± std
     plot_mean_std(df, args.output_dir, show=args.show)
+    # 4) delivery (loss next to the throughput it was measured at)
+    plot_scalar(
+        df, "delivery_statistics_loss_rate", "Loss Rate", args.output_dir, args.show
+    )
+    plot_scalar(
+        df,
+        "delivery_statistics_delivered_throughput_hz",
+        "Delivered Throughput (Hz)",
+        args.output_dir,
+        args.show,
+    )
+    # 5) CPU, context switches, memory and kernel UDP drops of both sides
+    plot_resource_usage(df, args.output_dir, show=args.show)
+    # 6) GC pauses and the p99 outliers they explain
+    plot_gc(df, args.output_dir, show=args.show)
 
     print(f"All plots saved to {args.output_dir}")
 
@@ -0,0 +1,166 @@
+import math
+from array import array
+from typing import Optional
+
+import numpy as np
+
+# Default recordable magnitude range. It covers 1 ns .. ~11 days when values
+# are in ms and 1 byte .. 1 TB when values are in bytes.
+DEFAULT_LOWEST = 1e-6
+DEFAULT_HIGHEST = 1e12
+# Default bound on the relative error of any reported percentile.
+DEFAULT_RELATIVE_ERROR = 1e-3
+
+
+class LogHistogram:
+    """
+    Streaming, log-bucketed histogram (HdrHistogram-style).
+
+    Memory is fixed by (lowest, highest, relative_error) and independent of
+    the number of recorded values. Every percentile is reported within
+    `relative_error` of a recorded value inside [lowest, highest]. Values
+    outside that magnitude range are clamped into the first/last bucket (the
+    exact min and max are still tracked). Negative values (e.g. one-way
+    latency across unsynchronized clocks) go into a mirrored set of buckets.
+
+    Two histograms created with the same parameters can be merged.
+    """
+
+    def __init__(
+        self,
+        lowest: float = DEFAULT_LOWEST,
+        highest: float = DEFAULT_HIGHEST,
+        relative_error: float = DEFAULT_RELATIVE_ERROR,
+    ):
+        if not (0 < lowest < highest):
+            raise ValueError("must have 0 < lowest < highest")
+        if not (0 < relative_error < 1):
+            raise ValueError("relative_error must be in (0, 1)")
+
+        self.lowest = lowest
+        self.highest = highest
+        self.relative_error = relative_error
+
+        # bucket i covers [lowest * growth**i, lowest * growth**(i + 1)), its
+        # geometric midpoint is within relative_error of anything inside it
+        self._growth = (1 + relative_error) / (1 - relative_error)
+        self._log_lowest = math.log(lowest)
+        self._log_growth = math.log(self._growth)
+        self._num_buckets = (
+            int((math.log(highest) - self._log_lowest) / self._log_growth) + 1
+        )
+
+        self._positive = np.zeros(self._num_buckets, dtype=np.int64)
+        self._negative = np.zeros(self._num_buckets, dtype=np.int64)
+        self._zeros = 0
+
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _index(self, magnitude: float) -> int:
+        if magnitude <= self.lowest:
+            return 0
+        idx = int((math.log(magnitude) - self._log_lowest) / self._log_growth)
+        return min(idx, self._num_buckets - 1)
+
+    def _bucket_value(self, idx: int) -> float:
+        return self.lowest * self._growth ** (idx + 0.5)
+
+    def record(self, value: float) -> None:
+        """Add one value."""
+        if value > 0:
+            self._positive[self._index(value)] += 1
+        elif value < 0:
+            self._negative[self._index(-value)] += 1
+        else:
+            self._zeros += 1
+
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        # Welford's running mean / variance
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def merge(self, other: "LogHistogram") -> None:
+        """Add every value recorded by `other` into this histogram."""
+        if (other.lowest, other.highest, other.relative_error) != (
+            self.lowest,
+            self.highest,
+            self.relative_error,
+        ):
+            raise ValueError("can only merge histograms with identical parameters")
+        if other.count == 0:
+            return
+
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self._mean += delta * other.count / total
+
+        self._positive += other._positive
+        self._negative += other._negative
+        self._zeros += other._zeros
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self) -> float:
+        return self._mean
+
+    def stddev(self) -> float:
+        """Population standard deviation (same as numpy.std)."""
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile, p in [0, 100]."""
+        if self.count == 0:
+            raise ValueError("histogram is empty")
+        if not (0 <= p <= 100):
+            raise ValueError("p must be in [0, 100]")
+
+        rank = max(1, math.ceil(p / 100 * self.count))
+
+        # walk values in ascending order: most negative, ..., zero, ..., largest
+        negative_total = int(self._negative.sum())
+        if rank <= negative_total:
+            cumulative = np.cumsum(self._negative[::-1])
+            idx = self._num_buckets - 1 - int(np.searchsorted(cumulative, rank))
+            value = -self._bucket_value(idx)
+        elif rank <= negative_total + self._zeros:
+            value = 0.0
+        else:
+            seen = negative_total + self._zeros
+            cumulative = np.cumsum(self._positive)
+            idx = int(np.searchsorted(cumulative, rank - seen))
+            value = self._bucket_value(idx)
+
+        return min(max(value, self.min), self.max)
+
+
+class SampleRecorder:
+    """
+    Records one metric into a LogHistogram and, only if asked to, also keeps
+    the raw samples (which grow without bound with the number of messages).
+
+    Raw samples are kept in a packed array of doubles (8 bytes per sample)
+    that numpy can wrap without copying.
+    """
+
+    def __init__(self, keep_samples: bool = False, **histogram_kwargs):
+        self.histogram = LogHistogram(**histogram_kwargs)
+        self.samples: Optional[array] = array("d") if keep_samples else None
+
+    def record(self, value: float) -> None:
+        self.histogram.record(value)
+        if self.samples is not None:
+            self.samples.append(value)
+
+    def __len__(self) -> int:
+        return self.histogram.count
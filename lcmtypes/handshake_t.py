@@ -8,16 +8,45 @@ from io import BytesIO
 import struct
 
 class handshake_t(object):
+    """ readiness handshake and clock probes (see benchmark.py, clock_sync.py) """
 
-    __slots__ = ["pid"]
+    __slots__ = ["pid", "kind", "seq", "t1_ns", "t2_ns", "t3_ns"]
 
-    __typenames__ = ["int32_t"]
+    __typenames__ = ["int32_t", "int8_t", "int32_t", "int64_t", "int64_t", "int64_t"]
 
-    __dimensions__ = [None]
+    __dimensions__ = [None, None, None, None, None, None]
+
+    READY = 0
+    PROBE = 1
+    PROBE_REPLY = 2
+    DONE = 3
 
     def __init__(self):
         self.pid = 0
         """ LCM Type: int32_t """
+        self.kind = 0
+        """
+        one of the constants above
+        LCM Type: int8_t
+        """
+
+        self.seq = 0
+        """
+        PROBE / PROBE_REPLY: sequence number of the probe
+        LCM Type: int32_t
+        """
+
+        self.t1_ns = 0
+        """
+        nanoseconds since UNIX epoch: probe sent (prober's clock), probe received
+        and reply sent (responder's clock)
+        LCM Type: int64_t
+        """
+
+        self.t2_ns = 0
+        """ LCM Type: int64_t """
+        self.t3_ns = 0
+        """ LCM Type: int64_t """
 
     def encode(self):
         buf = BytesIO()
@@ -26,7 +55,7 @@ class handshake_t(object):
         return buf.getvalue()
 
     def _encode_one(self, buf):
-        buf.write(struct.pack(">i", self.pid))
+        buf.write(struct.pack(">ibiqqq", self.pid, self.kind, self.seq, self.t1_ns, self.t2_ns, self.t3_ns))
 
     @staticmethod
     def decode(data: bytes):
@@ -41,13 +70,13 @@ class handshake_t(object):
     @staticmethod
     def _decode_one(buf):
         self = handshake_t()
-        self.pid = struct.unpack(">i", buf.read(4))[0]
+        self.pid, self.kind, self.seq, self.t1_ns, self.t2_ns, self.t3_ns = struct.unpack(">ibiqqq", buf.read(33))
         return self
 
     @staticmethod
     def _get_hash_recursive(parents):
         if handshake_t in parents: return 0
-        tmphash = (0xd21b643a13323c57) & 0xffffffffffffffff
+        tmphash = (0xff903a6736f45f9d) & 0xffffffffffffffff
         tmphash  = (((tmphash<<1)&0xffffffffffffffff) + (tmphash>>63)) & 0xffffffffffffffff
         return tmphash
     _packed_fingerprint = None
@@ -0,0 +1,92 @@
+"""LCM type definitions
+This file automatically generated by lcm.
+DO NOT MODIFY BY HAND!!!!
+"""
+
+
+from io import BytesIO
+import struct
+
+class phase_t(object):
+    """ session control message (see session.py) """
+
+    __slots__ = ["kind", "index", "num_bytes", "transmission_rate_hz", "num_msgs"]
+
+    __typenames__ = ["int8_t", "int32_t", "int32_t", "double", "int64_t"]
+
+    __dimensions__ = [None, None, None, None, None]
+
+    START = 1
+    STARTED = 2
+    END = 3
+    ENDED = 4
+    FINISH = 5
+    FINISHED = 6
+
+    def __init__(self):
+        self.kind = 0
+        """
+        one of the constants above
+        LCM Type: int8_t
+        """
+
+        self.index = 0
+        """
+        0-based index of the phase within its session
+        LCM Type: int32_t
+        """
+
+        self.num_bytes = 0
+        """ LCM Type: int32_t """
+        self.transmission_rate_hz = 0.0
+        """ LCM Type: double """
+        self.num_msgs = 0
+        """
+        messages in the phase (END: messages actually sent)
+        LCM Type: int64_t
+        """
+
+
+    def encode(self):
+        buf = BytesIO()
+        buf.write(phase_t._get_packed_fingerprint())
+        self._encode_one(buf)
+        return buf.getvalue()
+
+    def _encode_one(self, buf):
+        buf.write(struct.pack(">biidq", self.kind, self.index, self.num_bytes, self.transmission_rate_hz, self.num_msgs))
+
+    @staticmethod
+    def decode(data: bytes):
+        if hasattr(data, 'read'):
+            buf = data
+        else:
+            buf = BytesIO(data)
+        if buf.read(8) != phase_t._get_packed_fingerprint():
+            raise ValueError("Decode error")
+        return phase_t._decode_one(buf)
+
+    @staticmethod
+    def _decode_one(buf):
+        self = phase_t()
+        self.kind, self.index, self.num_bytes, self.transmission_rate_hz, self.num_msgs = struct.unpack(">biidq", buf.read(25))
+        return self
+
+    @staticmethod
+    def _get_hash_recursive(parents):
+        if phase_t in parents: return 0
+        tmphash = (0xe181705f6f127287) & 0xffffffffffffffff
+        tmphash  = (((tmphash<<1)&0xffffffffffffffff) + (tmphash>>63)) & 0xffffffffffffffff
+        return tmphash
+    _packed_fingerprint = None
+
+    @staticmethod
+    def _get_packed_fingerprint():
+        if phase_t._packed_fingerprint is None:
+            phase_t._packed_fingerprint = struct.pack(">Q", phase_t._get_hash_recursive([]))
+        return phase_t._packed_fingerprint
+
+    def get_hash(self):
+        """Get the LCM hash of the struct"""
+        return struct.unpack(">Q", phase_t._get_packed_fingerprint())[0]
+
@@ -0,0 +1,287 @@
+"""
+Live metrics of a running benchmark process, so that long runs can be
+watched (and bad ones aborted) before their reports are written.
+
+Every interval_s a background thread publishes the rolling window of the
+last window_s: the side's message throughput and p50 / p99 / max of every
+recorded quantity (e.g. publish duration, one-way latency). Each update is
+
+  - appended to a JSONL stream (one object per line, flushed right away, so
+    it survives a crash of the run),
+  - written as a Prometheus text-format file (atomically replaced, e.g. for
+    node_exporter's textfile collector),
+  - and optionally served on http://127.0.0.1:<port>/metrics.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from array import array
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import perf_counter, time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "pub_sub_benchmark"
+# reported quantiles of every recorded quantity, by their name in the JSONL stream
+QUANTILES = {"p50": 0.5, "p99": 0.99}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LiveMetrics:
+    """
+    Rolling-window metrics of one process: record() every measured value of
+    every message, the background thread started by start() publishes them
+    until close(). Throughput counts the values recorded for `rate_metric`.
+    """
+
+    def __init__(
+        self,
+        process: str,
+        rate_metric: str,
+        interval_s: float,
+        window_s: Optional[float] = None,
+        jsonl_path: Optional[Path] = None,
+        prometheus_path: Optional[Path] = None,
+        port: int = 0,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        """
+        :param process:         which side of the benchmark this is (publisher / subscriber)
+        :param rate_metric:     the recorded quantity whose count is the side's messages
+        :param interval_s:      time between two updates
+        :param window_s:        length of the rolling window (default: interval_s)
+        :param jsonl_path:      JSONL stream every update is appended to
+        :param prometheus_path: Prometheus text file every update replaces
+        :param port:            serve the Prometheus text on this local port (0: don't)
+        :param labels:          extra labels of every metric (e.g. middleware, channel)
+        """
+        window_s = interval_s if window_s is None else window_s
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        if window_s < interval_s:
+            raise ValueError("window_s must be >= interval_s")
+        self.process = process
+        self.rate_metric = rate_metric
+        self.interval_s = interval_s
+        self.window_s = window_s
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.port = port
+        self.labels = {"process": process, **(labels or {})}
+        self.phase: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._current: Dict[str, array] = {}
+        # NOTE: the window is made of the last few intervals' values, each kept
+        #       together with how long its interval actually took
+        self._intervals: Deque[Tuple[float, Dict[str, array]]] = deque(
+            maxlen=math.ceil(window_s / interval_s)
+        )
+        self._interval_start_s = perf_counter()
+        self._totals: Dict[str, int] = {}
+        self._text = ""
+        self._jsonl = None
+
+    def record(self, name: str, value: float) -> None:
+        with self._lock:
+            values = self._current.get(name)
+            if values is None:
+                values = self._current[name] = array("d")
+            values.append(value)
+
+    def set_phase(self, index: int) -> None:
+        """Label the following updates with a session phase."""
+        self.phase = index
+
+    def start(self) -> None:
+        if self.jsonl_path is not None:
+            self._jsonl = open(self.jsonl_path, "a")
+        if self.port:
+            self._serve()
+        self._interval_start_s = perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="live-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Publish what the last interval recorded and stop."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.publish()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._jsonl is not None:
+            self._jsonl.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.publish()
+
+    def _serve(self) -> None:
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics._text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            # NOTE: e.g. several subscribers of a fan-out run on one host
+            logger.warning(f"Not serving live metrics on port {self.port}: {e}")
+            return
+        threading.Thread(
+            target=self._server.serve_forever, name="live-metrics-http", daemon=True
+        ).start()
+        logger.info(f"Serving live metrics on http://127.0.0.1:{self.port}/metrics")
+
+    def publish(self) -> Dict[str, Any]:
+        """Close the current interval and publish the window ending with it."""
+        with self._lock:
+            current, self._current = self._current, {}
+            now_s = perf_counter()
+            duration_s = now_s - self._interval_start_s
+            self._interval_start_s = now_s
+        self._intervals.append((duration_s, current))
+        for name, values in current.items():
+            self._totals[name] = self._totals.get(name, 0) + len(values)
+
+        window_s = sum(duration for duration, _ in self._intervals)
+        metrics: Dict[str, Dict[str, float]] = {}
+        for name in sorted(self._totals):
+            parts = [
+                np.frombuffer(values[name], dtype=np.float64)
+                for _, values in self._intervals
+                if name in values and len(values[name])
+            ]
+            if not parts:
+                continue
+            window = np.concatenate(parts)
+            quantiles = np.percentile(window, [q * 100 for q in QUANTILES.values()])
+            metrics[name] = {
+                "count": len(window),
+                **{key: float(v) for key, v in zip(QUANTILES, quantiles)},
+                "max": float(window.max()),
+            }
+        msgs = metrics.get(self.rate_metric, {}).get("count", 0)
+        update: Dict[str, Any] = {
+            "time_unix_s": time(),
+            **self.labels,
+            "phase": self.phase,
+            "window_s": window_s,
+            "msgs": msgs,
+            "msgs_total": self._totals.get(self.rate_metric, 0),
+            "throughput_hz": msgs / window_s if window_s > 0 else 0.0,
+            "metrics": metrics,
+        }
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(update) + "\n")
+            self._jsonl.flush()
+        self._text = self.render(update)
+        if self.prometheus_path is not None:
+            # NOTE: replaced atomically, a scraper never reads a half written file
+            tmp = self.prometheus_path.with_name(self.prometheus_path.name + ".tmp")
+            tmp.write_text(self._text)
+            os.replace(tmp, self.prometheus_path)
+        return update
+
+    def render(self, update: Dict[str, Any]) -> str:
+        """One update in the Prometheus text exposition format."""
+        labels = dict(self.labels)
+        if update["phase"] is not None:
+            labels["phase"] = str(update["phase"])
+        base = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        lines: List[str] = [
+            f"# HELP {METRIC_PREFIX}_msgs_total Messages sent (publisher) or "
+            "received (subscriber) so far",
+            f"# TYPE {METRIC_PREFIX}_msgs_total counter",
+            f"{METRIC_PREFIX}_msgs_total{{{base}}} {update['msgs_total']}",
+            f"# HELP {METRIC_PREFIX}_throughput_hz Messages per second over the "
+            "rolling window",
+            f"# TYPE {METRIC_PREFIX}_throughput_hz gauge",
+            f"{METRIC_PREFIX}_throughput_hz{{{base}}} {update['throughput_hz']}",
+            f"# HELP {METRIC_PREFIX}_window_seconds Length of the rolling window",
+            f"# TYPE {METRIC_PREFIX}_window_seconds gauge",
+            f"{METRIC_PREFIX}_window_seconds{{{base}}} {update['window_s']}",
+            f"# HELP {METRIC_PREFIX}_updated_unix_seconds Time of this update",
+            f"# TYPE {METRIC_PREFIX}_updated_unix_seconds gauge",
+            f"{METRIC_PREFIX}_updated_unix_seconds{{{base}}} {update['time_unix_s']}",
+            f"# HELP {METRIC_PREFIX}_window_quantile Quantiles of every measured "
+            "quantity over the rolling window (its unit ends the metric label)",
+            f"# TYPE {METRIC_PREFIX}_window_quantile gauge",
+        ]
+        for name, stats in update["metrics"].items():
+            for key, q in QUANTILES.items():
+                lines.append(
+                    f'{METRIC_PREFIX}_window_quantile{{{base},metric="{_escape(name)}",'
+                    f'quantile="{q}"}} {stats[key]}'
+                )
+        lines += [
+            f"# HELP {METRIC_PREFIX}_window_count Values of every measured quantity "
+            "in the rolling window",
+            f"# TYPE {METRIC_PREFIX}_window_count gauge",
+        ]
+        for name, stats in update["metrics"].items():
+            lines.append(
+                f'{METRIC_PREFIX}_window_count{{{base},metric="{_escape(name)}"}} '
+                f"{stats['count']}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def create_live_metrics(
+    process: str,
+    rate_metric: str,
+    interval_s: float,
+    window_s: Optional[float],
+    port: int,
+    results_dir: Path,
+    labels: Dict[str, str],
+) -> Optional[LiveMetrics]:
+    """
+    Started live metrics writing <middleware>_<process>_live_metrics.jsonl
+    and .prom into results_dir, or None if interval_s <= 0.
+    """
+    if interval_s <= 0:
+        return None
+    stem = f"{labels.get('middleware', 'benchmark')}_{process}_live_metrics"
+    metrics = LiveMetrics(
+        process,
+        rate_metric,
+        interval_s,
+        window_s,
+        jsonl_path=results_dir / f"{stem}.jsonl",
+        prometheus_path=results_dir / f"{stem}.prom",
+        port=port,
+        labels=labels,
+    )
+    metrics.start()
+    logger.info(f"Writing live metrics to {metrics.jsonl_path}")
+    return metrics
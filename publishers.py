@@ -0,0 +1,191 @@
+import logging
+import sys
+from queue import Empty as QueueEmpty
+from queue import Full as QueueFull
+from queue import Queue
+from time import perf_counter, perf_counter_ns, sleep
+from typing import Optional, Tuple
+
+import ecal.core.core as ecal_core
+# NOTE: see relevant note about ProtoPublisher in eCALPublisher below
+# from ecal.core.publisher import ProtoPublisher
+from lcm import LCM
+
+from benchmark import LCM_CODEC, PROTO_CODEC, Codec, Readiness, eCALMonitor
+from raw_transport import (REPLY_ENDPOINT, RawReceiver, open_receiver,
+                           open_sender)
+
+logger = logging.getLogger(__name__)
+
+
+class BasePublisher:
+    # how the messages this publisher sends are encoded
+    codec: Codec
+
+    def send(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def wait_reply(self, timeout_s: float) -> Optional[Tuple[bytes, int]]:
+        """
+        Round-trip mode only: block until the next echoed message arrives, or at
+        most timeout_s seconds.
+        Returns (data, arrival perf_counter_ns() taken in the callback), or None
+        on timeout.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def msg_type(self) -> type:
+        return self.codec.msg_type
+
+
+class LcmPublisher(BasePublisher):
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        reply_channel: Optional[str] = None,
+        handshake: Optional[Readiness] = None,
+        num_subscribers: int = 1,
+        codec: Codec = LCM_CODEC,
+    ):
+        self.codec = codec
+        self._conn = LCM(provider=url)
+        self._channel = channel
+        self._reply: Optional[Tuple[bytes, int]] = None
+        if reply_channel is not None:
+            # NOTE: subscribed before the handshake so that no echo can be missed
+            self._conn.subscribe(reply_channel, self._on_reply)
+
+        # NOTE: no handshake when the caller waits for the subscribers itself
+        #       (workload topics share one)
+        if handshake is not None:
+            logger.info(f"Waiting for {num_subscribers} subscriber(s) on {channel}...")
+            handshake.wait_for_subscribers(num_subscribers)
+
+    def _on_reply(self, _: str, data: bytes) -> None:
+        self._reply = (data, perf_counter_ns())
+
+    def send(self, data: bytes) -> None:
+        self._conn.publish(self._channel, data)
+
+    def wait_reply(self, timeout_s: float) -> Optional[Tuple[bytes, int]]:
+        self._reply = None
+        deadline_s = perf_counter() + timeout_s
+        # NOTE: handle_timeout() can return without having dispatched to _on_reply
+        while self._reply is None:
+            remaining_ms = int((deadline_s - perf_counter()) * 1e3)
+            if remaining_ms <= 0 or self._conn.handle_timeout(remaining_ms) <= 0:
+                return None
+        return self._reply
+
+
+class eCALPublisher(BasePublisher):
+    def __init__(
+        self,
+        topic: str,
+        reply_topic: Optional[str] = None,
+        handshake: Optional[Readiness] = None,
+        num_subscribers: int = 1,
+        codec: Codec = PROTO_CODEC,
+    ):
+        self.codec = codec
+        ecal_core.initialize(sys.argv, f"benchmark_publisher_{topic}")
+        topic_type = "proto:" + codec.msg_type.DESCRIPTOR.full_name
+        # NOTE: We purposefully do not use ProtoPublisher so that we can
+        #       measure the decode time directly by doing it ourselves
+        # self._pub = ProtoPublisher(topic, Bench)
+        self._pub = ecal_core.publisher(topic, topic_type)
+        self._replies: Queue = Queue(maxsize=100)
+        if reply_topic is not None:
+            self._reply_sub = ecal_core.subscriber(reply_topic, topic_type)
+            self._reply_sub.set_callback(self._on_reply)
+        if handshake is None:
+            return
+        logger.info(
+            f"Waiting for {num_subscribers} subscriber(s) to register to topic {topic}..."
+        )
+
+        handshake.wait_for_subscribers(num_subscribers)
+        # NOTE: in round-trip mode also wait for the echo responder's publisher
+        with eCALMonitor() as monitor:
+            while reply_topic is not None and not monitor.has_publisher(reply_topic):
+                sleep(0.01)
+        logger.info(
+            f"Found {num_subscribers} subscriber(s) for {topic}. Continuing on to rest of process path"
+        )
+
+    def _on_reply(self, topic: str, msg: bytes, timestamp: float) -> None:
+        arrival_ns = perf_counter_ns()
+        try:
+            self._replies.put_nowait((msg, arrival_ns))
+        except QueueFull:
+            logger.error("reply queue is full")
+
+    def send(self, data: bytes) -> None:
+        self._pub.send(data)
+
+    def wait_reply(self, timeout_s: float) -> Optional[Tuple[bytes, int]]:
+        try:
+            return self._replies.get(block=True, timeout=timeout_s)
+        except QueueEmpty:
+            return None
+
+    def close(self) -> None:
+        ecal_core.finalize()
+
+
+class RawPublisher(BasePublisher):
+    """
+    Baseline publisher that writes the encoded messages straight to a raw
+    transport (see raw_transport.py) instead of going through a middleware.
+    """
+
+    def __init__(
+        self,
+        transport: str,
+        url: str,
+        channel: str,
+        reply_channel: Optional[str] = None,
+        handshake: Optional[Readiness] = None,
+        num_subscribers: int = 1,
+        codec: Codec = LCM_CODEC,
+    ):
+        self.codec = codec
+        self._reply: Optional[RawReceiver] = None
+        if reply_channel is not None:
+            # NOTE: set up before the handshake so that no echo can be missed
+            self._reply = open_receiver(
+                transport, url, channel, REPLY_ENDPOINT, reply=True
+            )
+
+        # NOTE: raw transports have no discovery of their own; the handshake
+        #       tells us which subscriber processes (pids) to send to
+        if handshake is None:
+            raise ValueError(
+                "raw transports need a handshake to find their subscribers"
+            )
+        logger.info(f"Waiting for {num_subscribers} subscriber(s) on {channel}...")
+        handshake.wait_for_subscribers(num_subscribers)
+        self._sender = open_sender(
+            transport, url, channel, handshake.subscriber_ids()[:num_subscribers]
+        )
+
+    def send(self, data: bytes) -> None:
+        self._sender.send(data)
+
+    def wait_reply(self, timeout_s: float) -> Optional[Tuple[bytes, int]]:
+        data = self._reply.receive(timeout_s)
+        if data is None:
+            return None
+        return data, perf_counter_ns()
+
+    def close(self) -> None:
+        full_rings = getattr(self._sender, "full_rings", 0)
+        if full_rings:
+            logger.warning(f"Dropped {full_rings} msgs on full shm rings")
+        self._sender.close()
+        if self._reply is not None:
+            self._reply.close()
@@ -0,0 +1,468 @@
+import os
+import socket
+import struct
+import tempfile
+import zlib
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter, sleep
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Baseline transports without any middleware on top. They carry the same
+# encoded bench_t bytes as LCM, so the difference to the middleware numbers is
+# what the middleware itself costs.
+#
+#   - "udp":         UDP multicast on the host (group and ttl of --lcm-url)
+#   - "unix_dgram":  AF_UNIX datagram socket per subscriber
+#   - "unix_stream": AF_UNIX stream socket per subscriber, length-prefixed frames
+#   - "shm":         multiprocessing.shared_memory ring buffer per subscriber
+RAW_TRANSPORTS = ("udp", "unix_dgram", "unix_stream", "shm")
+
+# raw UDP uses the port of --lcm-url plus these offsets, so it never shares a
+# port with LCM itself (and parallel sweep slots, which shift the LCM port by
+# one each, stay apart)
+UDP_PORT_OFFSET = 100
+UDP_REPLY_PORT_OFFSET = 200
+# requested receive buffer; the kernel caps it at net.core.rmem_max
+SOCKET_BUFFER_BYTES = 8 * 1024 * 1024
+
+# datagrams carry (message id, fragment index, fragment count) in front of at
+# most FRAGMENT_BYTES of the message, which keeps every UDP datagram under the
+# 64 KiB IP limit (LCM fragments the same way)
+FRAGMENT_HEADER = struct.Struct("<IHH")
+FRAGMENT_BYTES = 65000
+# stream frames are prefixed with their length
+FRAME_HEADER = struct.Struct("<I")
+
+DEFAULT_SHM_RING_BYTES = 16 * 1024 * 1024
+# shared memory has no wakeup: the reader spins (yielding) this long after the
+# last message, then polls every SHM_POLL_INTERVAL_S (the floor of its latency)
+SHM_SPIN_S = 0.001
+SHM_POLL_INTERVAL_S = 50e-6
+
+# endpoint of the echo responder; round trips have exactly one subscriber
+REPLY_ENDPOINT = 0
+
+
+def _endpoint_name(channel: str, endpoint: int, reply: bool) -> str:
+    name = "pub_sub_benchmark" + channel.replace("/", "_")
+    return f"{name}{'_echo' if reply else ''}_{endpoint}"
+
+
+def unix_socket_path(channel: str, endpoint: int, reply: bool = False) -> str:
+    """Filesystem address of the AF_UNIX socket one receiver binds."""
+    return os.path.join(
+        tempfile.gettempdir(), _endpoint_name(channel, endpoint, reply) + ".sock"
+    )
+
+
+def shm_name(channel: str, endpoint: int, reply: bool = False) -> str:
+    """Name of the shared memory ring one receiver creates."""
+    return _endpoint_name(channel, endpoint, reply)
+
+
+def udp_address(lcm_url: str, reply: bool = False) -> Tuple[str, int, int]:
+    """(multicast group, port, ttl) of raw UDP, derived from an LCM udpm:// URL."""
+    url = urlsplit(lcm_url)
+    if url.scheme != "udpm" or url.hostname is None or url.port is None:
+        raise ValueError(f"raw udp needs a udpm://group:port lcm url, got {lcm_url!r}")
+    ttl = int(parse_qs(url.query).get("ttl", ["0"])[0])
+    offset = UDP_REPLY_PORT_OFFSET if reply else UDP_PORT_OFFSET
+    return url.hostname, url.port + offset, ttl
+
+
+class RawSender:
+    def send(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class RawReceiver:
+    # messages that were discarded before they reached receive()
+    dropped_msgs: int = 0
+
+    def receive(self, timeout_s: Optional[float] = None) -> Optional[bytes]:
+        """
+        Block until the next whole message arrives, or at most timeout_s seconds
+        (None = forever). Returns the message bytes, or None on timeout.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class _DatagramSender(RawSender):
+    def __init__(self, sock: socket.socket, addresses: List[object]):
+        self._sock = sock
+        self._addresses = addresses
+        self._msg_id = 0
+
+    def send(self, data: bytes) -> None:
+        view = memoryview(data)
+        num_fragments = max(1, -(-len(view) // FRAGMENT_BYTES))
+        self._msg_id = (self._msg_id + 1) & 0xFFFFFFFF
+        for index in range(num_fragments):
+            fragment = view[index * FRAGMENT_BYTES : (index + 1) * FRAGMENT_BYTES]
+            header = FRAGMENT_HEADER.pack(self._msg_id, index, num_fragments)
+            # NOTE: unicast fan-out costs one send per subscriber, like any
+            #       transport without multicast
+            for address in self._addresses:
+                self._sock.sendmsg([header, fragment], [], 0, address)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class _DatagramReceiver(RawReceiver):
+    def __init__(self, sock: socket.socket, path: Optional[str] = None):
+        self._sock = sock
+        self._path = path
+        self._buffer = bytearray(FRAGMENT_HEADER.size + FRAGMENT_BYTES)
+        # fragments of the message being reassembled
+        self._msg_id: Optional[int] = None
+        self._fragments: List[bytes] = []
+        self._broken = False
+
+    def receive(self, timeout_s: Optional[float] = None) -> Optional[bytes]:
+        deadline = None if timeout_s is None else perf_counter() + timeout_s
+        while True:
+            if deadline is not None:
+                remaining_s = deadline - perf_counter()
+                if remaining_s <= 0:
+                    return None
+                self._sock.settimeout(remaining_s)
+            else:
+                self._sock.settimeout(None)
+            try:
+                size = self._sock.recv_into(self._buffer)
+            except socket.timeout:
+                return None
+            msg_id, index, num_fragments = FRAGMENT_HEADER.unpack_from(self._buffer)
+            fragment = bytes(self._buffer[FRAGMENT_HEADER.size : size])
+            if num_fragments == 1:
+                if self._fragments:
+                    # NOTE: the message being reassembled lost a fragment
+                    self.dropped_msgs += 1
+                    self._fragments = []
+                    self._msg_id = None
+                return fragment
+
+            if msg_id != self._msg_id:
+                # NOTE: a new message before the last one completed means a fragment
+                #       of it was lost, so the whole message is
+                if self._fragments:
+                    self.dropped_msgs += 1
+                self._msg_id = msg_id
+                self._fragments = []
+                self._broken = False
+            if self._broken:
+                continue
+            if index != len(self._fragments):
+                # lost or reordered fragment: skip the rest of this message
+                self.dropped_msgs += 1
+                self._broken = True
+                self._fragments = []
+                continue
+            self._fragments.append(fragment)
+            if len(self._fragments) == num_fragments:
+                data = b"".join(self._fragments)
+                self._fragments = []
+                return data
+
+    def close(self) -> None:
+        self._sock.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+class _StreamSender(RawSender):
+    def __init__(self, paths: List[str]):
+        self._socks = []
+        for path in paths:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            self._socks.append(sock)
+
+    def send(self, data: bytes) -> None:
+        header = FRAME_HEADER.pack(len(data))
+        for sock in self._socks:
+            # NOTE: sendmsg may write only part of a large frame
+            sent = sock.sendmsg([header, data])
+            if sent < len(header) + len(data):
+                sock.sendall(memoryview(header + data)[sent:])
+
+    def close(self) -> None:
+        for sock in self._socks:
+            sock.close()
+
+
+class _StreamReceiver(RawReceiver):
+    def __init__(self, path: str):
+        self._path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen(1)
+        self._conn: Optional[socket.socket] = None
+        self._pending = bytearray()
+
+    def _fill(self, size: int, deadline: Optional[float]) -> bool:
+        """Read until at least `size` bytes are pending; False on timeout."""
+        while len(self._pending) < size:
+            if deadline is not None:
+                remaining_s = deadline - perf_counter()
+                if remaining_s <= 0:
+                    return False
+                self._conn.settimeout(remaining_s)
+            else:
+                self._conn.settimeout(None)
+            try:
+                chunk = self._conn.recv(max(size - len(self._pending), 1 << 16))
+            except socket.timeout:
+                return False
+            if not chunk:
+                raise ConnectionError("raw stream sender disconnected")
+            self._pending += chunk
+        return True
+
+    def receive(self, timeout_s: Optional[float] = None) -> Optional[bytes]:
+        deadline = None if timeout_s is None else perf_counter() + timeout_s
+        if self._conn is None:
+            # NOTE: the sender connects once it has seen our handshake
+            self._listener.settimeout(timeout_s)
+            try:
+                self._conn, _ = self._listener.accept()
+            except socket.timeout:
+                return None
+            self._conn.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES
+            )
+        # NOTE: a frame that timed out halfway stays in _pending for the next call
+        if not self._fill(FRAME_HEADER.size, deadline):
+            return None
+        (size,) = FRAME_HEADER.unpack_from(self._pending)
+        end = FRAME_HEADER.size + size
+        if not self._fill(end, deadline):
+            return None
+        data = bytes(self._pending[FRAME_HEADER.size : end])
+        del self._pending[:end]
+        return data
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._listener.close()
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+class ShmRing:
+    """
+    Single-producer single-consumer byte ring in a named shared memory block.
+
+    The block starts with the total bytes ever written and ever read (u64 each,
+    on separate cache lines so the two processes do not share one), followed
+    by `capacity` bytes of ring holding framed messages that wrap around its
+    end. The receiver creates the ring, the sender attaches to it.
+
+    Python has no memory barriers, so on weakly ordered CPUs (arm64) the reader
+    may see the new write position before the frame behind it. Every frame
+    therefore validates itself: its header holds the frame's own position, the
+    message length and a CRC-32 of the message, and pop() treats a frame that
+    does not check out as not yet written and retries it on the next call.
+    """
+
+    HEADER_BYTES = 128
+    _WRITE_OFFSET = 0
+    _READ_OFFSET = 64
+    # NOTE: native format, so that a position is written with one aligned 8 byte
+    #       store; the standard "<Q" packer writes byte by byte and the reader
+    #       could see a torn position
+    _POSITION = struct.Struct("Q")
+    # frame header: (position of the frame, message length, crc32 of the message)
+    _FRAME = struct.Struct("<QII")
+
+    def __init__(self, name: str, capacity: Optional[int] = None):
+        if capacity is not None:
+            self._shm = SharedMemory(
+                name, create=True, size=self.HEADER_BYTES + capacity
+            )
+            self._shm.buf[: self.HEADER_BYTES] = bytes(self.HEADER_BYTES)
+            self._owner = True
+        else:
+            self._shm = SharedMemory(name)
+            # NOTE: the resource tracker would unlink the receiver's block when
+            #       this process exits (python < 3.13 has no track=False)
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+            self._owner = False
+        self._buf = self._shm.buf
+        self._ring = self._buf[self.HEADER_BYTES :]
+        self.capacity = len(self._ring)
+
+    def _position(self, offset: int) -> int:
+        return self._POSITION.unpack_from(self._buf, offset)[0]
+
+    def _copy_in(self, position: int, data: memoryview) -> None:
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._ring[start : start + first] = data[:first]
+        self._ring[: len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, size: int) -> bytes:
+        start = position % self.capacity
+        first = min(size, self.capacity - start)
+        if first == size:
+            return bytes(self._ring[start : start + size])
+        return bytes(self._ring[start:]) + bytes(self._ring[: size - first])
+
+    def push(self, data: bytes) -> bool:
+        """Append one message; False (and nothing written) if the ring is full."""
+        size = self._FRAME.size + len(data)
+        if size > self.capacity:
+            raise ValueError(f"{len(data)} byte message does not fit the shm ring")
+        write = self._position(self._WRITE_OFFSET)
+        if self.capacity - (write - self._position(self._READ_OFFSET)) < size:
+            return False
+        header = self._FRAME.pack(write, len(data), zlib.crc32(data))
+        self._copy_in(write, memoryview(header))
+        self._copy_in(write + self._FRAME.size, memoryview(data))
+        # NOTE: published last; should the reader still see this position before
+        #       the frame (no store ordering on arm64), the frame fails its check
+        self._POSITION.pack_into(self._buf, self._WRITE_OFFSET, write + size)
+        return True
+
+    def pop(self) -> Optional[bytes]:
+        """Take the oldest message, or None if the ring is empty."""
+        read = self._position(self._READ_OFFSET)
+        available = self._position(self._WRITE_OFFSET) - read
+        if available == 0:
+            return None
+        position, size, crc = self._FRAME.unpack(self._copy_out(read, self._FRAME.size))
+        if position != read or size > available - self._FRAME.size:
+            # NOTE: header not written yet (or a stale one of an earlier lap)
+            return None
+        data = self._copy_out(read + self._FRAME.size, size)
+        if zlib.crc32(data) != crc:
+            # NOTE: message bytes not all visible yet, the next pop() retries
+            return None
+        self._POSITION.pack_into(
+            self._buf, self._READ_OFFSET, read + self._FRAME.size + size
+        )
+        return data
+
+    def close(self) -> None:
+        self._ring.release()
+        self._buf = self._ring = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _ShmSender(RawSender):
+    def __init__(self, names: List[str]):
+        self._rings = [ShmRing(name) for name in names]
+        # messages that did not fit into a subscriber's ring
+        self.full_rings = 0
+
+    def send(self, data: bytes) -> None:
+        for ring in self._rings:
+            if not ring.push(data):
+                # NOTE: dropped like a datagram the receiver had no buffer for
+                self.full_rings += 1
+
+    def close(self) -> None:
+        for ring in self._rings:
+            ring.close()
+
+
+class _ShmReceiver(RawReceiver):
+    def __init__(self, name: str, capacity: int = DEFAULT_SHM_RING_BYTES):
+        try:
+            self._ring = ShmRing(name, capacity)
+        except FileExistsError:
+            # left over from a process that was killed, nobody else uses our name
+            stale = SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._ring = ShmRing(name, capacity)
+
+    def receive(self, timeout_s: Optional[float] = None) -> Optional[bytes]:
+        start = perf_counter()
+        while True:
+            data = self._ring.pop()
+            if data is not None:
+                return data
+            waited_s = perf_counter() - start
+            if timeout_s is not None and waited_s >= timeout_s:
+                return None
+            # NOTE: sleep(0) yields the core while spinning, so a writer sharing it
+            #       is not starved
+            sleep(SHM_POLL_INTERVAL_S if waited_s > SHM_SPIN_S else 0)
+
+    def close(self) -> None:
+        self._ring.close()
+
+
+def open_receiver(
+    transport: str, lcm_url: str, channel: str, endpoint: int, reply: bool = False
+) -> RawReceiver:
+    """
+    Set up the receiving end of `channel` for this process (endpoint = its pid,
+    or REPLY_ENDPOINT for the echo channel). Must exist before the sender opens.
+    """
+    if transport == "udp":
+        group, port, _ = udp_address(lcm_url, reply)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        # NOTE: every subscriber of a fan-out run binds the same port
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES)
+        sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(group), bytes(4))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        return _DatagramReceiver(sock)
+    elif transport == "unix_dgram":
+        path = unix_socket_path(channel, endpoint, reply)
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES)
+        sock.bind(path)
+        return _DatagramReceiver(sock, path)
+    elif transport == "unix_stream":
+        return _StreamReceiver(unix_socket_path(channel, endpoint, reply))
+    elif transport == "shm":
+        return _ShmReceiver(shm_name(channel, endpoint, reply))
+    raise ValueError(f"{transport} is not a raw transport")
+
+
+def open_sender(
+    transport: str,
+    lcm_url: str,
+    channel: str,
+    endpoints: List[int],
+    reply: bool = False,
+) -> RawSender:
+    """Set up the sending end of `channel` towards the receivers of `endpoints`."""
+    if transport == "udp":
+        group, port, ttl = udp_address(lcm_url, reply)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_BYTES)
+        return _DatagramSender(sock, [(group, port)])
+    elif transport == "unix_dgram":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_BYTES)
+        return _DatagramSender(
+            sock, [unix_socket_path(channel, e, reply) for e in endpoints]
+        )
+    elif transport == "unix_stream":
+        return _StreamSender([unix_socket_path(channel, e, reply) for e in endpoints])
+    elif transport == "shm":
+        return _ShmSender([shm_name(channel, e, reply) for e in endpoints])
+    raise ValueError(f"{transport} is not a raw transport")
@@ -0,0 +1,263 @@
+"""
+Background sampling of a benchmark process's resource usage from /proc.
+
+While a run is recorded, a daemon thread samples every interval_s:
+
+  - CPU time (user, system) of the process, from /proc/self/stat,
+  - voluntary and involuntary context switches summed over its threads, from
+    /proc/self/task/*/status,
+  - resident set size, from /proc/self/stat,
+  - the UDP counters of /proc/net/snmp (InDatagrams, InErrors, RcvbufErrors,
+    SndbufErrors).
+
+The sampler thread's own CPU time and context switches are left out. The
+UDP counters are kernel-wide (per network namespace), so they include other
+traffic on the host; they show whether the kernel dropped datagrams (e.g. a
+full socket receive buffer) while the run was going on.
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOURCE_INTERVAL_S = 0.1
+# NOTE: long runs halve the series (and double the interval) whenever it reaches
+#       this many samples, so a report stays small however long the run is
+DEFAULT_MAX_SAMPLES = 2000
+
+PROC = Path("/proc")
+# /proc/net/snmp "Udp:" counters, as named in the reports
+UDP_COUNTERS = {
+    "InDatagrams": "udp_in_datagrams",
+    "InErrors": "udp_in_errors",
+    "RcvbufErrors": "udp_rcvbuf_errors",
+    "SndbufErrors": "udp_sndbuf_errors",
+}
+# one column per sampled quantity, every one but rss_bytes is cumulative
+SERIES = (
+    "t_s",
+    "cpu_user_s",
+    "cpu_system_s",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+    "rss_bytes",
+    *UDP_COUNTERS.values(),
+)
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def available() -> bool:
+    """Whether this platform has the /proc files the sampler reads."""
+    return (PROC / "self" / "stat").exists() and (PROC / "net" / "snmp").exists()
+
+
+def _read_stat(path: Path) -> List[str]:
+    """The fields of a /proc stat file after the command name (field 3 onwards)."""
+    text = path.read_text()
+    # NOTE: the command name is in parentheses and may itself contain spaces
+    return text[text.rindex(")") + 2 :].split()
+
+
+def _read_cpu_s(path: Path) -> tuple:
+    fields = _read_stat(path)
+    return int(fields[11]) / _CLOCK_TICKS, int(fields[12]) / _CLOCK_TICKS
+
+
+def _read_ctx_switches(skip_tid: Optional[int]) -> tuple:
+    voluntary = involuntary = 0
+    for task in (PROC / "self" / "task").iterdir():
+        if skip_tid is not None and task.name == str(skip_tid):
+            continue
+        try:
+            status = (task / "status").read_text()
+        except (FileNotFoundError, ProcessLookupError):
+            # NOTE: the thread exited in the meantime
+            continue
+        for line in status.splitlines():
+            if line.startswith("voluntary_ctxt_switches:"):
+                voluntary += int(line.split()[1])
+            elif line.startswith("nonvoluntary_ctxt_switches:"):
+                involuntary += int(line.split()[1])
+    return voluntary, involuntary
+
+
+def _read_udp_counters() -> Dict[str, int]:
+    lines = [
+        line.split()
+        for line in (PROC / "net" / "snmp").read_text().splitlines()
+        if line.startswith("Udp:")
+    ]
+    # NOTE: a header line of counter names followed by a line of values
+    counters = dict(zip(lines[0][1:], lines[1][1:]))
+    return {name: int(counters.get(key, 0)) for key, name in UDP_COUNTERS.items()}
+
+
+class ResourceSampler:
+    """
+    Samples this process's resource usage in a background thread between
+    begin() and end(); end() returns the run's series and deltas for its
+    report. One sampler serves every run (e.g. session phase) of a process.
+    """
+
+    def __init__(
+        self,
+        process: str,
+        interval_s: float = DEFAULT_RESOURCE_INTERVAL_S,
+        max_samples: int = DEFAULT_MAX_SAMPLES,
+    ):
+        """
+        :param process:     which side of the benchmark this is (publisher / subscriber)
+        :param interval_s:  time between two samples
+        :param max_samples: series length at which the series is thinned out
+        """
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        if max_samples < 2:
+            raise ValueError("max_samples must be >= 2")
+        self.process = process
+        self.interval_s = interval_s
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tid: Optional[int] = None
+        self._recording = False
+        self._stride = 1
+        self._ticks = 0
+        self._series: Dict[str, List[float]] = {name: [] for name in SERIES}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="resource-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        self._tid = threading.get_native_id()
+        while not self._stop.wait(self.interval_s):
+            with self._lock:
+                if not self._recording:
+                    continue
+                self._ticks += 1
+                if self._ticks % self._stride == 0:
+                    self._append(self.sample())
+
+    def sample(self) -> Dict[str, float]:
+        """Current (cumulative) usage of the process, without the sampler thread."""
+        t_s = perf_counter()
+        fields = _read_stat(PROC / "self" / "stat")
+        cpu_user_s = int(fields[11]) / _CLOCK_TICKS
+        cpu_system_s = int(fields[12]) / _CLOCK_TICKS
+        tid = self._tid
+        if tid is not None:
+            try:
+                sampler_user_s, sampler_system_s = _read_cpu_s(
+                    PROC / "self" / "task" / str(tid) / "stat"
+                )
+                cpu_user_s -= sampler_user_s
+                cpu_system_s -= sampler_system_s
+            except FileNotFoundError:
+                pass
+        voluntary, involuntary = _read_ctx_switches(tid)
+        return {
+            "t_s": t_s,
+            "cpu_user_s": cpu_user_s,
+            "cpu_system_s": cpu_system_s,
+            "voluntary_ctx_switches": voluntary,
+            "involuntary_ctx_switches": involuntary,
+            "rss_bytes": int(fields[21]) * _PAGE_SIZE,
+            **_read_udp_counters(),
+        }
+
+    def _append(self, sample: Dict[str, float]) -> None:
+        if len(self._series["t_s"]) >= self.max_samples:
+            for name in SERIES:
+                del self._series[name][1::2]
+            self._stride *= 2
+        for name in SERIES:
+            self._series[name].append(sample[name])
+
+    def begin(self) -> None:
+        """Start recording a run (discarding the previous one)."""
+        with self._lock:
+            self._series = {name: [] for name in SERIES}
+            self._stride = 1
+            self._ticks = 0
+            self._append(self.sample())
+            self._recording = True
+
+    def end(self) -> Dict[str, Any]:
+        """
+        Stop recording and return the run's resource usage: every series
+        relative to the start of the run, and the deltas over the whole run.
+        """
+        with self._lock:
+            self._recording = False
+            self._append(self.sample())
+            series = self._series
+
+        first = {name: values[0] for name, values in series.items()}
+        last = {name: values[-1] for name, values in series.items()}
+        duration_s = last["t_s"] - first["t_s"]
+        cpu_s = (
+            last["cpu_user_s"]
+            - first["cpu_user_s"]
+            + last["cpu_system_s"]
+            - first["cpu_system_s"]
+        )
+        deltas: Dict[str, Any] = {
+            "duration_s": duration_s,
+            "cpu_user_s": round(last["cpu_user_s"] - first["cpu_user_s"], 6),
+            "cpu_system_s": round(last["cpu_system_s"] - first["cpu_system_s"], 6),
+            # NOTE: CPU seconds per wall second, > 1 when several threads are busy
+            "cpu_utilization": cpu_s / duration_s if duration_s > 0 else 0.0,
+            # NOTE: threads that exited during the run take their counts with them
+            "voluntary_ctx_switches": max(
+                0, last["voluntary_ctx_switches"] - first["voluntary_ctx_switches"]
+            ),
+            "involuntary_ctx_switches": max(
+                0,
+                last["involuntary_ctx_switches"] - first["involuntary_ctx_switches"],
+            ),
+            "rss_start_bytes": first["rss_bytes"],
+            "rss_max_bytes": max(series["rss_bytes"]),
+            "rss_delta_bytes": last["rss_bytes"] - first["rss_bytes"],
+            **{name: last[name] - first[name] for name in UDP_COUNTERS.values()},
+        }
+        return {
+            "process": self.process,
+            "interval_s": self.interval_s * self._stride,
+            "num_samples": len(series["t_s"]),
+            "deltas": deltas,
+            "series": {
+                name: [
+                    round(v - first[name], 6) if name != "rss_bytes" else v
+                    for v in values
+                ]
+                for name, values in series.items()
+            },
+        }
+
+
+def create_sampler(process: str, interval_s: float) -> Optional[ResourceSampler]:
+    """A started sampler, or None if interval_s <= 0 or /proc is not available."""
+    if interval_s <= 0:
+        return None
+    if not available():
+        logger.warning("No /proc on this platform, not sampling resource usage")
+        return None
+    sampler = ResourceSampler(process, interval_s)
+    sampler.start()
+    return sampler
@@ -0,0 +1,53 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import yaml
+
+# report key naming the .npz file (relative to the report) holding per-message columns
+SAMPLES_FILE_KEY = "samples_file"
+
+
+def write_report(
+    out: Path,
+    report: Dict[str, Any],
+    columns: Optional[Dict[str, Sequence[float]]] = None,
+) -> Path:
+    """
+    Write a run report as a small YAML summary at `out`.
+
+    Per-message columns (if any) are not put in the YAML; they are written as
+    uncompressed arrays to an .npz file next to it, and the summary records
+    its name under SAMPLES_FILE_KEY.
+    """
+    if columns:
+        samples_path = out.with_suffix(".npz")
+        np.savez(
+            samples_path,
+            **{name: np.asarray(values) for name, values in columns.items()},
+        )
+        report[SAMPLES_FILE_KEY] = samples_path.name
+
+    with open(out, "w") as f:
+        yaml.dump(report, f)
+    return out
+
+
+def open_samples(
+    report_path: Path, report: Dict[str, Any]
+) -> Optional[np.lib.npyio.NpzFile]:
+    """
+    Open the per-message columns that belong to a report, or None if the run
+    did not keep samples.
+
+    Nothing is read up front: each column is only loaded when it is indexed,
+    e.g. `open_samples(path, report)["oneway_latencies_ms"]`. Use the result
+    as a context manager to close the underlying file.
+    """
+    name = report.get(SAMPLES_FILE_KEY)
+    if not name:
+        return None
+    samples_path = report_path.parent / name
+    if not samples_path.exists():
+        return None
+    return np.load(samples_path)
@@ -1,6 +1,7 @@
 #!/usr/bin/env bash
 
-# Usage: ./run-benchmarks.sh [python_interpreter] [num_msgs] [transmission_rate]
+# Usage: ./run-publisher-benchmark.bash [num_msgs] [transmission_rate] [results_dir] [python_interpreter]
+#   (or run both sides in one command with benchmark_sweep.py)
 #   num_msgs: how many messages to send in each run (default: 51)
 #   transmission_rate: target rate in Hz (default: 1000)
 #   results_dir: output dir to save results (default: /tmp/publisher-benchmark-results/)
@@ -8,7 +9,7 @@
 
 NUM_MSGS="${1:-51}"
 TRANSMISSION_RATE="${2:-1000}"
-RESULTS_DIR="${2:-/tmp/publisher-benchmark-results/}"
+RESULTS_DIR="${3:-/tmp/publisher-benchmark-results/}"
 PYTHON_INTERPRETER="${4:-python3}"
 
 echo "Important: Ensure you start this script before run-subscriber-benchmark.bash"
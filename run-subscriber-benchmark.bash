@@ -1,13 +1,14 @@
 #!/usr/bin/env bash
 
-# Usage: ./run-subscriber-benchmark.sh [python_interpreter] [num_msgs]
+# Usage: ./run-subscriber-benchmark.bash [num_msgs] [results_dir] [python_interpreter] [sleep_time]
+#   (or run both sides in one command with benchmark_sweep.py)
 #   num_msgs: how many messages each subscriber run should consume (default: 51)
 #   results_dir: output dir to save results (default: /tmp/subscriber-benchmark-results/)
 #   python_interpreter: which python to use (default: python3)
 #   sleep_time: how long to sleep after each subscriber process finishes (default: 2s)
 
 NUM_MSGS="${1:-51}"
-RESULTS_DIR="${3:-/tmp/subscriber-benchmark-results/}"
+RESULTS_DIR="${2:-/tmp/subscriber-benchmark-results/}"
 PYTHON_INTERPRETER="${3:-python3}"
 SLEEP_TIME="${4:-1s}"
 
@@ -0,0 +1,156 @@
+"""
+Run profiles: how a benchmark process is scheduled and how its garbage
+collector runs, to take scheduler and GC jitter out of the latency tails.
+
+A profile is a YAML file (see profiles/*.yaml) whose top-level settings
+apply to both sides and whose `publisher` / `subscriber` sections override
+them per side, e.g.
+
+    name: pinned_fifo
+    gc: freeze
+    realtime_priority: 50
+    publisher: {cpus: [2]}
+    subscriber: {cpus: [3], callback_cpus: [3]}
+
+Settings:
+
+  - cpus:              CPUs the process is pinned to (os.sched_setaffinity);
+                       applied before the middleware starts its threads, so
+                       they inherit it
+  - callback_cpus:     CPUs the middleware's callback threads are pinned to
+                       (eCAL; LCM calls back on the receiving thread)
+  - realtime_priority: run with SCHED_FIFO at this priority (needs
+                       CAP_SYS_NICE, otherwise the default policy is kept)
+  - gc:                default | disable (never collect) | freeze (collect and
+                       gc.freeze() the setup's objects once the middleware is
+                       set up, then collect only between the phases of a run)
+
+What was requested and what could actually be applied is recorded in every
+report under parameters.profile.
+"""
+
+import gc
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+GC_MODES = ("default", "disable", "freeze")
+PROFILE_SIDES = ("publisher", "subscriber")
+_SETTINGS = ("cpus", "callback_cpus", "realtime_priority", "gc")
+
+
+class RunProfile:
+    """Scheduling and GC settings of one side of the benchmark."""
+
+    def __init__(
+        self,
+        name: str = "default",
+        cpus: Optional[List[int]] = None,
+        callback_cpus: Optional[List[int]] = None,
+        realtime_priority: Optional[int] = None,
+        gc: str = "default",
+    ):
+        if gc not in GC_MODES:
+            raise ValueError(f"{name}: gc must be one of {GC_MODES}")
+        for setting, value in (("cpus", cpus), ("callback_cpus", callback_cpus)):
+            if value is not None and not value:
+                raise ValueError(f"{name}: {setting} must not be empty")
+        if realtime_priority is not None and not 1 <= realtime_priority <= 99:
+            raise ValueError(f"{name}: realtime_priority must be in [1, 99]")
+
+        self.name = name
+        self.cpus = cpus
+        self.callback_cpus = callback_cpus
+        self.realtime_priority = realtime_priority
+        self.gc = gc
+        # what apply() managed to do, for the report
+        self._applied: Dict[str, Any] = {}
+
+    def apply(self) -> None:
+        """
+        Pin and schedule the calling thread (and so every thread it starts
+        afterwards) and set up the GC. Call before the middleware is created.
+        """
+        if self.cpus is not None:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError) as e:
+                logger.warning(f"Could not pin to CPUs {self.cpus}: {e}")
+        if self.realtime_priority is not None:
+            try:
+                os.sched_setscheduler(
+                    0, os.SCHED_FIFO, os.sched_param(self.realtime_priority)
+                )
+            except (AttributeError, OSError) as e:
+                # NOTE: unprivileged processes may not raise their scheduling class
+                logger.warning(
+                    f"Could not switch to SCHED_FIFO ({self.realtime_priority}): {e}"
+                )
+        if self.gc == "disable":
+            gc.disable()
+
+        self._applied = {
+            "cpus": (
+                sorted(os.sched_getaffinity(0))
+                if hasattr(os, "sched_getaffinity")
+                else None
+            ),
+            "realtime": (
+                hasattr(os, "sched_getscheduler")
+                and os.sched_getscheduler(0) == os.SCHED_FIFO
+            ),
+        }
+        logger.info(f"Applied run profile {self.describe()}")
+
+    def after_setup(self) -> None:
+        """The middleware is set up and the run is about to start."""
+        if self.gc == "freeze":
+            # NOTE: everything allocated so far lives for the whole run; frozen it is
+            #       never traversed again, and collection is left to between_phases()
+            gc.collect()
+            gc.freeze()
+            gc.disable()
+
+    def between_phases(self) -> None:
+        """One run (phase) is over and the next has not started yet."""
+        if self.gc == "freeze":
+            gc.collect()
+
+    def describe(self) -> Dict[str, Any]:
+        """What a report records about the profile: its settings and what was applied."""
+        return {
+            "name": self.name,
+            "cpus": self.cpus,
+            "callback_cpus": self.callback_cpus,
+            "realtime_priority": self.realtime_priority,
+            "gc": self.gc,
+            "applied": dict(self._applied),
+        }
+
+
+def load_profile(path: Optional[Path | str], side: str) -> RunProfile:
+    """The settings of `side` (publisher / subscriber) in a profile file, or the default profile."""
+    if side not in PROFILE_SIDES:
+        raise ValueError(f"side must be one of {PROFILE_SIDES}")
+    if path is None:
+        return RunProfile()
+
+    spec = yaml.safe_load(Path(path).read_text()) or {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path}: a profile must be a mapping")
+    unknown = set(spec) - {"name", *_SETTINGS, *PROFILE_SIDES}
+    if unknown:
+        raise ValueError(f"{path}: unknown profile settings {sorted(unknown)}")
+    overrides = spec.get(side) or {}
+    unknown = set(overrides) - set(_SETTINGS)
+    if unknown:
+        raise ValueError(f"{path}: unknown {side} settings {sorted(unknown)}")
+
+    settings = {key: spec[key] for key in _SETTINGS if key in spec}
+    settings.update(overrides)
+    return RunProfile(spec.get("name", Path(path).stem), **settings)
@@ -0,0 +1,202 @@
+import logging
+import subprocess
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# how long the publisher gets to subscribe to the handshake channel before the
+# subscriber (which pings it once on startup) is launched
+DEFAULT_STARTUP_DELAY_S = 0.5
+# extra time a pair gets on top of its nominal send duration before it is killed
+DEFAULT_GRACE_S = 30.0
+# how often a running pair is checked for a failed publisher
+POLL_INTERVAL_S = 0.1
+
+
+def load_reports(results_dir: Path) -> List[Dict[str, Any]]:
+    """Every report below results_dir, oldest first, each with its report_path."""
+    reports = []
+    for path in sorted(results_dir.glob("**/*.yaml")):
+        report = yaml.safe_load(path.read_text())
+        report["report_path"] = str(path)
+        reports.append(report)
+    return reports
+
+
+def _load_report(results_dir: Path) -> Optional[Dict[str, Any]]:
+    reports = load_reports(results_dir)
+    return reports[-1] if reports else None
+
+
+def run_pair(
+    middleware: str,
+    num_bytes: int,
+    transmission_rate: float,
+    num_msgs: int,
+    results_dir: Path,
+    channel_name: str = "/benchmark",
+    publisher_args: Sequence[str] = (),
+    subscriber_args: Sequence[str] = (),
+    python: str = sys.executable,
+    timeout_s: Optional[float] = None,
+    startup_delay_s: float = DEFAULT_STARTUP_DELAY_S,
+    run_id: str = "",
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Run one benchmark_publisher / benchmark_subscriber pair as local child
+    processes and return their (publisher, subscriber) reports.
+
+    Each side writes its report and log below results_dir/{publisher,subscriber}.
+    A report is None if that side failed or had to be killed after timeout_s
+    (default: nominal send duration + DEFAULT_GRACE_S). If the publisher fails,
+    the subscriber is stopped right away instead of waiting out its timeout.
+    Both reports record run_id in their parameters.
+    """
+    pub_report, sub_reports = run_fanout(
+        middleware,
+        num_bytes,
+        transmission_rate,
+        num_msgs,
+        results_dir,
+        num_subscribers=1,
+        channel_name=channel_name,
+        publisher_args=publisher_args,
+        subscriber_args=subscriber_args,
+        python=python,
+        timeout_s=timeout_s,
+        startup_delay_s=startup_delay_s,
+        run_id=run_id,
+    )
+    return pub_report, sub_reports[0]
+
+
+def run_fanout(
+    middleware: str,
+    num_bytes: int,
+    transmission_rate: float,
+    num_msgs: int,
+    results_dir: Path,
+    num_subscribers: int,
+    channel_name: str = "/benchmark",
+    publisher_args: Sequence[str] = (),
+    subscriber_args: Sequence[str] = (),
+    python: str = sys.executable,
+    timeout_s: Optional[float] = None,
+    startup_delay_s: float = DEFAULT_STARTUP_DELAY_S,
+    run_id: str = "",
+) -> Tuple[Optional[Dict[str, Any]], List[Optional[Dict[str, Any]]]]:
+    """
+    Like run_pair, but with num_subscribers subscribers on the same channel.
+    The publisher waits until all of them have announced themselves.
+
+    Subscriber k writes below results_dir/subscriber (k == 0 of a single
+    subscriber) or results_dir/subscriber_<k>. Returns the publisher report
+    and one report (or None) per subscriber.
+    """
+    if timeout_s is None:
+        timeout_s = num_msgs / transmission_rate + DEFAULT_GRACE_S
+
+    common = [
+        "--middleware",
+        middleware,
+        "--channel-name",
+        channel_name,
+        "--run-id",
+        run_id,
+    ]
+    pub_dir = results_dir / "publisher"
+    sub_dirs = [
+        results_dir / ("subscriber" if num_subscribers == 1 else f"subscriber_{k}")
+        for k in range(num_subscribers)
+    ]
+    pub_cmd: List[str] = [
+        python,
+        str(REPO_DIR / "benchmark_publisher.py"),
+        *common,
+        "--num-bytes",
+        str(num_bytes),
+        # NOTE: the publisher CLI only accepts whole Hz
+        "--transmission-rate",
+        str(max(1, round(transmission_rate))),
+        "--num-msgs",
+        str(num_msgs),
+        "--num-subscribers",
+        str(num_subscribers),
+        "--results-dir",
+        str(pub_dir),
+        "--log-level",
+        "WARNING",
+        *publisher_args,
+    ]
+    sub_cmds: List[List[str]] = [
+        [
+            python,
+            str(REPO_DIR / "benchmark_subscriber.py"),
+            *common,
+            "--num-msgs",
+            str(num_msgs),
+            "--results-dir",
+            str(sub_dir),
+            "--log-level",
+            "WARNING",
+            *subscriber_args,
+        ]
+        for sub_dir in sub_dirs
+    ]
+
+    for path in (pub_dir, *sub_dirs):
+        path.mkdir(parents=True, exist_ok=True)
+    logger.debug(f"Running {' '.join(pub_cmd)}")
+    for sub_cmd in sub_cmds:
+        logger.debug(f"Running {' '.join(sub_cmd)}")
+
+    with ExitStack() as stack:
+        pub_log = stack.enter_context(open(pub_dir / "publisher.log", "w"))
+        pub = subprocess.Popen(
+            pub_cmd, cwd=REPO_DIR, stdout=pub_log, stderr=subprocess.STDOUT
+        )
+        sleep(startup_delay_s)
+        subs = []
+        for sub_dir, sub_cmd in zip(sub_dirs, sub_cmds):
+            sub_log = stack.enter_context(open(sub_dir / "subscriber.log", "w"))
+            subs.append(
+                subprocess.Popen(
+                    sub_cmd, cwd=REPO_DIR, stdout=sub_log, stderr=subprocess.STDOUT
+                )
+            )
+
+        deadline = monotonic() + timeout_s
+        while any(sub.poll() is None for sub in subs) and monotonic() < deadline:
+            # NOTE: a publisher that dies leaves the subscribers waiting for
+            #       messages that will never come
+            if pub.poll() not in (None, 0):
+                logger.error("publisher failed, stopping the subscribers")
+                for sub in subs:
+                    if sub.poll() is None:
+                        sub.terminate()
+                break
+            sleep(POLL_INTERVAL_S)
+
+        procs = [(pub_dir, pub)] + list(zip(sub_dirs, subs))
+        for proc_dir, proc in procs:
+            name = proc_dir.name
+            try:
+                proc.wait(timeout=max(0.0, deadline - monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.error(
+                    f"{name} did not finish within {timeout_s:.1f} s, killing it"
+                )
+                proc.kill()
+                proc.wait()
+            if proc.returncode != 0:
+                logger.error(f"{name} exited with {proc.returncode}, see {proc_dir}")
+
+    return _load_report(pub_dir), [_load_report(sub_dir) for sub_dir in sub_dirs]
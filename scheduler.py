@@ -0,0 +1,196 @@
+import heapq
+from time import perf_counter, sleep, time_ns
+from typing import List, Set, Tuple
+
+SLEEP_STRATEGIES = ("sleep", "hybrid", "spin")
+CATCH_UP_POLICIES = ("burst", "skip", "reanchor")
+
+# hybrid strategy: how far ahead of a deadline we stop sleeping and start spinning
+DEFAULT_SPIN_THRESHOLD_S = 0.002
+
+
+class RateScheduler:
+    """
+    Absolute-deadline rate scheduler.
+
+    Deadline k is anchor + k * period, so an overshoot on one send does not
+    shift every later send (no drift). How the caller waits for a deadline is
+    selected by `strategy`:
+
+      - "sleep":  time.sleep() until the deadline (cheap, coarse)
+      - "hybrid": sleep until spin_threshold_s before the deadline, then spin
+      - "spin":   busy-spin on perf_counter() (one full core, finest)
+
+    What happens when a deadline has already passed is selected by `catch_up`:
+
+      - "burst":    send immediately and keep the original grid, so the
+                    sender bursts until it is back on schedule
+      - "skip":     drop the whole periods that were missed and send now on
+                    the most recent grid slot
+      - "reanchor": restart the grid at the current time
+    """
+
+    def __init__(
+        self,
+        rate_hz: float,
+        strategy: str = "hybrid",
+        catch_up: str = "burst",
+        spin_threshold_s: float = DEFAULT_SPIN_THRESHOLD_S,
+    ):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be > 0")
+        if strategy not in SLEEP_STRATEGIES:
+            raise ValueError(f"strategy must be one of {SLEEP_STRATEGIES}")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"catch_up must be one of {CATCH_UP_POLICIES}")
+
+        self.period_s = 1.0 / rate_hz
+        self.strategy = strategy
+        self.catch_up = catch_up
+        self.spin_threshold_s = spin_threshold_s
+
+        self.anchor_s = 0.0
+        self.skipped_periods = 0
+        self._wall_ref_ns = 0
+        self._perf_ref_s = 0.0
+        self.last_lateness_s = 0.0
+        self._next_deadline_s = 0.0
+
+    def start(self) -> float:
+        """Anchor the deadline grid at the current time and return it."""
+        self._wall_ref_ns = time_ns()
+        self.anchor_s = self._perf_ref_s = perf_counter()
+        self._next_deadline_s = self.anchor_s
+        self.skipped_periods = 0
+        return self.anchor_s
+
+    def wait(self) -> float:
+        """
+        Block until the next deadline and return it (perf_counter seconds).
+
+        The returned value is the scheduled send time; last_lateness_s holds
+        how late the caller arrived for it (0.0 if it was early).
+        """
+        deadline = self._next_deadline_s
+        now = perf_counter()
+        self.last_lateness_s = max(0.0, now - deadline)
+
+        if now < deadline:
+            self._wait_until(deadline)
+        elif self.catch_up == "skip":
+            missed = int((now - deadline) / self.period_s)
+            self.skipped_periods += missed
+            deadline += missed * self.period_s
+        elif self.catch_up == "reanchor":
+            self.anchor_s = deadline = now
+
+        self._next_deadline_s = deadline + self.period_s
+        return deadline
+
+    def to_time_ns(self, t_s: float) -> int:
+        """Convert a perf_counter() time from this scheduler to ns since UNIX epoch."""
+        return self._wall_ref_ns + int((t_s - self._perf_ref_s) * 1e9)
+
+    def _wait_until(self, deadline: float) -> None:
+        _wait_until(deadline, self.strategy, self.spin_threshold_s)
+
+
+class MultiRateScheduler:
+    """
+    Absolute-deadline scheduler for several streams, each with its own rate,
+    served by one thread.
+
+    Stream i's deadline k is anchor + k * period_i. wait() blocks until the
+    earliest pending deadline of any stream and returns which stream is due,
+    so streams compete for the sending thread the way topics of one process
+    do. `strategy` and `catch_up` mean the same as for RateScheduler and are
+    applied per stream.
+    """
+
+    def __init__(
+        self,
+        rates_hz: List[float],
+        strategy: str = "hybrid",
+        catch_up: str = "burst",
+        spin_threshold_s: float = DEFAULT_SPIN_THRESHOLD_S,
+    ):
+        if not rates_hz or any(rate_hz <= 0 for rate_hz in rates_hz):
+            raise ValueError("rates_hz must be a non-empty list of rates > 0")
+        if strategy not in SLEEP_STRATEGIES:
+            raise ValueError(f"strategy must be one of {SLEEP_STRATEGIES}")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"catch_up must be one of {CATCH_UP_POLICIES}")
+
+        self.periods_s = [1.0 / rate_hz for rate_hz in rates_hz]
+        self.strategy = strategy
+        self.catch_up = catch_up
+        self.spin_threshold_s = spin_threshold_s
+
+        self.anchor_s = 0.0
+        self.skipped_periods = [0] * len(rates_hz)
+        self._wall_ref_ns = 0
+        self._perf_ref_s = 0.0
+        self.last_lateness_s = 0.0
+        self._heap: List[Tuple[float, int]] = []
+        self._stopped: Set[int] = set()
+
+    def start(self) -> float:
+        """Anchor every stream's deadline grid at the current time and return it."""
+        self._wall_ref_ns = time_ns()
+        self.anchor_s = self._perf_ref_s = perf_counter()
+        self.skipped_periods = [0] * len(self.periods_s)
+        self._heap = [(self.anchor_s, i) for i in range(len(self.periods_s))]
+        heapq.heapify(self._heap)
+        self._stopped = set()
+        return self.anchor_s
+
+    def stop(self, i: int) -> None:
+        """Stop scheduling stream i (e.g. once it has sent all its messages)."""
+        self._stopped.add(i)
+
+    def wait(self) -> Tuple[int, float]:
+        """
+        Block until the earliest pending deadline and return (stream index,
+        deadline in perf_counter seconds). last_lateness_s holds how late the
+        caller arrived for it (0.0 if it was early).
+        """
+        deadline, i = heapq.heappop(self._heap)
+        while i in self._stopped:
+            if not self._heap:
+                raise RuntimeError("every stream has been stopped")
+            deadline, i = heapq.heappop(self._heap)
+        period_s = self.periods_s[i]
+        now = perf_counter()
+        self.last_lateness_s = max(0.0, now - deadline)
+
+        if now < deadline:
+            _wait_until(deadline, self.strategy, self.spin_threshold_s)
+        elif self.catch_up == "skip":
+            missed = int((now - deadline) / period_s)
+            self.skipped_periods[i] += missed
+            deadline += missed * period_s
+        elif self.catch_up == "reanchor":
+            deadline = now
+
+        heapq.heappush(self._heap, (deadline + period_s, i))
+        return i, deadline
+
+    def to_time_ns(self, t_s: float) -> int:
+        """Convert a perf_counter() time from this scheduler to ns since UNIX epoch."""
+        return self._wall_ref_ns + int((t_s - self._perf_ref_s) * 1e9)
+
+
+def _wait_until(deadline: float, strategy: str, spin_threshold_s: float) -> None:
+    if strategy == "sleep":
+        remaining = deadline - perf_counter()
+        if remaining > 0:
+            sleep(remaining)
+        return
+
+    if strategy == "hybrid":
+        remaining = deadline - perf_counter() - spin_threshold_s
+        if remaining > 0:
+            sleep(remaining)
+
+    while perf_counter() < deadline:
+        pass
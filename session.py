@@ -0,0 +1,216 @@
+import logging
+import sys
+from queue import Empty as QueueEmpty
+from queue import Full as QueueFull
+from queue import Queue
+from time import monotonic
+from typing import List, Optional, Tuple
+
+import ecal.core.core as ecal_core
+from lcm import LCM
+
+from control_pb2 import Phase as PhaseProto
+from lcmtypes import phase_t
+
+logger = logging.getLogger(__name__)
+
+# control message kinds (same values in lcmtypes.phase_t and control_pb2.Phase)
+START = phase_t.START
+STARTED = phase_t.STARTED
+END = phase_t.END
+ENDED = phase_t.ENDED
+FINISH = phase_t.FINISH
+FINISHED = phase_t.FINISHED
+
+# what the subscriber answers to each publisher request
+ACKS = {START: STARTED, END: ENDED, FINISH: FINISHED}
+
+# how often an unanswered publisher request is resent
+DEFAULT_RETRY_S = 0.1
+# how long the publisher waits for the subscriber to answer a request
+DEFAULT_REQUEST_TIMEOUT_S = 30.0
+
+
+def control_channel(channel: str) -> str:
+    """Channel on which the publisher announces session phases."""
+    return f"{channel}_control"
+
+
+def control_ack_channel(channel: str) -> str:
+    """Channel on which the subscriber acknowledges session phases."""
+    return f"{channel}_control_ack"
+
+
+class Phase:
+    """One step of a session: num_msgs messages of num_bytes at transmission_rate_hz."""
+
+    def __init__(
+        self, index: int, num_bytes: int, transmission_rate_hz: float, num_msgs: int
+    ):
+        self.index = index
+        self.num_bytes = num_bytes
+        self.transmission_rate_hz = transmission_rate_hz
+        self.num_msgs = num_msgs
+
+    def __repr__(self) -> str:
+        return (
+            f"Phase({self.index}: {self.num_bytes} bytes @ "
+            f"{self.transmission_rate_hz:g} Hz x {self.num_msgs})"
+        )
+
+
+def build_phases(
+    sizes_bytes: List[int],
+    rates_hz: List[float],
+    num_msgs: int,
+    duration_s: Optional[float] = None,
+) -> List[Phase]:
+    """
+    Every (size, rate) combination, sizes outermost. Each phase sends num_msgs
+    messages, or rate * duration_s messages when duration_s is given.
+    """
+    phases: List[Phase] = []
+    for num_bytes in sizes_bytes:
+        for rate_hz in rates_hz:
+            count = max(2, round(rate_hz * duration_s)) if duration_s else num_msgs
+            phases.append(Phase(len(phases), num_bytes, rate_hz, count))
+    return phases
+
+
+class SessionControl:
+    """
+    Control channel that steps a long-lived publisher/subscriber pair through
+    a list of phases without restarting either process.
+
+    For every phase the publisher sends START and waits for STARTED, sends
+    its messages, then sends END and waits for ENDED (the subscriber answers
+    once it has drained and reported the phase). FINISH ends the session.
+    Requests are resent every retry_s until answered, and the subscriber
+    answers every request it sees, so lost control messages only cost time.
+    """
+
+    def send(self, kind: int, phase: Phase) -> None:
+        raise NotImplementedError
+
+    def poll(self, timeout_s: float) -> Optional[Tuple[int, Phase]]:
+        """Return the next (kind, phase) control message, or None after timeout_s."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def request(
+        self,
+        kind: int,
+        phase: Phase,
+        timeout_s: float = DEFAULT_REQUEST_TIMEOUT_S,
+        retry_s: float = DEFAULT_RETRY_S,
+    ) -> bool:
+        """Publisher: send `kind` for `phase` until the subscriber acknowledges it."""
+        deadline = monotonic() + timeout_s
+        while monotonic() < deadline:
+            self.send(kind, phase)
+            resend_at = min(monotonic() + retry_s, deadline)
+            while monotonic() < resend_at:
+                reply = self.poll(resend_at - monotonic())
+                if reply is None:
+                    break
+                reply_kind, reply_phase = reply
+                if reply_kind == ACKS[kind] and reply_phase.index == phase.index:
+                    return True
+        logger.error(f"No answer to control message {kind} for {phase}")
+        return False
+
+    def acknowledge(self, kind: int, phase: Phase) -> None:
+        """Subscriber: answer a publisher request."""
+        self.send(ACKS[kind], phase)
+
+
+class LcmSessionControl(SessionControl):
+    def __init__(self, url: str, channel: str, publisher: bool):
+        # NOTE: its own LCM instance (like LCMHandshake) so that control traffic is
+        #       never dispatched by the data loop's handle() calls
+        self._conn = LCM(provider=url)
+        if publisher:
+            self._send_channel = control_channel(channel)
+            listen_channel = control_ack_channel(channel)
+        else:
+            self._send_channel = control_ack_channel(channel)
+            listen_channel = control_channel(channel)
+        self._inbox: List[Tuple[int, Phase]] = []
+        self._conn.subscribe(listen_channel, self._on_control)
+
+    def _on_control(self, _: str, data: bytes) -> None:
+        msg = phase_t.decode(data)
+        self._inbox.append(
+            (
+                msg.kind,
+                Phase(msg.index, msg.num_bytes, msg.transmission_rate_hz, msg.num_msgs),
+            )
+        )
+
+    def send(self, kind: int, phase: Phase) -> None:
+        msg = phase_t()
+        msg.kind = kind
+        msg.index = phase.index
+        msg.num_bytes = phase.num_bytes
+        msg.transmission_rate_hz = phase.transmission_rate_hz
+        msg.num_msgs = phase.num_msgs
+        self._conn.publish(self._send_channel, msg.encode())
+
+    def poll(self, timeout_s: float) -> Optional[Tuple[int, Phase]]:
+        deadline = monotonic() + timeout_s
+        # NOTE: handle_timeout() can return without having dispatched to _on_control
+        while not self._inbox:
+            # NOTE: polled at least once, so that poll(0) picks up pending messages
+            remaining_ms = max(0, int((deadline - monotonic()) * 1e3))
+            if self._conn.handle_timeout(remaining_ms) <= 0 or remaining_ms == 0:
+                break
+        return self._inbox.pop(0) if self._inbox else None
+
+
+class eCALSessionControl(SessionControl):
+    def __init__(self, channel: str, publisher: bool):
+        # NOTE: initialize() is reference counted, the data publisher/subscriber
+        #       of this process already did the real initialization
+        ecal_core.initialize(sys.argv, f"benchmark_session_{channel}")
+        if publisher:
+            send_topic = control_channel(channel)
+            listen_topic = control_ack_channel(channel)
+        else:
+            send_topic = control_ack_channel(channel)
+            listen_topic = control_channel(channel)
+        topic_type = "proto:" + PhaseProto.DESCRIPTOR.full_name
+        self._pub = ecal_core.publisher(send_topic, topic_type)
+        self._sub = ecal_core.subscriber(listen_topic, topic_type)
+        self._inbox: Queue = Queue(maxsize=100)
+        self._sub.set_callback(self._on_control)
+
+    def _on_control(self, topic: str, msg: bytes, timestamp: float) -> None:
+        proto = PhaseProto.FromString(msg)
+        phase = Phase(
+            proto.index, proto.num_bytes, proto.transmission_rate_hz, proto.num_msgs
+        )
+        try:
+            self._inbox.put_nowait((int(proto.kind), phase))
+        except QueueFull:
+            logger.error("control queue is full")
+
+    def send(self, kind: int, phase: Phase) -> None:
+        proto = PhaseProto(
+            kind=kind,
+            index=phase.index,
+            num_bytes=phase.num_bytes,
+            transmission_rate_hz=phase.transmission_rate_hz,
+            num_msgs=phase.num_msgs,
+        )
+        self._pub.send(proto.SerializeToString())
+
+    def poll(self, timeout_s: float) -> Optional[Tuple[int, Phase]]:
+        try:
+            return self._inbox.get(block=True, timeout=max(0.0, timeout_s))
+        except QueueEmpty:
+            return None
+
+    def close(self) -> None:
+        ecal_core.finalize()
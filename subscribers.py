@@ -0,0 +1,510 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+from queue import Empty as QueueEmpty
+from queue import Full as QueueFull
+from queue import Queue
+from time import perf_counter, time_ns
+from typing import List, Optional, Set, Tuple
+
+import ecal.core.core as ecal_core
+# NOTE: see relevant note about ProtoSubscriber in eCALSubscriber below
+# from ecal.core.subscriber import ProtoSubscriber
+from lcm import LCM
+
+from benchmark import LCM_CODEC, PROTO_CODEC, Codec, Readiness, echo_channel
+from raw_transport import REPLY_ENDPOINT, RawSender, open_receiver, open_sender
+
+logger = logging.getLogger(__name__)
+
+# messages an asyncio subscriber holds for receive_async() before it drops them
+ASYNC_QUEUE_SIZE = 100
+
+
+class BenchmarkMessage:
+    """
+    Uniform wrapper for a decoded benchmark message of any codec.
+    """
+
+    def __init__(
+        self,
+        num_bytes: int,
+        blob: bytes | memoryview,
+        creation_time_ns: int,
+        msg_type: type,
+        scheduled_time_ns: int,
+        sequence_number: int,
+    ):
+        self.num_bytes = num_bytes
+        self.blob = blob
+        self.creation_time_ns = creation_time_ns
+        self.msg_type: type = msg_type
+        self.scheduled_time_ns = scheduled_time_ns
+        self.sequence_number = sequence_number
+
+        # receive-side timing, filled in by the subscriber that received the message
+        # wall clock (ns since UNIX epoch) when the middleware callback was entered
+        self.callback_time_ns = 0
+        # time from callback entry until the message was handed to decode
+        self.queueing_ms = 0.0
+        # perf_counter() at callback entry and when decode started
+        self.callback_s = 0.0
+        self.decode_start_s = 0.0
+        # send time stamped by the middleware itself (ns since UNIX epoch), if it has one
+        self.middleware_send_time_ns: Optional[int] = None
+        # channel / topic the message arrived on
+        self.topic = ""
+        # copies on the receive path: time spent copying the blob out of the decoded
+        # message, and the bytes / number of copies made of the message in total
+        self.copy_ms = 0.0
+        self.copied_bytes = 0
+        self.num_copies = 0
+
+    @classmethod
+    def from_decoded(cls, msg: object, codec: Codec) -> "BenchmarkMessage":
+        """
+        Wrap a message decoded by `codec` (every codec has the same fields).
+        The blob of a zero-copy codec is kept as the memoryview it is, any
+        other blob is copied into bytes of our own (timed as copy_ms).
+        """
+        t0 = perf_counter()
+        blob = msg.blob
+        owned = blob if codec.zero_copy else bytes(blob)
+        copy_ms = (perf_counter() - t0) * 1e3
+
+        bm = cls(
+            len(owned),
+            owned,
+            msg.creation_timestamp_ns,
+            codec.msg_type,
+            msg.scheduled_timestamp_ns,
+            msg.sequence_number,
+        )
+        bm.copy_ms = copy_ms
+        # NOTE: bytes() of a bytes object returns it as is, but protobuf hands out
+        #       a fresh copy on every access of the field
+        if codec.blob_access_copies or owned is not blob:
+            bm.copied_bytes += len(owned)
+            bm.num_copies += 1
+        return bm
+
+
+class BaseSubscriber:
+    # how the messages this subscriber receives are decoded
+    codec: Codec
+    # messages the subscriber had to discard before they reached receive()
+    dropped_msgs: int = 0
+    # whether the middleware calls back on threads of its own (see set_callback_affinity)
+    callback_threads: bool = False
+    callback_cpus: Optional[List[int]] = None
+
+    def receive(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        """
+        Block until the next message arrives, or at most timeout_s seconds
+        (None = forever).
+        Returns (BenchmarkMessage, handle_ms, decode_ms), or None on timeout.
+        """
+        raise NotImplementedError
+
+    def msg_type(self) -> type:
+        return self.codec.msg_type
+
+    def close(self) -> None:
+        """Cleanup resources if necessary."""
+        pass
+
+    def set_callback_affinity(self, cpus: List[int]) -> None:
+        """Pin every middleware thread that runs our callback to `cpus`."""
+        self.callback_cpus = cpus
+        self._pinned_threads: Set[int] = set()
+
+    def _pin_callback_thread(self) -> None:
+        # NOTE: the middleware starts its threads itself, so each one is pinned the
+        #       first time it calls back (the first message is not counted anyway)
+        thread_id = threading.get_ident()
+        if thread_id not in self._pinned_threads:
+            os.sched_setaffinity(0, self.callback_cpus)
+            self._pinned_threads.add(thread_id)
+            logger.info(
+                f"Pinned callback thread {threading.get_native_id()} to CPUs "
+                f"{self.callback_cpus}"
+            )
+
+    def _decode(self, data: bytes, callback_s: float) -> Tuple[BenchmarkMessage, float]:
+        """
+        Decode and wrap `data` that arrived in a callback entered at
+        perf_counter() callback_s, returns (BenchmarkMessage, decode_ms). The
+        queueing time and the copies made of the message on the way are
+        recorded on it.
+        """
+        t0 = perf_counter()
+        msg = self.codec.decode(data)
+        decode_ms = (perf_counter() - t0) * 1e3
+
+        bm = BenchmarkMessage.from_decoded(msg, self.codec)
+        bm.callback_s = callback_s
+        bm.decode_start_s = t0
+        bm.queueing_ms = (t0 - callback_s) * 1e3
+        # NOTE: every backend hands over a bytes object of its own, i.e. a copy of
+        #       its receive buffer, and decoders that are not views copy the blob
+        #       out of that once more
+        bm.copied_bytes += len(data)
+        bm.num_copies += 1
+        if not self.codec.zero_copy:
+            bm.copied_bytes += bm.num_bytes
+            bm.num_copies += 1
+        return bm, decode_ms
+
+
+class LcmSubscriber(BaseSubscriber):
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        echo: bool = False,
+        topics: Optional[List[str]] = None,
+        handshake: Optional[Readiness] = None,
+        codec: Codec = LCM_CODEC,
+    ):
+        """
+        Receives `channel`, or every channel in `topics` when given (the
+        handshake still runs on `channel`).
+        """
+        self.codec = codec
+        self._conn = LCM(provider=url)
+        self._echo_channel = echo_channel(channel) if echo else None
+        self._last_data: Optional[bytes] = None
+        self._last_topic = ""
+        self._last_callback_time_ns = 0
+        self._last_callback_s = 0.0
+        for topic in topics or [channel]:
+            self._conn.subscribe(topic, self._callback)
+        # TODO: how do I handle if publisher is started after subscriber?
+        if handshake is not None:
+            handshake.send_ready()
+
+    def _callback(self, topic: str, data: bytes) -> None:
+        # NOTE: stamped first thing so that hand-off and decode are not counted as transport
+        self._last_callback_time_ns = time_ns()
+        self._last_callback_s = perf_counter()
+        if self._echo_channel is not None:
+            # NOTE: echoed straight from the callback (before decode) so the round trip
+            #       measures the request/response cost of the middleware itself
+            self._conn.publish(self._echo_channel, data)
+        self._last_topic = topic
+        self._last_data = data
+
+    def receive(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        t0 = perf_counter()
+        self._last_data = None
+        # NOTE: handle() can return without having dispatched to _callback (e.g. when
+        #       several processes share the URL), so wait until it actually ran
+        while self._last_data is None:
+            if timeout_s is None:
+                self._conn.handle()
+                continue
+            remaining_ms = int((timeout_s - (perf_counter() - t0)) * 1e3)
+            if remaining_ms <= 0 or self._conn.handle_timeout(remaining_ms) <= 0:
+                return None
+        handle_ms = (perf_counter() - t0) * 1e3
+
+        bm, decode_ms = self._decode(self._last_data, self._last_callback_s)
+        bm.topic = self._last_topic
+        bm.callback_time_ns = self._last_callback_time_ns
+        return bm, handle_ms, decode_ms
+
+
+class eCALSubscriber(BaseSubscriber):
+    callback_threads = True
+
+    def __init__(
+        self,
+        channel: str,
+        echo: bool = False,
+        topics: Optional[List[str]] = None,
+        handshake: Optional[Readiness] = None,
+        codec: Codec = PROTO_CODEC,
+    ):
+        """Receives `channel`, or every topic in `topics` when given."""
+        self.codec = codec
+        ecal_core.initialize(sys.argv, f"benchmark_subscriber_{channel}")
+        topic_type = "proto:" + codec.msg_type.DESCRIPTOR.full_name
+        # NOTE: We purposefully do not use ProtoSubscriber so that we can
+        #       measure the decode time directly by doing it ourselves
+        # self._sub = ProtoSubscriber(channel, Bench)
+        self._subs = [
+            ecal_core.subscriber(topic, topic_type) for topic in topics or [channel]
+        ]
+        self._queue = Queue(maxsize=100)
+        self._echo_pub = None
+        if echo:
+            self._echo_pub = ecal_core.publisher(echo_channel(channel), topic_type)
+        for sub in self._subs:
+            sub.set_callback(self._callback)
+        if handshake is not None:
+            handshake.send_ready()
+
+    def _callback(self, topic: str, msg: bytes, timestamp: float) -> None:
+        # NOTE: stamped first thing so that the queue hand-off to the main thread and
+        #       decode are not counted as transport. `timestamp` is eCAL's own send
+        #       time in microseconds since UNIX epoch
+        callback_time_ns = time_ns()
+        callback_s = perf_counter()
+        if self.callback_cpus is not None:
+            self._pin_callback_thread()
+        if self._echo_pub is not None:
+            # NOTE: echoed straight from the callback (before decode) so the round trip
+            #       measures the request/response cost of the middleware itself
+            self._echo_pub.send(msg)
+        logger.debug(f"[{topic}] Received message")
+        try:
+            self._queue.put_nowait(
+                (msg, topic, callback_time_ns, callback_s, timestamp)
+            )
+        except QueueFull:
+            self.dropped_msgs += 1
+            logger.error(f"queue is full, dropped {self.dropped_msgs} msgs so far")
+
+    def receive(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        t0 = perf_counter()
+        try:
+            raw_msg, topic, callback_time_ns, callback_s, send_time_us = (
+                self._queue.get(block=True, timeout=timeout_s)
+            )
+        except QueueEmpty:
+            return None
+        handle_ms = (perf_counter() - t0) * 1e3
+
+        bm, decode_ms = self._decode(raw_msg, callback_s)
+        bm.topic = topic
+        bm.callback_time_ns = callback_time_ns
+        if send_time_us:
+            bm.middleware_send_time_ns = int(send_time_us * 1e3)
+        return bm, handle_ms, decode_ms
+
+    def close(self) -> None:
+        ecal_core.finalize()
+
+
+class RawSubscriber(BaseSubscriber):
+    """
+    Baseline subscriber that reads encoded messages straight from a raw
+    transport (see raw_transport.py) instead of through a middleware.
+    """
+
+    def __init__(
+        self,
+        transport: str,
+        url: str,
+        channel: str,
+        echo: bool = False,
+        handshake: Optional[Readiness] = None,
+        codec: Codec = LCM_CODEC,
+    ):
+        self.codec = codec
+        self._transport = transport
+        self._url = url
+        self._channel = channel
+        self._echo = echo
+        self._echo_sender: Optional[RawSender] = None
+        # NOTE: our endpoint has to exist before the publisher learns our pid from
+        #       the handshake and opens its sender towards it
+        self._receiver = open_receiver(transport, url, channel, os.getpid())
+        if handshake is not None:
+            handshake.send_ready()
+
+    @property
+    def dropped_msgs(self) -> int:
+        return self._receiver.dropped_msgs
+
+    def receive(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        t0 = perf_counter()
+        data = self._receiver.receive(timeout_s)
+        if data is None:
+            return None
+        # NOTE: there is no callback, so the receive call returning takes its place
+        callback_time_ns = time_ns()
+        callback_s = perf_counter()
+        handle_ms = (callback_s - t0) * 1e3
+        if self._echo:
+            if self._echo_sender is None:
+                # NOTE: opened on the first message, by then the publisher has set
+                #       up its reply endpoint
+                self._echo_sender = open_sender(
+                    self._transport,
+                    self._url,
+                    self._channel,
+                    [REPLY_ENDPOINT],
+                    reply=True,
+                )
+            self._echo_sender.send(data)
+
+        bm, decode_ms = self._decode(data, callback_s)
+        bm.topic = self._channel
+        bm.callback_time_ns = callback_time_ns
+        return bm, handle_ms, decode_ms
+
+    def close(self) -> None:
+        if self._echo_sender is not None:
+            self._echo_sender.close()
+        self._receiver.close()
+
+
+class AsyncSubscriber(BaseSubscriber):
+    """
+    Base of the asyncio subscribers. The middleware hands every message to an
+    event loop, whose queue receive_async() awaits, so one coroutine can
+    service many channels and time out without a thread per channel.
+    Subscribers given the same `loop` share it. Their queueing time includes
+    waking the loop and resuming the awaiting coroutine, i.e. the cost of
+    asyncio itself.
+    """
+
+    def __init__(self, codec: Codec, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.codec = codec
+        self._owns_loop = loop is None
+        self._loop = loop or asyncio.new_event_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=ASYNC_QUEUE_SIZE)
+
+    def _enqueue(
+        self,
+        data: bytes,
+        topic: str,
+        callback_time_ns: int,
+        callback_s: float,
+        send_time_us: Optional[float] = None,
+    ) -> None:
+        # NOTE: must run on the loop, asyncio.Queue is not thread safe
+        try:
+            self._queue.put_nowait(
+                (data, topic, callback_time_ns, callback_s, send_time_us)
+            )
+        except asyncio.QueueFull:
+            self.dropped_msgs += 1
+            logger.error(f"queue is full, dropped {self.dropped_msgs} msgs so far")
+
+    async def receive_async(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        """Like receive(), for callers that already run inside the event loop."""
+        t0 = perf_counter()
+        try:
+            data, topic, callback_time_ns, callback_s, send_time_us = (
+                await asyncio.wait_for(self._queue.get(), timeout_s)
+            )
+        except asyncio.TimeoutError:
+            return None
+        handle_ms = (perf_counter() - t0) * 1e3
+
+        bm, decode_ms = self._decode(data, callback_s)
+        bm.topic = topic
+        bm.callback_time_ns = callback_time_ns
+        if send_time_us:
+            bm.middleware_send_time_ns = int(send_time_us * 1e3)
+        return bm, handle_ms, decode_ms
+
+    def receive(
+        self, timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[BenchmarkMessage, float, float]]:
+        # NOTE: the loop only runs while a message is awaited, as it would in a
+        #       consumer that awaits one message after the other
+        return self._loop.run_until_complete(self.receive_async(timeout_s))
+
+    def close(self) -> None:
+        if self._owns_loop:
+            self._loop.close()
+
+
+class LcmAsyncSubscriber(AsyncSubscriber):
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        echo: bool = False,
+        topics: Optional[List[str]] = None,
+        handshake: Optional[Readiness] = None,
+        codec: Codec = LCM_CODEC,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        """
+        Receives `channel`, or every channel in `topics` when given, on one
+        LCM instance whose socket the event loop watches.
+        """
+        super().__init__(codec, loop)
+        self._conn = LCM(provider=url)
+        self._echo_channel = echo_channel(channel) if echo else None
+        for topic in topics or [channel]:
+            self._conn.subscribe(topic, self._callback)
+        # NOTE: nothing blocks in handle(), the loop dispatches whenever LCM's
+        #       socket is readable
+        self._loop.add_reader(self._conn.fileno(), self._conn.handle_timeout, 0)
+        if handshake is not None:
+            handshake.send_ready()
+
+    def _callback(self, topic: str, data: bytes) -> None:
+        # NOTE: stamped first thing so that hand-off and decode are not counted as transport
+        callback_time_ns = time_ns()
+        callback_s = perf_counter()
+        if self._echo_channel is not None:
+            self._conn.publish(self._echo_channel, data)
+        self._enqueue(data, topic, callback_time_ns, callback_s)
+
+    def close(self) -> None:
+        self._loop.remove_reader(self._conn.fileno())
+        super().close()
+
+
+class eCALAsyncSubscriber(AsyncSubscriber):
+    callback_threads = True
+
+    def __init__(
+        self,
+        channel: str,
+        echo: bool = False,
+        topics: Optional[List[str]] = None,
+        handshake: Optional[Readiness] = None,
+        codec: Codec = PROTO_CODEC,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        """Receives `channel`, or every topic in `topics` when given."""
+        super().__init__(codec, loop)
+        ecal_core.initialize(sys.argv, f"benchmark_subscriber_{channel}")
+        topic_type = "proto:" + codec.msg_type.DESCRIPTOR.full_name
+        self._subs = [
+            ecal_core.subscriber(topic, topic_type) for topic in topics or [channel]
+        ]
+        self._echo_pub = None
+        if echo:
+            self._echo_pub = ecal_core.publisher(echo_channel(channel), topic_type)
+        for sub in self._subs:
+            sub.set_callback(self._callback)
+        if handshake is not None:
+            handshake.send_ready()
+
+    def _callback(self, topic: str, msg: bytes, timestamp: float) -> None:
+        # NOTE: runs on an eCAL thread, so the message is handed to the loop with
+        #       call_soon_threadsafe (which also wakes the loop up)
+        callback_time_ns = time_ns()
+        callback_s = perf_counter()
+        if self.callback_cpus is not None:
+            self._pin_callback_thread()
+        if self._echo_pub is not None:
+            self._echo_pub.send(msg)
+        self._loop.call_soon_threadsafe(
+            self._enqueue, msg, topic, callback_time_ns, callback_s, timestamp
+        )
+
+    def close(self) -> None:
+        # NOTE: no callback may hand over messages to a closed loop
+        ecal_core.finalize()
+        super().close()
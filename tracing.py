@@ -0,0 +1,175 @@
+"""
+Per-message span tracing, exported as Chrome trace JSON (chrome://tracing,
+https://ui.perfetto.dev).
+
+Spans are recorded into buffers that are allocated up front, so tracing a
+run does not allocate per message; once the buffer is full further spans are
+counted as dropped. Timestamps are perf_counter() seconds, which on Linux is
+CLOCK_MONOTONIC and therefore shared by the publisher and subscriber processes
+of one host: merged, their traces line up on one timeline, with a flow arrow
+from every message's send to its arrival.
+"""
+
+import json
+import os
+from argparse import ArgumentParser
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List
+
+DEFAULT_TRACE_CAPACITY = 1_000_000
+# NOTE: spans of every phase of a session share one buffer; flow ids are made
+#       unique per phase by putting the phase index above the sequence number
+_FLOW_ID_PHASE_SHIFT = 32
+
+
+class SpanTracer:
+    """
+    Fixed-capacity recorder of (name, start, end, message) spans of one
+    process.
+    """
+
+    def __init__(self, process_name: str, capacity: int = DEFAULT_TRACE_CAPACITY):
+        """
+        :param process_name: how the process is labelled in the trace viewer
+        :param capacity:     spans kept, later ones are only counted in dropped_spans
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be > 0")
+        self.process_name = process_name
+        self.capacity = capacity
+        self.count = 0
+        self.dropped_spans = 0
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._flow_base = 0
+        self._name = array("H", bytes(2 * capacity))
+        self._start_s = array("d", bytes(8 * capacity))
+        self._end_s = array("d", bytes(8 * capacity))
+        self._msg = array("q", bytes(8 * capacity))
+        # bit 0: the span starts a message's flow, bit 1: it ends it,
+        # bit 2: asynchronous span (may overlap others, e.g. queued messages)
+        self._flags = array("B", bytes(capacity))
+
+    def set_phase(self, index: int) -> None:
+        """Messages recorded from now on belong to session phase `index`."""
+        self._flow_base = index << _FLOW_ID_PHASE_SHIFT
+
+    def span(
+        self,
+        name: str,
+        start_s: float,
+        end_s: float,
+        sequence_number: int = -1,
+        flow_start: bool = False,
+        flow_end: bool = False,
+        asynchronous: bool = False,
+    ) -> None:
+        """
+        Record a span between two perf_counter() readings, for the message
+        `sequence_number` (-1: none). flow_start / flow_end link the span to
+        the same message's span in the other process. Synchronous spans must
+        nest; asynchronous ones (with a sequence_number) may overlap anything.
+        """
+        i = self.count
+        if i >= self.capacity:
+            self.dropped_spans += 1
+            return
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+        self._name[i] = name_id
+        self._start_s[i] = start_s
+        self._end_s[i] = end_s
+        self._msg[i] = self._flow_base + sequence_number if sequence_number >= 0 else -1
+        self._flags[i] = flow_start | (flow_end << 1) | (asynchronous << 2)
+        self.count = i + 1
+
+    def events(self) -> List[Dict[str, Any]]:
+        """The recorded spans as Chrome trace events."""
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": pid,
+                "args": {"name": self.process_name},
+            }
+        ]
+        for i in range(self.count):
+            name = self._names[self._name[i]]
+            ts_us = self._start_s[i] * 1e6
+            msg = self._msg[i]
+            flags = self._flags[i]
+            args = {}
+            if msg >= 0:
+                args = {
+                    "sequence_number": msg & ((1 << _FLOW_ID_PHASE_SHIFT) - 1),
+                    "phase_index": msg >> _FLOW_ID_PHASE_SHIFT,
+                }
+            if flags & 4:
+                # NOTE: async begin/end pairs, matched by category and id
+                common = {"name": name, "cat": name, "id": msg, "pid": pid, "tid": pid}
+                events.append({**common, "ph": "b", "ts": ts_us, "args": args})
+                events.append({**common, "ph": "e", "ts": self._end_s[i] * 1e6})
+                continue
+            event: Dict[str, Any] = {
+                "name": name,
+                "ph": "X",
+                "ts": ts_us,
+                "dur": (self._end_s[i] - self._start_s[i]) * 1e6,
+                "pid": pid,
+                "tid": pid,
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+            if flags & 3:
+                # NOTE: flow events bind to the enclosing slice at their timestamp
+                events.append(
+                    {
+                        "name": "message",
+                        "cat": "message",
+                        "ph": "s" if flags & 1 else "f",
+                        "bp": "e",
+                        "id": msg,
+                        "ts": ts_us,
+                        "pid": pid,
+                        "tid": pid,
+                    }
+                )
+        return events
+
+    def write(self, path: Path) -> None:
+        """Write the trace as Chrome trace JSON."""
+        trace = {
+            "traceEvents": self.events(),
+            "displayTimeUnit": "ns",
+            "otherData": {
+                "process_name": self.process_name,
+                "spans": self.count,
+                "dropped_spans": self.dropped_spans,
+            },
+        }
+        path.write_text(json.dumps(trace))
+
+
+def merge_traces(paths: List[Path], out: Path) -> None:
+    """Merge the traces of several processes (e.g. publisher and subscribers) into one."""
+    events: List[Dict[str, Any]] = []
+    for path in paths:
+        events.extend(json.loads(path.read_text())["traceEvents"])
+    out.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ns"}))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Merge publisher and subscriber traces into one Chrome trace"
+    )
+    parser.add_argument("output", type=Path)
+    parser.add_argument("traces", type=Path, nargs="+")
+    args = parser.parse_args()
+
+    merge_traces(args.traces, args.output)
@@ -0,0 +1,87 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from benchmark import PAYLOAD_PATTERNS
+
+
+class TopicSpec:
+    """One topic of a workload: num_msgs messages of num_bytes at rate_hz."""
+
+    def __init__(
+        self,
+        name: str,
+        rate_hz: float,
+        num_bytes: int,
+        num_msgs: int,
+        pattern: str = "random",
+    ):
+        if not name:
+            raise ValueError("topic name must not be empty")
+        if rate_hz <= 0:
+            raise ValueError(f"{name}: rate_hz must be > 0")
+        if num_bytes <= 0:
+            raise ValueError(f"{name}: num_bytes must be > 0")
+        if num_msgs <= 0:
+            raise ValueError(f"{name}: num_msgs must be > 0")
+        if pattern not in PAYLOAD_PATTERNS:
+            raise ValueError(f"{name}: pattern must be one of {PAYLOAD_PATTERNS}")
+
+        self.name = name
+        self.rate_hz = rate_hz
+        self.num_bytes = num_bytes
+        self.num_msgs = num_msgs
+        self.pattern = pattern
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rate_hz": self.rate_hz,
+            "num_bytes": self.num_bytes,
+            "num_msgs": self.num_msgs,
+            "pattern": self.pattern,
+        }
+
+
+def load_workload(path: Path | str) -> List[TopicSpec]:
+    """
+    Read a workload spec, e.g.
+
+        duration_s: 10          # default length for topics without num_msgs
+        topics:
+          - {name: /camera, rate_hz: 30, num_bytes: 1048576}
+          - {name: /imu, rate_hz: 1000, num_bytes: 256, pattern: zeros}
+          - {name: /status, rate_hz: 1, num_bytes: 64, num_msgs: 20}
+
+    Topics without num_msgs send rate_hz * duration_s messages.
+    """
+    spec = yaml.safe_load(Path(path).read_text())
+    if not isinstance(spec, dict) or not spec.get("topics"):
+        raise ValueError(f"{path}: a workload needs a non-empty 'topics' list")
+
+    duration_s: Optional[float] = spec.get("duration_s")
+    topics: List[TopicSpec] = []
+    for entry in spec["topics"]:
+        num_msgs = entry.get("num_msgs")
+        if num_msgs is None:
+            if duration_s is None:
+                raise ValueError(
+                    f"{path}: topic {entry.get('name')!r} needs num_msgs or a "
+                    "workload-level duration_s"
+                )
+            num_msgs = max(2, round(entry["rate_hz"] * duration_s))
+        topics.append(
+            TopicSpec(
+                entry["name"],
+                float(entry["rate_hz"]),
+                int(entry["num_bytes"]),
+                int(num_msgs),
+                entry.get("pattern", "random"),
+            )
+        )
+
+    names = [topic.name for topic in topics]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: topic names must be unique")
+    return topics